@@ -12,6 +12,7 @@ import argparse
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.database import Database
+from src.param_extractor import UNITS
 
 
 def add_threshold_rule(
@@ -25,7 +26,8 @@ def add_threshold_rule(
     severity_if_match: str = 'critical',
     is_abnormal_if_match: bool = True,
     message: str = None,
-    is_active: bool = True
+    is_active: bool = True,
+    threshold_unit: str = None
 ):
     """
     閾値ルールを追加
@@ -42,6 +44,8 @@ def add_threshold_rule(
         is_abnormal_if_match: 異常フラグ
         message: 異常理由メッセージ
         is_active: アクティブフラグ
+        threshold_unit: 閾値の単位の表記（例: 'Gb/s'）。指定した場合はパラメータを
+                        正規化後の単位に換算して比較する（threshold の場合のみ）
     """
     db = Database(db_path)
     conn = db.get_connection()
@@ -69,6 +73,10 @@ def add_threshold_rule(
             print("Error: threshold_value1 is required for threshold rule")
             db.close()
             sys.exit(1)
+        if threshold_unit and threshold_unit not in UNITS:
+            print(f"Error: Unknown unit '{threshold_unit}' (known units: {', '.join(sorted(UNITS))})")
+            db.close()
+            sys.exit(1)
     elif rule_type == 'contains':
         if threshold_value1 is None:
             print("Error: threshold_value1 (search string) is required for contains rule")
@@ -82,15 +90,19 @@ def add_threshold_rule(
             sys.exit(1)
         op = 'matches'  # regex の場合は op を自動設定
     
+    if rule_type != 'threshold':
+        threshold_unit = None
+    
     # メッセージが未指定の場合は自動生成
     if not message:
         if rule_type == 'threshold':
+            unit_label = f" {threshold_unit}" if threshold_unit else ''
             if op == 'between':
-                message = f"{field_name} between {threshold_value1} and {threshold_value2}"
+                message = f"{field_name} between {threshold_value1}{unit_label} and {threshold_value2}{unit_label}"
             elif op == 'not_between':
-                message = f"{field_name} not between {threshold_value1} and {threshold_value2}"
+                message = f"{field_name} not between {threshold_value1}{unit_label} and {threshold_value2}{unit_label}"
             else:
-                message = f"{field_name} {op} {threshold_value1}"
+                message = f"{field_name} {op} {threshold_value1}{unit_label}"
         elif rule_type == 'contains':
             message = f"Message contains '{threshold_value1}'"
         elif rule_type == 'regex':
@@ -100,10 +112,10 @@ def add_threshold_rule(
     cursor.execute("""
         INSERT INTO pattern_rules (
             pattern_id, rule_type, field_name, op,
-            threshold_value1, threshold_value2,
+            threshold_value1, threshold_value2, threshold_unit,
             severity_if_match, is_abnormal_if_match,
             message, is_active
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
         pattern_id,
         rule_type,
@@ -111,6 +123,7 @@ def add_threshold_rule(
         op,
         threshold_value1,
         threshold_value2,
+        threshold_unit,
         severity_if_match,
         1 if is_abnormal_if_match else 0,
         message,
@@ -132,6 +145,8 @@ def add_threshold_rule(
         print(f"  Threshold1: {threshold_value1}")
     if threshold_value2 is not None:
         print(f"  Threshold2: {threshold_value2}")
+    if threshold_unit:
+        print(f"  Unit: {threshold_unit}")
     print(f"  Severity if match: {severity_if_match}")
     print(f"  Is abnormal: {is_abnormal_if_match}")
     print(f"  Message: {message}")
@@ -158,6 +173,25 @@ Examples:
     --severity critical \\
     --message "GPU temp > 80°C"
   
+  # 単位付きの閾値（"31.504 Gb/s" も "31504 Mb/s" も同じ値として比較）
+  python3 scripts/add_threshold_rule.py \\
+    --pattern-id 100 \\
+    --rule-type threshold \\
+    --field-name available_bandwidth \\
+    --op '<=' \\
+    --threshold 50 \\
+    --unit Gb/s
+  
+  # 追加したルールを既存のログにも適用（threshold ルールのみ）
+  python3 scripts/add_threshold_rule.py \\
+    --pattern-id 100 \\
+    --rule-type threshold \\
+    --field-name temp \\
+    --op between \\
+    --threshold 20 \\
+    --threshold2 90 \\
+    --apply
+  
   # 文字列含有チェック
   python3 scripts/add_threshold_rule.py \\
     --pattern-id 100 \\
@@ -185,6 +219,8 @@ Examples:
                        help='Threshold value 1 (float for threshold, string for contains/regex)')
     parser.add_argument('--threshold2', type=float, dest='threshold_value2',
                        help='Threshold value 2 (required for between/not_between)')
+    parser.add_argument('--unit', dest='threshold_unit',
+                       help='Unit of the thresholds (e.g. Gb/s, M, ms); compares normalized parameter values')
     parser.add_argument('--severity', default='critical', 
                        choices=['info', 'warning', 'critical'],
                        dest='severity_if_match',
@@ -198,6 +234,8 @@ Examples:
     parser.add_argument('--message', help='Anomaly reason message')
     parser.add_argument('--inactive', action='store_false', dest='is_active',
                        help='Add rule as inactive')
+    parser.add_argument('--apply', action='store_true',
+                       help='Also apply the rule to existing logs (threshold rules only, see cli_tools apply-rule)')
     
     args = parser.parse_args()
     
@@ -216,7 +254,7 @@ Examples:
     else:
         threshold_value1 = None
     
-    add_threshold_rule(
+    rule_id = add_threshold_rule(
         db_path=args.db,
         pattern_id=args.pattern_id,
         rule_type=args.rule_type,
@@ -227,8 +265,13 @@ Examples:
         severity_if_match=args.severity_if_match,
         is_abnormal_if_match=args.is_abnormal_if_match,
         message=args.message,
-        is_active=args.is_active
+        is_active=args.is_active,
+        threshold_unit=args.threshold_unit
     )
+    
+    if args.apply:
+        from src.cli_tools import apply_rule
+        apply_rule(args.db, rule_id)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+手動パターン照合（ManualPatternIndex.match）のベンチマーク
+
+全パターンを ID 順に search() する従来の照合と、必須リテラルの Aho-Corasick 索引で
+候補を絞り込む照合の 1秒あたりの処理件数を比較し、両者の結果（最初にマッチした
+パターンID）が一致することを確認する。
+
+使用方法:
+    python3 scripts/bench_manual_matcher.py                       # 1k / 10k の合成パターン
+    python3 scripts/bench_manual_matcher.py --patterns 1000 5000 --messages 20000
+    python3 scripts/bench_manual_matcher.py --db db/monitor.db    # 実データのパターンとログ
+"""
+import sys
+import os
+import time
+import random
+import argparse
+
+# パスを追加してモジュールをインポート可能にする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.pattern_matcher import ManualPatternIndex
+
+
+WORDS = [
+    'pci', 'usb', 'acpi', 'nvme', 'eth', 'link', 'device', 'driver', 'firmware', 'memory',
+    'cpu', 'irq', 'bridge', 'port', 'slot', 'bus', 'clock', 'timer', 'power', 'thermal',
+    'enabled', 'disabled', 'detected', 'registered', 'failed', 'ready', 'reset', 'up', 'down',
+    'mapped', 'loaded', 'found', 'using', 'added', 'removed', 'configured', 'probe', 'table'
+]
+
+
+def make_patterns(count: int, rng: random.Random):
+    """
+    ブートログ風の合成パターンを作成
+
+    Returns:
+        ((パターンID, 正規表現), メッセージ生成関数) のリスト
+    """
+    patterns = []
+    seen = set()
+    while len(patterns) < count:
+        words = [rng.choice(WORDS) for _ in range(3)]
+        tag = f"{rng.choice(WORDS)}{rng.randint(0, 99999)}"
+        key = (tuple(words), tag)
+        if key in seen:
+            continue
+        seen.add(key)
+        style = rng.random()
+        if style < 0.8:
+            regex = rf"{words[0]} {tag}: {words[1]} (?P<value>\d+) {words[2]}"
+            sample = lambda w=words, t=tag: f"{w[0]} {t}: {w[1]} {rng.randint(0, 9999)} {w[2]}"
+        elif style < 0.95:
+            regex = rf"^\[\s*\d+\.\d+\]\s+{words[0]}\s+{tag}\s+(?P<state>\w+)"
+            sample = lambda w=words, t=tag: f"[ {rng.uniform(0, 99):.6f}] {w[0]} {t} {rng.choice(WORDS)}"
+        else:
+            # 必須リテラルを持たないパターン（常に試す必要がある）
+            regex = rf"(?i){words[0]}\s+{tag}\s+{words[1]}"
+            sample = lambda w=words, t=tag: f"{w[0].upper()} {t} {w[1]}"
+        patterns.append(((len(patterns) + 1, regex), sample))
+    return patterns
+
+
+def make_messages(patterns, count: int, rng: random.Random):
+    """マッチするメッセージ（8割）とどのパターンにもマッチしないメッセージ（2割）を作成"""
+    messages = []
+    for _ in range(count):
+        if rng.random() < 0.8:
+            messages.append(rng.choice(patterns)[1]())
+        else:
+            messages.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 10))))
+    return messages
+
+
+def load_from_db(db_path: str, count: int):
+    """データベースのパターン（自動生成・手動の両方）とログメッセージを読み込む"""
+    import sqlite3
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("""
+        SELECT id, COALESCE(manual_regex_rule, regex_rule)
+        FROM regex_patterns
+        ORDER BY id
+    """).fetchall()
+    messages = [row[0] for row in conn.execute(
+        "SELECT message FROM log_entries ORDER BY random() LIMIT ?", (count,))]
+    conn.close()
+    return rows, messages
+
+
+def run(rows, messages, label: str) -> int:
+    """従来の照合と絞り込みありの照合を比較し、不一致の件数を返す"""
+    ManualPatternIndex.PREFILTER_MIN_PATTERNS = sys.maxsize
+    linear = ManualPatternIndex()
+    linear.build(rows)
+
+    ManualPatternIndex.PREFILTER_MIN_PATTERNS = 0
+    started = time.perf_counter()
+    indexed = ManualPatternIndex()
+    indexed.build(rows)
+    build_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    linear_results = [linear.match(message) for message in messages]
+    linear_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    indexed_results = [indexed.match(message) for message in messages]
+    indexed_elapsed = time.perf_counter() - started
+
+    mismatches = sum(1 for a, b in zip(linear_results, indexed_results) if a != b)
+    matched = sum(1 for result in linear_results if result is not None)
+
+    print(f"{label}: {len(indexed)} patterns ({len(indexed._always_try)} without literals), "
+          f"{len(messages)} messages ({matched} matched)")
+    print(f"  build index: {build_elapsed:.3f}s")
+    print(f"  linear:      {len(messages) / linear_elapsed:,.0f} messages/sec ({linear_elapsed:.3f}s)")
+    print(f"  prefiltered: {len(messages) / indexed_elapsed:,.0f} messages/sec ({indexed_elapsed:.3f}s)")
+    print(f"  speedup:     {linear_elapsed / indexed_elapsed:.1f}x")
+    print(f"  mismatches:  {mismatches}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark manual pattern matching: linear vs literal prefilter')
+    parser.add_argument('--patterns', type=int, nargs='+', default=[1000, 10000],
+                        help='Numbers of synthetic patterns to test')
+    parser.add_argument('--messages', type=int, default=5000, help='Number of messages to match')
+    parser.add_argument('--db', help='Use patterns and log messages from this database instead')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    args = parser.parse_args()
+
+    mismatches = 0
+    if args.db:
+        rows, messages = load_from_db(args.db, args.messages)
+        mismatches += run(rows, messages, args.db)
+    else:
+        for count in args.patterns:
+            rng = random.Random(args.seed)
+            patterns = make_patterns(count, rng)
+            messages = make_messages(patterns, args.messages, rng)
+            mismatches += run([row for row, _ in patterns], messages, f"synthetic {count}")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+異常判定ルール評価のマイクロベンチマーク
+
+評価のたびに rule_type / op を分岐し regex を re.compile() していた従来の評価方法と、
+compile_rule() で事前にコンパイルした判定関数の 1秒あたりの評価回数を比較する。
+両者の判定結果が一致することも確認する。
+
+使用方法:
+    python3 scripts/bench_rule_eval.py
+    python3 scripts/bench_rule_eval.py --evaluations 500000
+"""
+import sys
+import os
+import re
+import time
+import random
+import argparse
+
+# パスを追加してモジュールをインポート可能にする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.anomaly_detector import compile_rule
+
+
+def legacy_evaluate_rule(rule, message, params):
+    """従来の AnomalyDetector._evaluate_rule()（比較用）"""
+    rule_type = rule['rule_type']
+    op = rule['op']
+    field_name = rule['field_name'] if rule['field_name'] is not None else None
+
+    if rule_type == 'threshold':
+        if not field_name or field_name not in params:
+            return False
+        value = params[field_name]
+        if not isinstance(value, (int, float)):
+            return False
+        threshold1 = rule['threshold_value1']
+        threshold2 = rule['threshold_value2']
+        if op == '>':
+            return value > threshold1
+        elif op == '>=':
+            return value >= threshold1
+        elif op == '<':
+            return value < threshold1
+        elif op == '<=':
+            return value <= threshold1
+        elif op == '==':
+            return abs(value - threshold1) < 0.0001
+        elif op == '!=':
+            return abs(value - threshold1) >= 0.0001
+        elif op == 'between':
+            if threshold1 is None or threshold2 is None:
+                return False
+            return threshold1 <= value <= threshold2
+        elif op == 'not_between':
+            if threshold1 is None or threshold2 is None:
+                return False
+            return not (threshold1 <= value <= threshold2)
+
+    elif rule_type == 'contains':
+        if field_name:
+            if field_name in params:
+                search_text = str(params[field_name])
+            else:
+                return False
+        else:
+            search_text = message
+        threshold1 = rule['threshold_value1']
+        if threshold1 is None:
+            return False
+        return str(threshold1) in search_text
+
+    elif rule_type == 'regex':
+        threshold1 = rule['threshold_value1']
+        if threshold1 is None:
+            return False
+        try:
+            pattern = re.compile(str(threshold1))
+            if field_name and field_name in params:
+                return bool(pattern.search(str(params[field_name])))
+            else:
+                return bool(pattern.search(message))
+        except re.error:
+            return False
+
+    return False
+
+
+def make_rules():
+    """各ルールタイプ・演算子を網羅したルールを作成"""
+    rules = []
+
+    def rule(rule_type, field_name=None, op=None, t1=None, t2=None):
+        rules.append({
+            'id': len(rules) + 1, 'rule_type': rule_type, 'field_name': field_name, 'op': op,
+            'threshold_value1': t1, 'threshold_value2': t2,
+            'severity_if_match': 'warning', 'is_abnormal_if_match': 1, 'message': None
+        })
+
+    for op in ('>', '>=', '<', '<=', '==', '!='):
+        rule('threshold', 'temp', op, 80.0)
+    rule('threshold', 'temp', 'between', 20.0, 90.0)
+    rule('threshold', 'temp', 'not_between', 20.0, 90.0)
+    rule('threshold', 'width', '>', 8.0)
+    rule('contains', None, None, 'x2APIC')
+    rule('contains', 'device', None, 'nvme')
+    rule('regex', None, None, r'error|fail(ed|ure)')
+    rule('regex', 'device', None, r'^nvme\d+n\d+$')
+    rule('regex', None, None, r'(unclosed')
+    return rules
+
+
+def make_samples(count: int, seed: int):
+    """(message, params) のサンプルを作成"""
+    rng = random.Random(seed)
+    messages = [
+        'CPU0 temp above threshold, cpu clock throttled',
+        'x2APIC enabled',
+        'nvme nvme0: pci function 0000:01:00.0',
+        'PCIe link width x16, speed 16GT/s',
+        'I/O error, dev sda, sector 12345 op 0x0: (READ) flags 0x0',
+        'Failed to start Load Kernel Modules.',
+    ]
+    samples = []
+    for _ in range(count):
+        params = {}
+        if rng.random() < 0.8:
+            params['temp'] = rng.uniform(0, 120)
+        if rng.random() < 0.5:
+            params['width'] = float(rng.choice([1, 4, 8, 16]))
+        if rng.random() < 0.5:
+            params['device'] = rng.choice(['nvme0n1', 'sda', 'nvme1n1', 'nvme'])
+        samples.append((rng.choice(messages), params))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark rule evaluation: interpreted vs compiled')
+    parser.add_argument('--evaluations', type=int, default=200000,
+                        help='Number of (message, params) samples (each is evaluated against every rule)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    args = parser.parse_args()
+
+    rules = make_rules()
+    samples = make_samples(args.evaluations // len(rules) + 1, args.seed)
+    evaluations = len(samples) * len(rules)
+
+    started = time.perf_counter()
+    legacy_results = [legacy_evaluate_rule(rule, message, params)
+                      for message, params in samples for rule in rules]
+    legacy_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    predicates = [compile_rule(rule) for rule in rules]
+    compiled_results = [predicate(message, params)
+                        for message, params in samples for predicate in predicates]
+    compiled_elapsed = time.perf_counter() - started
+
+    mismatches = sum(1 for a, b in zip(legacy_results, compiled_results) if bool(a) != bool(b))
+
+    print(f"Rules: {len(rules)}, evaluations: {evaluations}")
+    print(f"interpreted: {evaluations / legacy_elapsed:,.0f} evaluations/sec ({legacy_elapsed:.3f}s)")
+    print(f"compiled:    {evaluations / compiled_elapsed:,.0f} evaluations/sec ({compiled_elapsed:.3f}s)")
+    print(f"speedup:     {legacy_elapsed / compiled_elapsed:.1f}x")
+    print(f"mismatches:  {mismatches}")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+abstract_message() の等価性チェックスクリプト
+
+abstract_message() が従来の実装（abstract_message_reference()）と
+同一の正規表現を出力すること、validate_pattern() がコンパイルして照合した場合と
+同じ結果を返すことを、ログコーパスとランダム生成した文字列で確認する。
+
+使用方法:
+    python3 scripts/check_abstract_message_equivalence.py
+    python3 scripts/check_abstract_message_equivalence.py log_flower/bootlog/ --fuzz 200000
+"""
+import sys
+import os
+import time
+import random
+import re
+import argparse
+
+# パスを追加してモジュールをインポート可能にする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.log_parser import LogParser
+from src.abstract_message import (
+    abstract_message, abstract_message_reference, validate_pattern, _skeleton_regex
+)
+from src.ingest import iter_log_files
+
+
+# 境界条件を起こしやすい文字（16進数・数字・空白類・正規表現の特殊文字・プレースホルダーの一部・置き換え用の記号）
+FUZZ_ALPHABET = [
+    '0', '1', '9', 'x', 'X', 'a', 'f', 'F', 'g', '_', 'W', 'S', 'N', 'U', 'M',
+    ' ', '\t', '　', '\x1f', '\x01', '\x02', '\x03',
+    '\\', '.', '+', '*', '[', ']', '(', ')', '-', ':', '=',
+    '0x', '0X', '___', 'WS', 'NUM', '\\d', '\\s', '\\+', '١', 'あ'
+]
+
+
+def load_messages(paths):
+    """ログファイルを読み込み、メッセージ部分のリストを返す"""
+    parser = LogParser()
+    messages = []
+    for path in iter_log_files(paths):
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                messages.append(parser.parse_line(line)['message'])
+    return messages
+
+
+def fuzz_messages(count: int, seed: int):
+    """境界条件を狙ったランダムな文字列を生成"""
+    rng = random.Random(seed)
+    return [
+        ''.join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(0, 20)))
+        for _ in range(count)
+    ]
+
+
+def check(messages, label: str) -> int:
+    """出力を比較し、不一致の件数を返す"""
+    mismatches = 0
+    for message in messages:
+        expected = abstract_message_reference(message)
+        actual = abstract_message(message)
+        if actual != expected:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"MISMATCH: {message!r}\n  reference: {expected!r}\n  actual:    {actual!r}")
+            continue
+        try:
+            matched = re.fullmatch(expected, message) is not None
+        except re.error:
+            matched = False
+        if validate_pattern(actual, message) != matched:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"VALIDATION MISMATCH: {message!r}\n  pattern: {actual!r}\n  fullmatch: {matched}")
+    print(f"{label}: {len(messages)} messages, {mismatches} mismatches")
+    return mismatches
+
+
+def benchmark(messages):
+    """従来の実装と新しい実装（キャッシュなし/あり）の処理時間を表示"""
+    started = time.perf_counter()
+    for message in messages:
+        abstract_message_reference(message)
+    reference = time.perf_counter() - started
+
+    abstract_message.cache_clear()
+    _skeleton_regex.cache_clear()
+    started = time.perf_counter()
+    for message in messages:
+        abstract_message.__wrapped__(message)
+    uncached = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for message in messages:
+        abstract_message(message)
+    cached = time.perf_counter() - started
+
+    print(f"reference:   {reference:.3f}s")
+    print(f"uncached:    {uncached:.3f}s ({reference / uncached:.1f}x)")
+    print(f"memoized:    {cached:.3f}s ({reference / cached:.1f}x, "
+          f"hit rate {abstract_message.cache_info().hits / len(messages):.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check abstract_message() against the reference implementation')
+    parser.add_argument('paths', nargs='*', default=['log_flower/bootlog'], help='Log files or directories')
+    parser.add_argument('--fuzz', type=int, default=100000, help='Number of random strings to check')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for fuzzing')
+    parser.add_argument('--bench', action='store_true', help='Also print timings on the corpus')
+
+    args = parser.parse_args()
+
+    messages = load_messages(args.paths)
+    mismatches = check(messages, 'corpus')
+    mismatches += check(fuzz_messages(args.fuzz, args.seed), 'fuzz')
+
+    if args.bench:
+        benchmark(messages)
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,31 +4,44 @@
 
 使い方:
   python3 scripts/filter_unknown_logs.py --regex "<pattern>" --db db/monitor.db --limit 500
+  python3 scripts/filter_unknown_logs.py --pattern-id 12 --db db/monitor.db
 
 特徴:
-- Pythonのre.searchで部分一致を確認
+- PatternMatcher（ingest / reprocess-pattern と同じ照合エンジン）で部分一致を確認
+- --pattern-id では登録済みパターン（component の指定を含む）で照合
 - マッチしたログIDとメッセージを表示
 """
 import argparse
-import re
-import sqlite3
+import os
 import sys
 
+# パスを追加してモジュールをインポート可能にする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database import Database
+from src.pattern_matcher import PatternMatcher
 
-def filter_unknown_logs(db_path: str, regex_rule: str, limit: int = 1000000):
-    try:
-        pattern = re.compile(regex_rule)
-    except re.error as e:
-        print(f"Error: invalid regex: {e}", file=sys.stderr)
-        sys.exit(1)
 
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+def filter_unknown_logs(db_path: str, regex_rule: str = None, limit: int = 1000000,
+                        pattern_id: int = None, batch_size: int = 5000):
+    db = Database(db_path)
+    if pattern_id is not None:
+        matcher = PatternMatcher(db, [pattern_id])
+        matcher.load()
+        if pattern_id not in matcher.compile_errors and not len(matcher):
+            print(f"Error: pattern {pattern_id} not found", file=sys.stderr)
+            sys.exit(1)
+    else:
+        matcher = PatternMatcher()
+        matcher.build([(0, regex_rule)])
+    if matcher.compile_errors:
+        print(f"Error: invalid regex: {next(iter(matcher.compile_errors.values()))}", file=sys.stderr)
+        sys.exit(1)
 
+    cursor = db.get_connection().cursor()
     cursor.execute(
         """
-        SELECT id, message
+        SELECT id, component, message
         FROM log_entries
         WHERE classification = 'unknown'
         ORDER BY id
@@ -37,18 +50,26 @@ def filter_unknown_logs(db_path: str, regex_rule: str, limit: int = 1000000):
         (limit,),
     )
 
-    rows = cursor.fetchall()
+    checked = 0
     matched = 0
-    for row in rows:
-        m = pattern.search(row["message"])
-        if m:
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        checked += len(rows)
+        components = [row["component"] for row in rows] if pattern_id is not None else None
+        results = matcher.match_many([row["message"] for row in rows], components)
+        for row, result in zip(rows, results):
+            if result is None:
+                continue
             matched += 1
-            groups = "\t".join(m.groups()) if m.groups() else ""
+            m = matcher.search(row["message"], row["component"] if pattern_id is not None else None)[1]
+            groups = "\t".join(g or "" for g in m.groups()) if m.groups() else ""
             msg_head = row["message"][:160]
             print(f"{row['id']}\t{groups}\t{msg_head}")
 
-    print(f"\nMatched {matched} of {len(rows)} checked (limit={limit})")
-    conn.close()
+    print(f"\nMatched {matched} of {checked} checked (limit={limit})")
+    db.close()
 
 
 def main():
@@ -56,13 +77,14 @@ def main():
         description="Filter unknown logs by regex and list candidates for manual mapping"
     )
     parser.add_argument("--db", default="db/monitor.db", help="Database path")
-    parser.add_argument("--regex", required=True, help="Regex used to search messages")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--regex", help="Regex used to search messages")
+    target.add_argument("--pattern-id", type=int, help="Use the regex (and component) of a registered pattern")
     parser.add_argument("--limit", type=int, default=100000000, help="Rows to scan (default: 200)")
     args = parser.parse_args()
 
-    filter_unknown_logs(args.db, args.regex, args.limit)
+    filter_unknown_logs(args.db, args.regex, args.limit, args.pattern_id)
 
 
 if __name__ == "__main__":
     main()
-
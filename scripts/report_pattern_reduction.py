@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+自動生成パターン数の削減効果のレポート
+
+ログコーパスの全メッセージについて、abstract_message()（従来）・型付きトークン
+（種類ごと・全種類）・テンプレートツリーで生成されるパターンの種類数を比較する。
+データベースには書き込まない。
+
+使用方法:
+    python3 scripts/report_pattern_reduction.py
+    python3 scripts/report_pattern_reduction.py log_flower/bootlog/ --types pci,mac
+"""
+import sys
+import os
+import argparse
+
+# パスを追加してモジュールをインポート可能にする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.log_parser import LogParser
+from src.abstract_message import (
+    abstract_message, abstract_message_typed, validate_pattern, parse_token_types, TOKEN_TYPES
+)
+from src.template_tree import TemplateTree, template_tokens
+from src.ingest import iter_log_files
+
+
+# 既定のログコーパス（カレントディレクトリによらずリポジトリ内のものを使用）
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'log_flower', 'bootlog')
+
+
+def load_messages(paths):
+    """ログファイルを読み込み、メッセージ部分のリストを返す"""
+    parser = LogParser()
+    messages = []
+    for path in iter_log_files(paths):
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                messages.append(parser.parse_line(line)['message'])
+    return messages
+
+
+def count_patterns(messages, token_types) -> tuple:
+    """(パターンの種類数, 元のメッセージにマッチしないパターン数) を返す"""
+    patterns = {}
+    for message in messages:
+        if token_types:
+            patterns.setdefault(abstract_message_typed(message, token_types), message)
+        else:
+            patterns.setdefault(abstract_message(message), message)
+    invalid = sum(1 for pattern, message in patterns.items() if not validate_pattern(pattern, message))
+    return len(patterns), invalid
+
+
+def count_templates(messages, token_types) -> int:
+    """テンプレートツリーで生成されるテンプレート数を返す"""
+    tree = TemplateTree()
+    for message in messages:
+        tokens = template_tokens(message, token_types)
+        if tokens:
+            tree.add(tokens)
+    return len(tree)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report how many auto patterns each abstraction produces')
+    parser.add_argument('paths', nargs='*', default=[DEFAULT_CORPUS],
+                        help='Log files or directories (default: log_flower/bootlog in the repository)')
+    parser.add_argument('--types', type=parse_token_types, default=TOKEN_TYPES,
+                        help='Typed tokens to evaluate together (comma-separated, default: all)')
+
+    args = parser.parse_args()
+
+    messages = load_messages(args.paths)
+    baseline, baseline_invalid = count_patterns(messages, None)
+    print(f"Messages: {len(messages)} ({len(set(messages))} distinct)")
+    print(f"{'abstraction':<36} {'patterns':>8} {'reduction':>10} {'invalid':>8}")
+    print(f"{'abstract_message':<36} {baseline:>8} {'':>10} {baseline_invalid:>8}")
+
+    for name in args.types:
+        count, invalid = count_patterns(messages, (name,))
+        print(f"{'+ ' + name:<36} {count:>8} {1 - count / baseline:>10.1%} {invalid:>8}")
+
+    count, invalid = count_patterns(messages, args.types)
+    print(f"{'typed (' + ','.join(args.types) + ')':<36} {count:>8} {1 - count / baseline:>10.1%} {invalid:>8}")
+
+    templates = count_templates(messages, None)
+    print(f"{'template tree':<36} {templates:>8} {1 - templates / baseline:>10.1%}")
+    templates = count_templates(messages, args.types)
+    print(f"{'template tree + typed':<36} {templates:>8} {1 - templates / baseline:>10.1%}")
+
+
+if __name__ == '__main__':
+    main()
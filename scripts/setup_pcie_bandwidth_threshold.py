@@ -4,7 +4,7 @@ PCIe帯域幅ログの閾値設定スクリプト
 
 このスクリプトは以下の処理を実行します:
 1. PCIe帯域幅ログのパターンを手動で追加（named capture groupを含む）
-2. 閾値ルールを設定（available_bandwidth が 50 Gb/s 以下の場合に異常）
+2. 閾値ルールを設定（available_bandwidth が 50 Gb/s 以下の場合に異常、単位は正規化して比較）
 3. 設定状況を確認
 """
 import sys
@@ -102,6 +102,7 @@ def setup_pcie_bandwidth_threshold(db_path: str = 'db/monitor.db'):
             field_name='available_bandwidth',
             op='<=',
             threshold_value1=50.0,
+            threshold_unit='Gb/s',
             severity_if_match='warning',
             is_abnormal_if_match=True,
             message='PCIe available bandwidth <= 50 Gb/s (性能低下の可能性)',
@@ -125,6 +126,7 @@ def setup_pcie_bandwidth_threshold(db_path: str = 'db/monitor.db'):
             field_name='available_bandwidth',
             op='<=',
             threshold_value1=30.0,
+            threshold_unit='Gb/s',
             severity_if_match='critical',
             is_abnormal_if_match=True,
             message='PCIe available bandwidth <= 30 Gb/s (重大な性能低下)',
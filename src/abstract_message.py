@@ -3,10 +3,50 @@ abstract_message: ログメッセージを正規表現パターンに変換
 この設定が全体のファイルにおいて正規表現のルールを決定する重要な部分
 """
 import re
+from functools import lru_cache
+from typing import Optional, Pattern
 
 
-def abstract_message(message: str) -> str:
+# 16進数・空白類・10進数をいったん置き換える記号
+# （正規表現の特殊文字ではないため re.escape() で変化せず、最後に正規表現へ戻せる）
+_HEX_MARK = '\x01'
+_WS_MARK = '\x02'
+_NUM_MARK = '\x03'
+
+_HEX_PATTERN = re.compile(r'0x[0-9A-Fa-f]+', flags=re.IGNORECASE)
+_WS_PATTERN = re.compile(r'\s+')
+_NUM_PATTERN = re.compile(r'\d+')
+
+
+@lru_cache(maxsize=65536)
+def _skeleton_regex(skeleton: str) -> str:
+    """
+    16進数・空白類・10進数を記号に置き換えたメッセージ（骨格）を正規表現に変換
+
+    数値だけが異なるメッセージは同じ骨格になり、骨格の種類はメッセージよりずっと少ないため、
+    re.escape() を含む変換結果は骨格単位でキャッシュする。
+    """
+    return (re.escape(skeleton)
+            .replace(_HEX_MARK, r'0x[0-9A-Fa-f]+')
+            .replace(_WS_MARK, r'\s+')
+            .replace(_NUM_MARK, r'\d+'))
+
+
+def _needs_reference(message: str) -> bool:
+    """
+    abstract_message() を従来の実装に委譲する必要があるメッセージか判定
     """
+    # 従来の実装はプレースホルダー（___WS___ / ___NUM___）と
+    # エスケープ済みの \d+ / \s+ を文字列置換で戻すため、
+    # メッセージ自体にそれらと紛らわしい文字列が含まれる場合は置換結果が変わりうる。
+    # その場合と、置き換えに使う記号を含む場合は従来の実装に委譲して出力を揃える
+    return ('\\' in message or 'WS' in message or 'NUM' in message
+            or _HEX_MARK in message or _WS_MARK in message or _NUM_MARK in message)
+
+
+@lru_cache(maxsize=65536)
+def abstract_message(message: str) -> str:
+    r"""
     ログメッセージを構造だけを残した正規表現パターンに変換
     
     変換ルール:
@@ -15,6 +55,45 @@ def abstract_message(message: str) -> str:
     - 連続する空白類（スペース/タブなど） → \s+
     - その他の文字は re.escape() でリテラルにする
     
+    16進数・空白類・10進数の順に記号へ置き換えた骨格を作り、骨格単位でキャッシュした
+    正規表現に変換する（置換はいずれも文字列全体に対して C 実装の処理で行う）。
+    結果はメッセージ単位でもキャッシュする。
+    出力は abstract_message_reference()（従来の実装）と同一。
+    
+    Args:
+        message: 元のログメッセージ
+        
+    Returns:
+        正規表現パターン文字列
+    """
+    if _needs_reference(message):
+        return abstract_message_reference(message)
+    
+    # 10進数の途中から始まる16進数（"10x1f" の "0x1f"）も従来の実装と同じく16進数として先に置き換える
+    skeleton = _HEX_PATTERN.sub(_HEX_MARK, message)
+    if skeleton[:1].isspace() or skeleton[-1:].isspace():
+        skeleton = _WS_PATTERN.sub(_WS_MARK, skeleton)
+    else:
+        # 前後に空白類がなければ split() / join() と同じ結果になり、こちらの方が速い
+        # （str.split() と \s の空白類の定義は同じ）
+        skeleton = _WS_MARK.join(skeleton.split())
+    return _skeleton_regex(_NUM_PATTERN.sub(_NUM_MARK, skeleton))
+
+
+def abstract_message_reference(message: str) -> str:
+    r"""
+    ログメッセージを構造だけを残した正規表現パターンに変換（従来の実装）
+    
+    abstract_message() の出力はこの関数と1文字も違わないことを前提としている。
+    プレースホルダーや '\' を含むメッセージは abstract_message() からこの実装に委譲し、
+    それ以外は scripts/check_abstract_message_equivalence.py で一致を確認する。
+    
+    変換ルール:
+    - 0x から始まる16進数 → 0x[0-9A-Fa-f]+
+    - それ以外の10進数 → \d+
+    - 連続する空白類（スペース/タブなど） → \s+
+    - その他の文字は re.escape() でリテラルにする
+    
     Args:
         message: 元のログメッセージ
         
@@ -60,10 +139,128 @@ def abstract_message(message: str) -> str:
     return ''.join(parts)
 
 
+# 型付きトークン: (検出用の正規表現, 置換後の正規表現)
+# 置換後の正規表現は検出したトークンに必ずマッチし、同じ種類のトークンには同じ文字列になる。
+# 複数の種類にマッチする場合は TOKEN_TYPES の順に優先する
+# （IPv4 アドレスは abstract_message() で既に \d+\.\d+\.\d+\.\d+ になるため、型付きトークンは設けない）
+TYPED_TOKENS = {
+    # 8-4-4-4-12 桁の16進数
+    'uuid': (
+        r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b',
+        r'[0-9a-fA-F]{8}\-[0-9a-fA-F]{4}\-[0-9a-fA-F]{4}\-[0-9a-fA-F]{4}\-[0-9a-fA-F]{12}'
+    ),
+    # 12:8b:1a:4e:e4:02
+    'mac': (
+        r'\b[0-9a-fA-F]{2}(?::[0-9a-fA-F]{2}){5}\b',
+        r'[0-9a-fA-F]{2}(?::[0-9a-fA-F]{2}){5}'
+    ),
+    # PCI のバス/デバイス/ファンクション番号（0000:1b:00.0、ドメインの省略形 1b:00.0 を含む）
+    'pci': (
+        r'\b(?:[0-9a-fA-F]{4}:)?[0-9a-fA-F]{2}:[0-9a-fA-F]{2}\.[0-7]\b',
+        r'(?:[0-9a-fA-F]{4}:)?[0-9a-fA-F]{2}:[0-9a-fA-F]{2}\.[0-7]'
+    ),
+    # 単位付きのサイズ（64K, 512M, 2G, 16 GiB など）
+    'size': (
+        r'\b\d+(?:\.\d+)?\s?[KMGTP]i?B?\b',
+        r'\d+(?:\.\d+)?\s?[KMGTP]i?B?'
+    ),
+    # 0x のない16進数（8桁以上で数字と英字の両方を含むもの。e1000e のような名前は対象外）
+    'hex': (
+        r'\b(?=[0-9a-fA-F]*[a-fA-F])(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{8,}\b',
+        r'[0-9a-fA-F]+'
+    ),
+}
+
+TOKEN_TYPES = tuple(TYPED_TOKENS)
+
+
+def parse_token_types(spec: str) -> tuple:
+    """
+    カンマ区切りの型付きトークンの指定を解析（'all' は全種類）
+    
+    Args:
+        spec: 'pci,mac' や 'all' などの文字列
+        
+    Returns:
+        TOKEN_TYPES の順に並べた種類名のタプル
+        
+    Raises:
+        ValueError: 不明な種類が指定された場合
+    """
+    names = {name.strip() for name in spec.split(',') if name.strip()}
+    if 'all' in names:
+        return TOKEN_TYPES
+    unknown = names - set(TOKEN_TYPES)
+    if unknown:
+        raise ValueError(f"unknown token types: {', '.join(sorted(unknown))} "
+                         f"(choose from: {', '.join(TOKEN_TYPES)}, all)")
+    return tuple(name for name in TOKEN_TYPES if name in names)
+
+
+@lru_cache(maxsize=None)
+def _typed_token_pattern(token_types: tuple) -> Pattern:
+    """指定した種類の型付きトークンを検出する正規表現（種類ごとにグループを持つ）"""
+    return re.compile('|'.join(f'(?P<{name}>{TYPED_TOKENS[name][0]})' for name in token_types))
+
+
+@lru_cache(maxsize=65536)
+def abstract_message_typed(message: str, token_types: tuple = TOKEN_TYPES) -> str:
+    """
+    型付きトークン（UUID / MAC / PCI / サイズ / 16進数）を考慮して正規表現パターンに変換
+    
+    型付きトークンは TYPED_TOKENS の置換後の正規表現に、それ以外の部分は
+    abstract_message() と同じ規則で変換する。"0000:1b:00.0" と "0000:3d:00.1" のように
+    区切り文字や 0x のない16進数だけが異なるメッセージが同じパターンになる。
+    
+    Args:
+        message: 元のログメッセージ
+        token_types: 使用する型付きトークンの種類（TOKEN_TYPES の部分集合）
+        
+    Returns:
+        正規表現パターン文字列
+    """
+    if not token_types:
+        return abstract_message(message)
+    
+    parts = []
+    last_end = 0
+    for match in _typed_token_pattern(token_types).finditer(message):
+        if match.start() > last_end:
+            parts.append(abstract_message(message[last_end:match.start()]))
+        parts.append(TYPED_TOKENS[match.lastgroup][1])
+        last_end = match.end()
+    if last_end < len(message):
+        parts.append(abstract_message(message[last_end:]))
+    return ''.join(parts)
+
+
+@lru_cache(maxsize=65536)
+def compile_pattern(pattern: str) -> Optional[Pattern]:
+    """
+    正規表現をコンパイル（結果はパターン文字列単位でキャッシュ）
+    
+    re モジュール内部のキャッシュは上限が小さく、パターン数が多いと
+    再コンパイルが発生するため、独自に保持する。
+    
+    Args:
+        pattern: 正規表現パターン
+        
+    Returns:
+        コンパイル済みの正規表現。不正なパターンの場合はNone
+    """
+    try:
+        return re.compile(pattern)
+    except re.error:
+        return None
+
+
+@lru_cache(maxsize=65536)
 def validate_pattern(pattern: str, original_message: str) -> bool:
     """
     生成されたパターンが元のメッセージにマッチするか検証
     
+    同じメッセージ（複数ホストで繰り返されるブートメッセージなど）の検証結果はキャッシュする。
+    
     Args:
         pattern: 生成された正規表現パターン
         original_message: 元のメッセージ
@@ -71,9 +268,13 @@ def validate_pattern(pattern: str, original_message: str) -> bool:
     Returns:
         マッチする場合True
     """
-    try:
-        regex = re.compile(pattern)
-        return bool(regex.fullmatch(original_message))
-    except re.error:
+    # 骨格から組み立てたパターンは構成上元のメッセージに必ずマッチするため、コンパイルを省く
+    # （大文字の 0X は16進数として置き換えるがパターンは小文字の 0x なので、従来どおり照合する）
+    if ('0X' not in original_message and not _needs_reference(original_message)
+            and abstract_message(original_message) == pattern):
+        return True
+    
+    regex = compile_pattern(pattern)
+    if regex is None:
         return False
-
+    return bool(regex.fullmatch(original_message))
@@ -3,12 +3,133 @@
 """
 import sys
 import os
-from typing import List, Dict, Optional
+import re
+from typing import Callable, List, Dict, Optional, Tuple
 
 # パスを追加してモジュールをインポート可能にする
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.database import Database
+from src.database import Database, TableWatcher
+from src.param_extractor import normalize_value
+
+
+def to_rule_params(params: Dict) -> Dict:
+    """
+    ParamExtractor の抽出結果をルール評価用の形式に変換
+    
+    Args:
+        params: パラメータ名 -> {'num': float or None, 'text': str, 'norm': float or None, 'unit': str or None}
+        
+    Returns:
+        パラメータ名 -> 値（数値があれば数値、なければテキスト）。
+        単位が分かるパラメータは (パラメータ名, 正規化後の単位) -> 正規化後の数値 も含む
+        （threshold_unit を指定した threshold ルールが参照する）
+    """
+    rule_params = {
+        name: data['num'] if data['num'] is not None else data['text']
+        for name, data in params.items()
+    }
+    for name, data in params.items():
+        if data['unit'] is not None:
+            rule_params[(name, data['unit'])] = data['norm']
+    return rule_params
+
+
+# threshold ルールの比較演算子（'==' / '!=' は浮動小数点の誤差を考慮）
+_THRESHOLD_OPS = {
+    '>': lambda value, t1, t2: value > t1,
+    '>=': lambda value, t1, t2: value >= t1,
+    '<': lambda value, t1, t2: value < t1,
+    '<=': lambda value, t1, t2: value <= t1,
+    '==': lambda value, t1, t2: abs(value - t1) < 0.0001,
+    '!=': lambda value, t1, t2: abs(value - t1) >= 0.0001,
+    'between': lambda value, t1, t2: t1 <= value <= t2,
+    'not_between': lambda value, t1, t2: not (t1 <= value <= t2),
+}
+
+
+def _never(message: str, params: Dict) -> bool:
+    return False
+
+
+def compile_rule(rule) -> Callable[[str, Dict], bool]:
+    """
+    ルールを1度だけ解釈し、(message, params) を受け取る判定関数に変換
+    
+    rule_type / op の分岐や regex ルールの re.compile() を評価のたびに行わないよう、
+    ルールの読み込み時に呼び出す。
+    
+    Args:
+        rule: ルール情報（pattern_rules の行、sqlite3.Row または辞書）
+        
+    Returns:
+        ルールにマッチした場合Trueを返す関数
+        （params は to_rule_params() の戻り値）
+    """
+    rule_type = rule['rule_type']
+    field_name = rule['field_name']
+    threshold1 = rule['threshold_value1']
+    threshold2 = rule['threshold_value2']
+    
+    if rule_type == 'threshold':
+        # しきい値チェック（パラメータが必要）
+        compare = _THRESHOLD_OPS.get(rule['op'])
+        if not field_name or compare is None:
+            return _never
+        if rule['op'] in ('between', 'not_between') and (threshold1 is None or threshold2 is None):
+            return _never
+        
+        # threshold_unit があれば閾値とパラメータを正規化後の単位で比較
+        # （同じ単位に換算できないパラメータにはマッチしない）
+        key = field_name
+        threshold_unit = rule['threshold_unit'] if 'threshold_unit' in rule.keys() else None
+        if threshold_unit:
+            threshold1, unit = normalize_value(threshold1, threshold_unit)
+            threshold2, _unit = normalize_value(threshold2, threshold_unit)
+            if unit is None:
+                return _never
+            key = (field_name, unit)
+        
+        def threshold_predicate(message: str, params: Dict) -> bool:
+            value = params.get(key)
+            if not isinstance(value, (int, float)):
+                return False
+            return compare(value, threshold1, threshold2)
+        return threshold_predicate
+    
+    if rule_type == 'contains':
+        # threshold_value1 を検索文字列として使用
+        if threshold1 is None:
+            return _never
+        needle = str(threshold1)
+        if field_name:
+            # パラメータの値に含まれるかチェック
+            def contains_param_predicate(message: str, params: Dict) -> bool:
+                return field_name in params and needle in str(params[field_name])
+            return contains_param_predicate
+        
+        # メッセージ本文に含まれるかチェック
+        def contains_message_predicate(message: str, params: Dict) -> bool:
+            return needle in message
+        return contains_message_predicate
+    
+    if rule_type == 'regex':
+        # threshold_value1 を正規表現パターンとして使用
+        if threshold1 is None:
+            return _never
+        try:
+            pattern = re.compile(str(threshold1))
+        except re.error:
+            return _never
+        
+        def regex_predicate(message: str, params: Dict) -> bool:
+            # パラメータが抽出されていなければメッセージ本文を検索
+            if field_name and field_name in params:
+                return bool(pattern.search(str(params[field_name])))
+            return bool(pattern.search(message))
+        return regex_predicate
+    
+    return _never
 
 
 class AnomalyDetector:
@@ -20,6 +141,9 @@ class AnomalyDetector:
             db: Databaseインスタンス
         """
         self.db = db
+        # パターンID -> [(判定関数, 異常情報), ...]（ルールID順）。未読み込みの場合はNone
+        self._evaluators_by_pattern: Optional[Dict[int, List[Tuple[Callable, Dict]]]] = None
+        self._watcher = TableWatcher(('pattern_rules',))
     
     def check_anomaly(self, log_id: int, pattern_id: int) -> Optional[Dict]:
         """
@@ -43,16 +167,7 @@ class AnomalyDetector:
         cursor = conn.cursor()
         
         # パターンに関連するアクティブなルールを取得
-        cursor.execute("""
-            SELECT id, rule_type, field_name, op, 
-                   threshold_value1, threshold_value2,
-                   severity_if_match, is_abnormal_if_match, message
-            FROM pattern_rules
-            WHERE pattern_id = ? AND is_active = 1
-            ORDER BY id
-        """, (pattern_id,))
-        
-        rules = cursor.fetchall()
+        rules = self._fetch_rules(cursor, pattern_id)
         if not rules:
             return None
         
@@ -68,29 +183,165 @@ class AnomalyDetector:
         
         # パラメータを取得
         cursor.execute("""
-            SELECT param_name, param_value_num, param_value_text
+            SELECT param_name, param_value_num, param_value_text, param_value_norm, param_unit
             FROM log_params
             WHERE log_id = ?
         """, (log_id,))
         
-        params = {}
+        params = to_rule_params({
+            row['param_name']: {
+                'num': row['param_value_num'],
+                'text': row['param_value_text'],
+                'norm': row['param_value_norm'],
+                'unit': row['param_unit']
+            }
+            for row in cursor.fetchall()
+        })
+        
+        return self._evaluate_rules(rules, log_entry['message'], params)
+    
+    def check_anomaly_values(self, pattern_id: int, message: str, params: Dict) -> Optional[Dict]:
+        """
+        INSERT前のログに対して異常判定を実行（データベースを参照しない）
+        
+        ルールはプロセス内にキャッシュしたものを使用する。
+        pattern_rules の変更は refresh_if_changed() で反映すること。
+        
+        Args:
+            pattern_id: パターンID
+            message: ログメッセージ
+            params: ParamExtractor.extract_params() の戻り値
+                    （パラメータ名 -> {'num', 'text', 'norm', 'unit'}）
+            
+        Returns:
+            check_anomaly() と同じ形式の辞書。異常が検知されない場合はNone
+        """
+        evaluators = self.get_evaluators(pattern_id)
+        if not evaluators:
+            return None
+        
+        rule_params = to_rule_params(params)
+        for predicate, anomaly_info in evaluators:
+            if predicate(message, rule_params):
+                return dict(anomaly_info)
+        return None
+    
+    def get_evaluators(self, pattern_id: int) -> List[Tuple[Callable, Dict]]:
+        """
+        パターンに関連するアクティブなルールの判定関数をキャッシュから取得
+        （初回のみ全ルールを読み込んでコンパイルする）
+        
+        Args:
+            pattern_id: パターンID
+            
+        Returns:
+            (判定関数, マッチした場合の異常情報) のリスト（ルールID順）
+        """
+        if self._evaluators_by_pattern is None:
+            self.load_rules(self.db.get_connection().cursor())
+        return self._evaluators_by_pattern.get(pattern_id, [])
+    
+    def load_rules(self, cursor):
+        """
+        アクティブなルールを全て読み込み、判定関数にコンパイルしてパターンIDごとにキャッシュ
+        
+        Args:
+            cursor: データベースカーソル
+        """
+        cursor.execute("""
+            SELECT id, pattern_id, rule_type, field_name, op,
+                   threshold_value1, threshold_value2, threshold_unit,
+                   severity_if_match, is_abnormal_if_match, message
+            FROM pattern_rules
+            WHERE is_active = 1
+            ORDER BY pattern_id, id
+        """)
+        evaluators_by_pattern: Dict[int, List[Tuple[Callable, Dict]]] = {}
         for row in cursor.fetchall():
-            param_name = row['param_name']
-            # 数値があれば数値を使用、なければテキスト
-            params[param_name] = row['param_value_num'] if row['param_value_num'] is not None else row['param_value_text']
+            evaluators_by_pattern.setdefault(row['pattern_id'], []).append(
+                (compile_rule(row), self._anomaly_info(row))
+            )
+        self._evaluators_by_pattern = evaluators_by_pattern
+    
+    def invalidate(self):
+        """ルールのキャッシュを破棄（次回の判定時に読み込み直す）"""
+        self._evaluators_by_pattern = None
+    
+    def refresh_if_changed(self, cursor) -> bool:
+        """
+        他の接続が pattern_rules を変更していればルールのキャッシュを破棄
+        
+        TableWatcher で検知するため、他の接続によるログの書き込みでは無効化されない。
+        ログ1行ごとではなくコミットごとに呼び出す想定。
+        
+        Args:
+            cursor: データベースカーソル
+            
+        Returns:
+            キャッシュを破棄した場合True
+        """
+        changed = self._watcher.poll(cursor)
+        if changed:
+            self.invalidate()
+        return changed
+    
+    def _fetch_rules(self, cursor, pattern_id: int) -> List:
+        """
+        パターンに関連するアクティブなルールをID順に取得
         
-        # 各ルールを評価
+        Args:
+            cursor: データベースカーソル
+            pattern_id: パターンID
+            
+        Returns:
+            ルールのリスト（sqlite3.Row）
+        """
+        cursor.execute("""
+            SELECT id, rule_type, field_name, op, 
+                   threshold_value1, threshold_value2, threshold_unit,
+                   severity_if_match, is_abnormal_if_match, message
+            FROM pattern_rules
+            WHERE pattern_id = ? AND is_active = 1
+            ORDER BY id
+        """, (pattern_id,))
+        return cursor.fetchall()
+    
+    def _evaluate_rules(self, rules, message: str, params: Dict) -> Optional[Dict]:
+        """
+        ルールを順に評価し、最初にマッチしたルールの異常情報を返す
+        
+        Args:
+            rules: ルールのリスト（ID順）
+            message: ログメッセージ
+            params: パラメータ名 -> 値（数値または文字列）
+            
+        Returns:
+            異常情報の辞書。どのルールにもマッチしない場合はNone
+        """
         for rule in rules:
-            if self._evaluate_rule(rule, log_entry['message'], params):
-                return {
-                    'is_abnormal': bool(rule['is_abnormal_if_match']),
-                    'classification': 'abnormal',
-                    'severity': rule['severity_if_match'],
-                    'anomaly_reason': rule['message'] or f"Rule {rule['id']} matched"
-                }
+            if self._evaluate_rule(rule, message, params):
+                return self._anomaly_info(rule)
         
         return None
     
+    @staticmethod
+    def _anomaly_info(rule) -> Dict:
+        """
+        ルールにマッチした場合の異常情報
+        
+        Args:
+            rule: ルール情報
+            
+        Returns:
+            check_anomaly() と同じ形式の辞書
+        """
+        return {
+            'is_abnormal': bool(rule['is_abnormal_if_match']),
+            'classification': 'abnormal',
+            'severity': rule['severity_if_match'],
+            'anomaly_reason': rule['message'] or f"Rule {rule['id']} matched"
+        }
+    
     def _evaluate_rule(self, rule: Dict, message: str, params: Dict) -> bool:
         """
         個別のルールを評価
@@ -103,79 +354,7 @@ class AnomalyDetector:
         Returns:
             ルールにマッチした場合True
         """
-        rule_type = rule['rule_type']
-        op = rule['op']
-        # sqlite3.Rowオブジェクトなので、辞書のようにアクセス
-        field_name = rule['field_name'] if rule['field_name'] is not None else None
-        
-        if rule_type == 'threshold':
-            # しきい値チェック（パラメータが必要）
-            if not field_name or field_name not in params:
-                return False
-            
-            value = params[field_name]
-            if not isinstance(value, (int, float)):
-                return False
-            
-            threshold1 = rule['threshold_value1']
-            threshold2 = rule['threshold_value2']
-            
-            if op == '>':
-                return value > threshold1
-            elif op == '>=':
-                return value >= threshold1
-            elif op == '<':
-                return value < threshold1
-            elif op == '<=':
-                return value <= threshold1
-            elif op == '==':
-                return abs(value - threshold1) < 0.0001  # 浮動小数点比較
-            elif op == '!=':
-                return abs(value - threshold1) >= 0.0001
-            elif op == 'between':
-                if threshold1 is None or threshold2 is None:
-                    return False
-                return threshold1 <= value <= threshold2
-            elif op == 'not_between':
-                if threshold1 is None or threshold2 is None:
-                    return False
-                return not (threshold1 <= value <= threshold2)
-        
-        elif rule_type == 'contains':
-            # メッセージに特定の文字列が含まれるかチェック
-            if field_name:
-                # パラメータの値に含まれるかチェック
-                if field_name in params:
-                    search_text = str(params[field_name])
-                else:
-                    return False
-            else:
-                # メッセージ本文に含まれるかチェック
-                search_text = message
-            
-            threshold1 = rule['threshold_value1']  # 検索文字列として使用
-            if threshold1 is None:
-                return False
-            
-            return str(threshold1) in search_text
-        
-        elif rule_type == 'regex':
-            # 正規表現マッチング
-            import re
-            threshold1 = rule['threshold_value1']  # 正規表現パターンとして使用
-            if threshold1 is None:
-                return False
-            
-            try:
-                pattern = re.compile(str(threshold1))
-                if field_name and field_name in params:
-                    return bool(pattern.search(str(params[field_name])))
-                else:
-                    return bool(pattern.search(message))
-            except re.error:
-                return False
-        
-        return False
+        return compile_rule(rule)(message, params)
     
     def update_log_anomaly(self, log_id: int, anomaly_info: Dict):
         """
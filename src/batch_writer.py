@@ -0,0 +1,135 @@
+"""
+バッチ書き込み: log_entries / log_params / alerts への INSERT をまとめて実行
+"""
+from typing import Dict, List, Optional, Tuple
+
+
+class BatchWriter:
+    """
+    分類済みのログをバッファリングし、executemany でまとめて書き込むクラス
+
+    log_entries の ID は flush() 時にブロック単位で採番するため、
+    log_params / alerts も同じバッチ内で log_id を確定させて書き込める。
+    分類（classification / severity / anomaly_reason）は INSERT 前に確定させておくこと。
+    """
+
+    def __init__(self, conn, batch_size: int = 1000):
+        """
+        Args:
+            conn: sqlite3 接続
+            batch_size: 1回の flush で書き込む最大ログ件数の目安
+        """
+        self.conn = conn
+        self.batch_size = batch_size
+        # (ts, host, component, raw_line, message, pattern_id, is_known, classification, severity, anomaly_reason)
+        self._entries: List[Tuple] = []
+        # (バッファ内インデックス, param_name, param_value_num, param_value_text, param_value_norm, param_unit)
+        self._params: List[Tuple] = []
+        # (バッファ内インデックス, alert_type)
+        self._alerts: List[Tuple] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def is_full(self) -> bool:
+        """バッファが batch_size に達したかどうか"""
+        return len(self._entries) >= self.batch_size
+
+    def add(self, parsed: Dict, pattern_id: Optional[int], is_known: int,
+            classification: str, severity: Optional[str], anomaly_reason: Optional[str] = None,
+            params: Optional[Dict] = None, alert_type: Optional[str] = None):
+        """
+        分類済みのログ1件をバッファに追加
+
+        Args:
+            parsed: LogParser.parse_line() の戻り値
+            pattern_id: パターンID
+            is_known: 既知フラグ（0/1）
+            classification: 最終的な分類
+            severity: 重要度
+            anomaly_reason: 異常理由
+            params: ParamExtractor.extract_params() の戻り値
+            alert_type: アラートを作成する場合のタイプ（'abnormal' または 'unknown'）
+        """
+        index = len(self._entries)
+        self._entries.append((
+            parsed['ts'],
+            parsed['host'],
+            parsed['component'],
+            parsed['raw_line'],
+            parsed['message'],
+            pattern_id,
+            is_known,
+            classification,
+            severity,
+            anomaly_reason
+        ))
+        if params:
+            for param_name, param_data in params.items():
+                self._params.append((index, param_name, param_data['num'], param_data['text'],
+                                     param_data['norm'], param_data['unit']))
+        if alert_type:
+            self._alerts.append((index, alert_type))
+
+    def _reserve_ids(self, cursor) -> int:
+        """
+        log_entries の ID をブロック単位で確保し、先頭IDを返す
+
+        書き込みロックを取得してから採番するため、他の接続と ID が衝突しない。
+        AUTOINCREMENT のため sqlite_sequence の値（削除済みIDを含む最大値）も考慮する。
+        """
+        if not self.conn.in_transaction:
+            cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("""
+            SELECT MAX(
+                COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'log_entries'), 0),
+                COALESCE((SELECT MAX(id) FROM log_entries), 0)
+            )
+        """)
+        return cursor.fetchone()[0] + 1
+
+    def flush(self, cursor) -> int:
+        """
+        バッファ内のログを書き込む（コミットは呼び出し側で行う）
+
+        Args:
+            cursor: データベースカーソル
+
+        Returns:
+            書き込んだログ件数
+        """
+        if not self._entries:
+            return 0
+
+        first_id = self._reserve_ids(cursor)
+
+        cursor.executemany("""
+            INSERT INTO log_entries
+            (id, ts, host, component, raw_line, message, pattern_id, is_known, classification, severity, anomaly_reason)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(first_id + index,) + entry for index, entry in enumerate(self._entries)])
+
+        if self._params:
+            cursor.executemany("""
+                INSERT INTO log_params
+                (log_id, param_name, param_value_num, param_value_text, param_value_norm, param_unit)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(first_id + param[0],) + param[1:] for param in self._params])
+
+        if self._alerts:
+            cursor.executemany("""
+                INSERT INTO alerts
+                (log_id, alert_type, channel, status)
+                VALUES (?, ?, 'slack', 'pending')
+            """, [(first_id + index, alert_type) for index, alert_type in self._alerts])
+
+        written = len(self._entries)
+        self.clear()
+        return written
+
+    def clear(self):
+        """バッファを破棄（ロールバック時など、書き込まずに捨てる場合に使用）"""
+        self._entries.clear()
+        self._params.clear()
+        self._alerts.clear()
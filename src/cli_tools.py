@@ -3,6 +3,7 @@ CLIツール: 未知パターン表示、統計表示など
 """
 import sys
 import os
+from typing import Dict, List
 
 # パスを追加してモジュールをインポート可能にする
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -305,9 +306,10 @@ def add_pattern(db_path: str, regex_rule: str, sample_message: str,
                     severity = ?,
                     note = ?,
                     has_params = ?,
+                    component = ?,
                     updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
-            """, (label, severity, note, has_params, existing['id']))
+            """, (label, severity, note, has_params, component, existing['id']))
             conn.commit()
             print(f"Updated pattern {existing['id']}")
             db.close()
@@ -328,9 +330,9 @@ def add_pattern(db_path: str, regex_rule: str, sample_message: str,
     now = datetime.now()
     cursor.execute("""
         INSERT INTO regex_patterns
-        (regex_rule, manual_regex_rule, sample_message, label, severity, note, has_params, first_seen_at, last_seen_at, total_count)
-        VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, 0)
-    """, (regex_rule, sample_message, label, severity, note, has_params, now, now))
+        (regex_rule, manual_regex_rule, sample_message, label, severity, note, has_params, component, first_seen_at, last_seen_at, total_count)
+        VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+    """, (regex_rule, sample_message, label, severity, note, has_params, component, now, now))
     
     pattern_id = cursor.lastrowid
     conn.commit()
@@ -410,7 +412,271 @@ def add_pattern_from_log(db_path: str, log_id: int, label: str = 'normal',
     return pattern_id
 
 
-def reprocess_pattern(db_path: str, pattern_id: int, verbose: bool = False):
+# reprocess-pattern(s) の照合処理の状態（ワーカープロセスでは _init_reprocess_worker で初期化）
+_reprocess_state = {}
+
+
+def _init_reprocess_worker(pattern_rows: list):
+    """
+    reprocess-pattern(s) のワーカープロセスの初期化
+    
+    Args:
+        pattern_rows: PatternMatcher.rows() の戻り値
+    """
+    from src.pattern_matcher import ManualPatternIndex
+    from src.param_extractor import ParamExtractor
+    
+    matcher = ManualPatternIndex()
+    matcher.build(pattern_rows)
+    _reprocess_state['matcher'] = matcher
+    _reprocess_state['param_extractor'] = ParamExtractor()
+
+
+def _match_reprocess_rows(rows: list) -> list:
+    """
+    ログを全パターンと照合し、マッチしたログのパラメータを抽出
+    
+    Args:
+        rows: (log_id, component, message) のリスト
+        
+    Returns:
+        マッチしたログの (log_id, pattern_id, message, values) のリスト
+        （values は ParamExtractor.extract_many() のメッセージごとの値）
+    """
+    matcher = _reprocess_state['matcher']
+    param_extractor = _reprocess_state['param_extractor']
+    pattern_ids = matcher.match_many([row[2] for row in rows], [row[1] for row in rows])
+    
+    # パラメータはパターンごとにまとめて抽出する
+    by_pattern = {}
+    for row, pattern_id in zip(rows, pattern_ids):
+        if pattern_id is not None:
+            by_pattern.setdefault(pattern_id, []).append(row)
+    results = []
+    for pattern_id, matched_rows in by_pattern.items():
+        _layout, values = param_extractor.extract_many(
+            matcher.rule_of(pattern_id), [row[2] for row in matched_rows])
+        for (log_id, _component, message), row_values in zip(matched_rows, values):
+            results.append((log_id, pattern_id, message, row_values))
+    return results
+
+
+def _reprocess_logs(db: Database, patterns: list, verbose: bool = False,
+                    chunk_size: int = 50000, workers: int = 1) -> Dict:
+    """
+    log_entries を1回走査し、各ログを最初にマッチしたパターン（ID順）で再処理
+    
+    ログはIDの範囲ごとに fetchmany で読み込み、範囲ごとにコミットするため、
+    テーブル全体をメモリに載せない。パターンに必ず含まれるリテラルを含まないログは
+    SQL（instr）の段階で除外し、正規表現は残った候補にだけ適用する。
+    
+    Args:
+        db: Databaseインスタンス
+        patterns: regex_patterns の行（id, regex_rule, manual_regex_rule, label, severity, component）のリスト
+        verbose: 詳細出力するかどうか
+        chunk_size: 1回に読み込み・コミットするログIDの範囲
+        workers: 正規表現の照合を行うプロセス数（1の場合はこのプロセスで実行）
+        
+    Returns:
+        処理結果の統計情報
+    """
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+    from src.anomaly_detector import AnomalyDetector
+    from src.pattern_matcher import PatternMatcher
+    from src.param_extractor import ParamExtractor
+    from src.regex_literals import required_literals
+    
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    
+    # 対象パターンだけを読み込んだ照合エンジン（ワーカーには rows() のスナップショットを渡す）
+    matcher = PatternMatcher(db, [row['id'] for row in patterns])
+    matcher.load(cursor)
+    for pattern_id, error in matcher.compile_errors.items():
+        print(f"Warning: Invalid regex (pattern {pattern_id}): {error}", file=sys.stderr)
+    pattern_rows = matcher.rows()
+    
+    # 各パターンで最も長い必須リテラルのいずれかを含むログだけを候補にする
+    # （必須リテラルを持たないパターンが1つでもあれば絞り込まない）
+    literals = []
+    for _pattern_id, rule, _component in pattern_rows:
+        pattern_literals = required_literals(rule)
+        if not pattern_literals:
+            literals = []
+            break
+        literals.append(pattern_literals[0])
+    if len(pattern_rows) == 1 and literals:
+        # 単一パターンでは必須リテラルを最大3つまで AND で絞り込む
+        literals = required_literals(pattern_rows[0][1])[:3]
+        prefilter_sql = ''.join(" AND instr(message, ?) > 0" for _ in literals)
+    elif literals:
+        # 他のリテラルを含むリテラルは条件として冗長なので除外
+        literals = sorted(lit for lit in set(literals)
+                          if not any(other != lit and other in lit for other in literals))
+        prefilter_sql = " AND (" + " OR ".join("instr(message, ?) > 0" for _ in literals) + ")"
+    else:
+        prefilter_sql = ''
+    prefilter_params = tuple(literals)
+    # 全パターンがコンポーネント専用なら、対象のコンポーネントのログだけを読む
+    components = sorted({component for _, _, component in pattern_rows if component is not None})
+    if components and all(component is not None for _, _, component in pattern_rows):
+        prefilter_sql += f" AND component IN ({','.join('?' * len(components))})"
+        prefilter_params += tuple(components)
+    if verbose:
+        print(f"Prefilter literals: {literals}")
+        if components:
+            print(f"Components: {components}")
+    
+    # パターンごとのラベルに基づく分類（'unknown' の場合は 'normal'）
+    labels = {}
+    for row in patterns:
+        classification = row['label']
+        if classification == 'unknown':
+            classification = 'normal'
+        labels[row['id']] = (classification, row['severity'])
+    
+    anomaly_detector = AnomalyDetector(db)
+    param_extractor = ParamExtractor()
+    # パターンID -> パラメータ名と値のタプル内の位置（ワーカーの抽出結果と同じ並び）
+    layouts = {pattern_id: param_extractor.layout(rule) for pattern_id, rule, _component in pattern_rows}
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_reprocess_worker,
+                                   initargs=(pattern_rows,))
+    else:
+        _reprocess_state['matcher'] = matcher
+        _reprocess_state['param_extractor'] = param_extractor
+    
+    cursor.execute("SELECT MIN(id), MAX(id), COUNT(*) FROM log_entries")
+    min_id, max_id, total_rows = cursor.fetchone()
+    
+    stats = {
+        'scanned': total_rows,
+        'candidates': 0,
+        'matched': 0,
+        'params_extracted': 0,
+        'abnormal': 0,
+        'matched_by_pattern': {row['id']: 0 for row in patterns},
+        'elapsed': 0.0,
+    }
+    started = time.perf_counter()
+    read_cursor = conn.cursor()
+    
+    try:
+        for chunk_start in range(min_id or 0, (max_id or -1) + 1, chunk_size):
+            # IDの範囲ごとに候補を読み込む
+            read_cursor.execute(f"""
+                SELECT id, component, message
+                FROM log_entries
+                WHERE id BETWEEN ? AND ?{prefilter_sql}
+            """, (chunk_start, chunk_start + chunk_size - 1) + prefilter_params)
+            batches = []
+            while True:
+                rows = read_cursor.fetchmany(2000)
+                if not rows:
+                    break
+                batches.append([(row['id'], row['component'], row['message']) for row in rows])
+                stats['candidates'] += len(rows)
+            if not batches:
+                continue
+            
+            # パターンとの照合とパラメータ抽出
+            if pool:
+                results = [match for matches in pool.map(_match_reprocess_rows, batches) for match in matches]
+            else:
+                results = [match for batch in batches for match in _match_reprocess_rows(batch)]
+            if not results:
+                continue
+            
+            stats['matched'] += len(results)
+            entry_rows = []
+            param_rows = []
+            anomaly_rows = []
+            for log_id, pattern_id, message, values in results:
+                stats['matched_by_pattern'][pattern_id] += 1
+                classification, severity = labels[pattern_id]
+                entry_rows.append((pattern_id, classification, severity, log_id))
+                if values is not None:
+                    stored = len(param_rows)
+                    for param_name, index in layouts[pattern_id].items():
+                        if values[index] is not None:
+                            param_rows.append((log_id, param_name) + values[index])
+                    if len(param_rows) > stored:
+                        stats['params_extracted'] += 1
+                
+                # 異常判定を実行（抽出したパラメータで判定するためDBを参照しない）
+                # ルールのないパターンではパラメータの辞書を作らない
+                if not anomaly_detector.get_evaluators(pattern_id):
+                    continue
+                params = ParamExtractor.to_params(layouts[pattern_id], values)
+                anomaly_info = anomaly_detector.check_anomaly_values(pattern_id, message, params)
+                if anomaly_info:
+                    stats['abnormal'] += 1
+                    anomaly_rows.append((
+                        anomaly_info['classification'],
+                        anomaly_info['severity'],
+                        anomaly_info['anomaly_reason'],
+                        log_id
+                    ))
+                    if verbose:
+                        print(f"Log {log_id}: abnormal detected - {anomaly_info['anomaly_reason']}")
+            
+            # ログエントリを更新（is_known=1に設定）
+            cursor.executemany("""
+                UPDATE log_entries
+                SET pattern_id = ?,
+                    is_known = 1,
+                    classification = ?,
+                    severity = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, entry_rows)
+            
+            # 既存のパラメータを削除して再抽出した値を保存
+            cursor.executemany("DELETE FROM log_params WHERE log_id = ?", [(row[3],) for row in entry_rows])
+            cursor.executemany("""
+                INSERT INTO log_params
+                (log_id, param_name, param_value_num, param_value_text, param_value_norm, param_unit)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, param_rows)
+            
+            cursor.executemany("""
+                UPDATE log_entries
+                SET classification = ?,
+                    severity = ?,
+                    anomaly_reason = ?
+                WHERE id = ?
+            """, anomaly_rows)
+            
+            # 範囲ごとにコミットして書き込みロックを手放す
+            conn.commit()
+            
+            if verbose:
+                print(f"Processed up to log ID {chunk_start + chunk_size - 1} "
+                      f"({stats['matched']} matched)", file=sys.stderr)
+    finally:
+        if pool:
+            pool.shutdown()
+    
+    conn.commit()
+    stats['elapsed'] = time.perf_counter() - started
+    return stats
+
+
+def _print_reprocess_stats(stats: Dict):
+    """reprocess-pattern(s) の処理結果を表示"""
+    elapsed = stats['elapsed']
+    rate = stats['scanned'] / elapsed if elapsed > 0 else 0
+    print(f"  Scanned logs: {stats['scanned']} (candidates after prefilter: {stats['candidates']})")
+    print(f"  Matched logs: {stats['matched']}")
+    print(f"  Logs with parameters extracted: {stats['params_extracted']}")
+    print(f"  Logs marked as abnormal: {stats['abnormal']}")
+    print(f"  Elapsed: {elapsed:.2f}s ({rate:.0f} rows/sec)")
+
+
+def reprocess_pattern(db_path: str, pattern_id: int, verbose: bool = False,
+                      chunk_size: int = 50000, workers: int = 1):
     """
     既存のログエントリを指定されたパターンにマッチさせて再処理
     パラメータ抽出と異常判定を実行
@@ -419,10 +685,10 @@ def reprocess_pattern(db_path: str, pattern_id: int, verbose: bool = False):
         db_path: データベースパス
         pattern_id: パターンID
         verbose: 詳細出力するかどうか
+        chunk_size: 1回に読み込み・コミットするログIDの範囲
+        workers: 正規表現の照合を行うプロセス数（1の場合はこのプロセスで実行）
     """
     import re
-    from src.param_extractor import ParamExtractor
-    from src.anomaly_detector import AnomalyDetector
     
     db = Database(db_path)
     conn = db.get_connection()
@@ -430,7 +696,7 @@ def reprocess_pattern(db_path: str, pattern_id: int, verbose: bool = False):
     
     # パターン情報を取得
     cursor.execute("""
-        SELECT id, regex_rule, manual_regex_rule, label, severity
+        SELECT id, regex_rule, manual_regex_rule, label, severity, component
         FROM regex_patterns
         WHERE id = ?
     """, (pattern_id,))
@@ -450,98 +716,1067 @@ def reprocess_pattern(db_path: str, pattern_id: int, verbose: bool = False):
     
     # パターンをコンパイル
     try:
-        compiled_pattern = re.compile(pattern_to_use)
+        re.compile(pattern_to_use)
     except re.error as e:
         print(f"Error: Invalid regex pattern: {e}")
         db.close()
         sys.exit(1)
     
-    # すべてのログエントリを取得して、パターンにマッチするものを再処理
-    # 既にこのパターンに紐付いているログ、またはマッチする可能性のあるログを処理
-    cursor.execute("""
-        SELECT id, message, classification, is_known
-        FROM log_entries
+    stats = _reprocess_logs(db, [pattern_row], verbose, chunk_size, workers)
+    
+    print(f"Reprocessed pattern {pattern_id}")
+    _print_reprocess_stats(stats)
+    
+    db.close()
+
+
+def reprocess_patterns(db_path: str, pattern_ids: List[int] = None, since: str = None,
+                       verbose: bool = False, chunk_size: int = 50000, workers: int = 1):
+    """
+    複数のパターンで既存のログエントリを一括再処理（log_entries の走査は1回）
+    
+    各ログには、指定されたパターンのうち最初にマッチしたもの（ID順）を適用する。
+    インジェスト時の手動パターンと同じ優先順位。
+    
+    Args:
+        db_path: データベースパス
+        pattern_ids: 再処理するパターンIDのリスト
+        since: この日時以降に作成・更新された手動パターンも対象にする（'YYYY-MM-DD HH:MM:SS'、UTC）
+        verbose: 詳細出力するかどうか
+        chunk_size: 1回に読み込み・コミットするログIDの範囲
+        workers: 正規表現の照合を行うプロセス数（1の場合はこのプロセスで実行）
+    """
+    import re
+    from datetime import datetime
+    
+    if since:
+        try:
+            datetime.fromisoformat(since)
+        except ValueError:
+            print(f"Error: Invalid --since value '{since}' (expected YYYY-MM-DD HH:MM:SS)")
+            sys.exit(1)
+    
+    db = Database(db_path)
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    
+    conditions = []
+    values = []
+    if pattern_ids:
+        conditions.append(f"id IN ({','.join('?' * len(pattern_ids))})")
+        values.extend(pattern_ids)
+    if since:
+        # 文字列のまま比較すると 'T' 区切りや小数秒の有無で大小が変わるため、datetime() で揃えて比較する
+        conditions.append("(manual_regex_rule IS NOT NULL AND "
+                          "(datetime(created_at) >= datetime(?) OR datetime(updated_at) >= datetime(?)))")
+        values.extend([since, since])
+    if not conditions:
+        print("Error: Specify pattern IDs or --since")
+        db.close()
+        sys.exit(1)
+    
+    cursor.execute(f"""
+        SELECT id, regex_rule, manual_regex_rule, label, severity, component
+        FROM regex_patterns
+        WHERE {' OR '.join(conditions)}
         ORDER BY id
-    """)
+    """, values)
+    rows = cursor.fetchall()
+    
+    found_ids = {row['id'] for row in rows}
+    for pattern_id in pattern_ids or []:
+        if pattern_id not in found_ids:
+            print(f"Warning: Pattern {pattern_id} not found", file=sys.stderr)
+    
+    # 無効な正規表現のパターンは除外して続行
+    patterns = []
+    for row in rows:
+        try:
+            re.compile(row['manual_regex_rule'] or row['regex_rule'])
+            patterns.append(row)
+        except re.error as e:
+            print(f"Warning: Invalid regex pattern (pattern {row['id']}): {e}", file=sys.stderr)
+    
+    if not patterns:
+        print("No patterns to reprocess")
+        db.close()
+        return
     
-    logs = cursor.fetchall()
+    stats = _reprocess_logs(db, patterns, verbose, chunk_size, workers)
     
-    param_extractor = ParamExtractor()
-    anomaly_detector = AnomalyDetector(db)
+    print(f"Reprocessed {len(patterns)} patterns")
+    _print_reprocess_stats(stats)
+    if verbose:
+        for pattern_id, count in stats['matched_by_pattern'].items():
+            if count:
+                print(f"  Pattern {pattern_id}: {count} logs")
+    
+    db.close()
+
+
+_VALID_LABELS = ('normal', 'abnormal', 'unknown', 'ignore')
+_VALID_SEVERITIES = ('info', 'warning', 'critical', 'unknown')
+_VALID_RULE_TYPES = ('threshold', 'contains', 'regex')
+_VALID_THRESHOLD_OPS = ('>', '<', '>=', '<=', '==', '!=', 'between', 'not_between')
+
+
+def _load_pattern_file(file_path: str) -> list:
+    """
+    パターン定義ファイル（JSON/YAML）を読み込む
     
-    matched_count = 0
-    param_extracted_count = 0
-    abnormal_detected_count = 0
+    ファイルはパターンのリスト、または {"patterns": [...]} の形式。
+    拡張子が .yaml/.yml の場合は YAML として読み込む（PyYAML が必要）。
     
-    for log_row in logs:
-        log_id = log_row['id']
-        message = log_row['message']
+    Args:
+        file_path: ファイルパス
         
-        # パターンにマッチするかチェック
-        if compiled_pattern.search(message):
-            matched_count += 1
-            
-            # ログエントリを更新（is_known=1に設定）
-            classification = pattern_row['label']
-            if classification == 'unknown':
-                classification = 'normal'
+    Returns:
+        パターン定義（辞書）のリスト
+    """
+    import json
+    
+    with open(file_path, 'r', encoding='utf-8') as f:
+        if file_path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                print("Error: PyYAML is required to read YAML files (pip install pyyaml)")
+                sys.exit(1)
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    
+    if isinstance(data, dict):
+        data = data.get('patterns')
+    if not isinstance(data, list):
+        print("Error: Pattern file must contain a list of patterns (or a 'patterns' key)")
+        sys.exit(1)
+    return data
+
+
+def _validate_pattern_spec(index: int, spec) -> List[str]:
+    """
+    パターン定義（とそのルール）を検証
+    
+    Args:
+        index: ファイル内の位置（エラーメッセージ用）
+        spec: パターン定義の辞書
+        
+    Returns:
+        エラーメッセージのリスト（問題がなければ空）
+    """
+    import re
+    from src.param_extractor import get_named_capture_group_names, UNITS
+    
+    where = f"patterns[{index}]"
+    if not isinstance(spec, dict):
+        return [f"{where}: must be a mapping"]
+    
+    errors = []
+    regex_rule = spec.get('regex')
+    group_names = None
+    if not isinstance(regex_rule, str) or not regex_rule:
+        errors.append(f"{where}: 'regex' is required")
+    else:
+        try:
+            re.compile(regex_rule)
+            group_names = get_named_capture_group_names(regex_rule)
+        except re.error as e:
+            errors.append(f"{where}: invalid regex: {e}")
+    if not spec.get('sample_message'):
+        errors.append(f"{where}: 'sample_message' is required")
+    if spec.get('label', 'normal') not in _VALID_LABELS:
+        errors.append(f"{where}: invalid label '{spec.get('label')}'")
+    if spec.get('severity') is not None and spec['severity'] not in _VALID_SEVERITIES:
+        errors.append(f"{where}: invalid severity '{spec['severity']}'")
+    if spec.get('component') is not None and (not isinstance(spec['component'], str) or not spec['component']):
+        errors.append(f"{where}: 'component' must be a non-empty string")
+    
+    rules = spec.get('rules') or []
+    if not isinstance(rules, list):
+        return errors + [f"{where}: 'rules' must be a list"]
+    for rule_index, rule in enumerate(rules):
+        rule_where = f"{where}.rules[{rule_index}]"
+        if not isinstance(rule, dict):
+            errors.append(f"{rule_where}: must be a mapping")
+            continue
+        rule_type = rule.get('rule_type')
+        if rule_type not in _VALID_RULE_TYPES:
+            errors.append(f"{rule_where}: invalid rule_type '{rule_type}'")
+            continue
+        if rule.get('severity', 'critical') not in ('info', 'warning', 'critical'):
+            errors.append(f"{rule_where}: invalid severity '{rule.get('severity')}'")
+        field_name = rule.get('field_name')
+        if field_name is not None and group_names is not None and field_name not in group_names:
+            errors.append(f"{rule_where}: field '{field_name}' is not a named group of the pattern")
+        threshold1 = rule.get('threshold')
+        if rule_type == 'threshold':
+            if not field_name:
+                errors.append(f"{rule_where}: 'field_name' is required for threshold rule")
+            if rule.get('op') not in _VALID_THRESHOLD_OPS:
+                errors.append(f"{rule_where}: invalid op '{rule.get('op')}'")
+            for key in ('threshold', 'threshold2'):
+                value = rule.get(key)
+                if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                    errors.append(f"{rule_where}: '{key}' must be a number")
+            if threshold1 is None:
+                errors.append(f"{rule_where}: 'threshold' is required for threshold rule")
+            if rule.get('op') in ('between', 'not_between') and rule.get('threshold2') is None:
+                errors.append(f"{rule_where}: 'threshold2' is required for {rule.get('op')}")
+            if rule.get('unit') is not None and rule['unit'] not in UNITS:
+                errors.append(f"{rule_where}: unknown unit '{rule['unit']}'")
+        elif rule.get('unit') is not None:
+            errors.append(f"{rule_where}: 'unit' is only allowed for threshold rule")
+        elif threshold1 is None:
+            errors.append(f"{rule_where}: 'threshold' is required for {rule_type} rule")
+        elif rule_type == 'regex':
+            try:
+                re.compile(str(threshold1))
+            except re.error as e:
+                errors.append(f"{rule_where}: invalid regex: {e}")
+    return errors
+
+
+def _rule_row(pattern_id: int, rule: Dict) -> tuple:
+    """
+    ルール定義を pattern_rules の行に変換（scripts/add_threshold_rule.py と同じ既定値）
+    
+    Args:
+        pattern_id: パターンID
+        rule: 検証済みのルール定義
+        
+    Returns:
+        INSERT 用の値のタプル
+    """
+    rule_type = rule['rule_type']
+    field_name = rule.get('field_name')
+    threshold1 = rule.get('threshold')
+    threshold2 = rule.get('threshold2')
+    unit = rule.get('unit')
+    if rule_type == 'threshold':
+        op = rule['op']
+        threshold1 = float(threshold1)
+        threshold2 = float(threshold2) if threshold2 is not None else None
+    else:
+        op = 'contains' if rule_type == 'contains' else 'matches'
+        threshold1 = str(threshold1)
+    
+    message = rule.get('message')
+    if not message:
+        if rule_type == 'threshold':
+            unit_label = f" {unit}" if unit else ''
+            if op == 'between':
+                message = f"{field_name} between {threshold1}{unit_label} and {threshold2}{unit_label}"
+            elif op == 'not_between':
+                message = f"{field_name} not between {threshold1}{unit_label} and {threshold2}{unit_label}"
+            else:
+                message = f"{field_name} {op} {threshold1}{unit_label}"
+        elif rule_type == 'contains':
+            message = f"Message contains '{threshold1}'"
+        else:
+            message = f"Message matches pattern '{threshold1}'"
+    
+    return (
+        pattern_id, rule_type, field_name, op, threshold1, threshold2, unit,
+        rule.get('severity', 'critical'),
+        1 if rule.get('is_abnormal', True) else 0,
+        message,
+        1 if rule.get('is_active', True) else 0
+    )
+
+
+def import_patterns(db_path: str, file_path: str, update_existing: bool = False,
+                    reprocess: bool = False, verbose: bool = False, workers: int = 1) -> List[int]:
+    """
+    パターンと異常判定ルールをファイルから一括登録
+    
+    全てのパターン・ルールを登録前に検証し、1つでも不正なものがあれば何も登録しない。
+    登録は1トランザクションで行う。既存パターンと同じ正規表現の場合は、
+    update_existing=True ならラベル等を更新し、そうでなければルールの追加のみ行う。
+    同一内容のルールが既にある場合は重複して追加しない。
+    
+    ファイル形式（JSON の例。YAML も同じ構造）:
+        {"patterns": [{"regex": "...", "sample_message": "...", "label": "normal",
+                       "severity": "info", "note": "...", "component": "kernel",
+                       "rules": [{"rule_type": "threshold", "field_name": "temp", "op": ">",
+                                  "threshold": 80, "severity": "critical", "message": "..."}]}]}
+        threshold ルールには "unit": "Gb/s" のように閾値の単位を指定できる（正規化後の値で比較）
+    
+    Args:
+        db_path: データベースパス
+        file_path: パターン定義ファイル（.json / .yaml / .yml）
+        update_existing: 既存パターンのラベル・重要度・ノート・コンポーネントを更新するかどうか
+        reprocess: 登録後、対象パターンで既存ログを一括再処理するかどうか（走査は1回）
+        verbose: 詳細出力するかどうか
+        workers: 再処理で正規表現の照合を行うプロセス数
+        
+    Returns:
+        登録・更新したパターンIDのリスト
+    """
+    from datetime import datetime
+    from src.param_extractor import has_named_capture_groups
+    
+    specs = _load_pattern_file(file_path)
+    errors = []
+    for index, spec in enumerate(specs):
+        errors.extend(_validate_pattern_spec(index, spec))
+    if errors:
+        for error in errors:
+            print(f"Error: {error}")
+        print(f"Nothing imported ({len(errors)} errors)")
+        sys.exit(1)
+    
+    db = Database(db_path)
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    
+    added = updated = unchanged = rules_added = rules_skipped = 0
+    pattern_ids = []
+    now = datetime.now()
+    try:
+        for spec in specs:
+            regex_rule = spec['regex']
+            label = spec.get('label', 'normal')
+            severity = spec.get('severity')
+            note = spec.get('note')
+            component = spec.get('component')
+            has_params = 1 if has_named_capture_groups(regex_rule) else 0
             
             cursor.execute("""
-                UPDATE log_entries
-                SET pattern_id = ?,
-                    is_known = 1,
-                    classification = ?,
-                    severity = ?,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (pattern_id, classification, pattern_row['severity'], log_id))
-            
-            # 既存のパラメータを削除（再抽出のため）
-            cursor.execute("DELETE FROM log_params WHERE log_id = ?", (log_id,))
-            
-            # パラメータ抽出
-            params = param_extractor.extract_params(pattern_to_use, message)
-            if params:
-                param_extracted_count += 1
-                for param_name, param_data in params.items():
+                SELECT id FROM regex_patterns
+                WHERE regex_rule = ? OR manual_regex_rule = ?
+            """, (regex_rule, regex_rule))
+            existing = cursor.fetchone()
+            if existing:
+                pattern_id = existing['id']
+                if update_existing:
                     cursor.execute("""
-                        INSERT INTO log_params
-                        (log_id, param_name, param_value_num, param_value_text)
-                        VALUES (?, ?, ?, ?)
-                    """, (log_id, param_name, param_data['num'], param_data['text']))
+                        UPDATE regex_patterns
+                        SET label = ?,
+                            severity = ?,
+                            note = ?,
+                            has_params = ?,
+                            component = ?,
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    """, (label, severity, note, has_params, component, pattern_id))
+                    updated += 1
+                else:
+                    unchanged += 1
+            else:
+                # 手動パターンとして追加（manual_regex_rule に格納、regex_rule は NULL）
+                cursor.execute("""
+                    INSERT INTO regex_patterns
+                    (regex_rule, manual_regex_rule, sample_message, label, severity, note, has_params, component, first_seen_at, last_seen_at, total_count)
+                    VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+                """, (regex_rule, spec['sample_message'], label, severity, note, has_params, component, now, now))
+                pattern_id = cursor.lastrowid
+                added += 1
+            pattern_ids.append(pattern_id)
+            if verbose:
+                print(f"Pattern {pattern_id}: {regex_rule[:80]}")
             
-            # 異常判定を実行
-            anomaly_info = anomaly_detector.check_anomaly(log_id, pattern_id)
-            if anomaly_info:
-                abnormal_detected_count += 1
+            for rule in spec.get('rules') or []:
+                row = _rule_row(pattern_id, rule)
+                # 同一内容のルールは重複して追加しない（再インポートしても結果が変わらない）
                 cursor.execute("""
-                    UPDATE log_entries
-                    SET classification = ?,
-                        severity = ?,
-                        anomaly_reason = ?
-                    WHERE id = ?
-                """, (
-                    anomaly_info['classification'],
-                    anomaly_info['severity'],
-                    anomaly_info['anomaly_reason'],
-                    log_id
-                ))
-                if verbose:
-                    print(f"Log {log_id}: abnormal detected - {anomaly_info['anomaly_reason']}")
+                    SELECT id FROM pattern_rules
+                    WHERE pattern_id = ? AND rule_type = ? AND field_name IS ? AND op IS ?
+                      AND threshold_value1 IS ? AND threshold_value2 IS ? AND threshold_unit IS ?
+                      AND severity_if_match IS ? AND is_abnormal_if_match = ?
+                """, row[:9])
+                if cursor.fetchone():
+                    rules_skipped += 1
+                    continue
+                cursor.execute("""
+                    INSERT INTO pattern_rules (
+                        pattern_id, rule_type, field_name, op,
+                        threshold_value1, threshold_value2, threshold_unit,
+                        severity_if_match, is_abnormal_if_match,
+                        message, is_active
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, row)
+                rules_added += 1
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        db.close()
+        raise
+    
+    print(f"Imported {len(specs)} patterns from {file_path}")
+    print(f"  Added: {added}, updated: {updated}, already existing: {unchanged}")
+    print(f"  Rules added: {rules_added}, already existing: {rules_skipped}")
+    
+    if reprocess and pattern_ids:
+        cursor.execute(f"""
+            SELECT id, regex_rule, manual_regex_rule, label, severity, component
+            FROM regex_patterns
+            WHERE id IN ({','.join('?' * len(pattern_ids))})
+            ORDER BY id
+        """, pattern_ids)
+        stats = _reprocess_logs(db, cursor.fetchall(), verbose, workers=workers)
+        print(f"Reprocessed {len(set(pattern_ids))} patterns")
+        _print_reprocess_stats(stats)
     
-    conn.commit()
+    db.close()
+    return pattern_ids
+
+
+# backtest_rule で1回の fetchmany で読み込む行数
+_BACKTEST_FETCH_SIZE = 100000
+
+
+def backtest_rule(db_path: str, pattern_id: int, field_name: str, op: str,
+                  threshold_value1: float, threshold_value2: float = None,
+                  bucket: str = 'day', top_hosts: int = 20, threshold_unit: str = None):
+    """
+    閾値ルールを過去のログに適用した場合の検知件数を試算（ルールは登録しない）
     
-    print(f"Reprocessed pattern {pattern_id}")
-    print(f"  Matched logs: {matched_count}")
-    print(f"  Logs with parameters extracted: {param_extracted_count}")
-    print(f"  Logs marked as abnormal: {abnormal_detected_count}")
+    パターン・パラメータ名に一致する log_params の param_value_num を NumPy 配列に読み込み、
+    演算子と閾値をベクトル演算で評価する。判定は AnomalyDetector の threshold ルールと同じ
+    （'==' / '!=' は誤差 0.0001 を考慮、between は両端を含む）。
+    threshold_unit を指定した場合は閾値を正規化後の単位に換算し、同じ単位の param_value_norm と比較する。
+    
+    Args:
+        db_path: データベースパス
+        pattern_id: パターンID
+        field_name: パラメータ名
+        op: 演算子 ('>', '<', '>=', '<=', '==', '!=', 'between', 'not_between')
+        threshold_value1: 閾値1
+        threshold_value2: 閾値2（'between' / 'not_between' の場合に必要）
+        bucket: 時間帯ごとの集計単位 ('hour' または 'day')
+        top_hosts: ホスト別の内訳を表示する件数
+        threshold_unit: 閾値の単位の表記（例: 'Gb/s'）
+    """
+    import time
+    from datetime import datetime, timezone
+    try:
+        import numpy as np
+    except ImportError:
+        print("Error: numpy package not installed. Run: pip install numpy", file=sys.stderr)
+        sys.exit(1)
+    
+    if op in ('between', 'not_between') and threshold_value2 is None:
+        print(f"Error: --threshold2 is required for '{op}'")
+        sys.exit(1)
+    
+    # 表示用の条件（閾値は指定された単位のまま）
+    unit_label = f" {threshold_unit}" if threshold_unit else ''
+    t1, t2 = f"{threshold_value1}{unit_label}", f"{threshold_value2}{unit_label}"
+    condition = f"{t1} <= {field_name} <= {t2}" if op == 'between' else (
+        f"not ({t1} <= {field_name} <= {t2})" if op == 'not_between' else f"{field_name} {op} {t1}")
+    
+    column, unit_sql, unit_params = 'p.param_value_num', '', ()
+    if threshold_unit:
+        unit_condition = _unit_condition(threshold_unit, threshold_value1, threshold_value2)
+        if unit_condition is None:
+            print(f"Error: Unknown unit '{threshold_unit}'")
+            sys.exit(1)
+        column, unit_sql, unit_params, threshold_value1, threshold_value2 = unit_condition
+    
+    db = Database(db_path)
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT id FROM regex_patterns WHERE id = ?", (pattern_id,))
+    if not cursor.fetchone():
+        print(f"Error: Pattern {pattern_id} not found")
+        db.close()
+        sys.exit(1)
     
+    started = time.perf_counter()
+    
+    # 結果は fetchmany でチャンクごとに NumPy 配列に変換してから連結する
+    # （全件を Python のタプルのリストとして保持しないため、行数が多くてもメモリを抑えられる）
+    # - 時間帯は UNIX 時刻を集計単位の秒数で割った整数（ts は DATETIME 型のため列のままだと datetime に変換される）
+    # - ts / host が NULL の行は時間帯 0 / 空文字のホストとして集計する
+    bucket_seconds = 3600 if bucket == 'hour' else 86400
+    cursor.row_factory = None
+    cursor.execute(f"""
+        SELECT {column},
+               COALESCE(CAST(strftime('%s', e.ts) AS INTEGER) / ?, 0),
+               COALESCE(e.host, '')
+        FROM log_entries e
+        JOIN log_params p ON p.log_id = e.id
+        WHERE e.pattern_id = ?
+          AND p.param_name = ?
+          AND {column} IS NOT NULL{unit_sql}
+    """, (bucket_seconds, pattern_id, field_name) + unit_params)
+    
+    value_chunks, bucket_chunks, host_chunks = [], [], []
+    # ホストは出現順の番号に置き換えて整数配列にする
+    host_codes: dict = {}
+    while True:
+        rows = cursor.fetchmany(_BACKTEST_FETCH_SIZE)
+        if not rows:
+            break
+        value_chunks.append(np.fromiter((row[0] for row in rows), dtype=np.float64, count=len(rows)))
+        bucket_chunks.append(np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows)))
+        host_chunks.append(np.fromiter((host_codes.setdefault(row[2], len(host_codes)) for row in rows),
+                                       dtype=np.int64, count=len(rows)))
     db.close()
+    
+    values = np.concatenate(value_chunks) if value_chunks else np.empty(0, dtype=np.float64)
+    bucket_keys, bucket_ids = np.unique(
+        np.concatenate(bucket_chunks) if bucket_chunks else np.empty(0, dtype=np.int64), return_inverse=True
+    )
+    host_ids = np.concatenate(host_chunks) if host_chunks else np.empty(0, dtype=np.int64)
+    host_names = list(host_codes)
+    loaded = time.perf_counter()
+    
+    t1, t2 = threshold_value1, threshold_value2
+    if op == '>':
+        hits = values > t1
+    elif op == '>=':
+        hits = values >= t1
+    elif op == '<':
+        hits = values < t1
+    elif op == '<=':
+        hits = values <= t1
+    elif op == '==':
+        hits = np.abs(values - t1) < 0.0001
+    elif op == '!=':
+        hits = np.abs(values - t1) >= 0.0001
+    elif op == 'between':
+        hits = (values >= t1) & (values <= t2)
+    else:
+        hits = ~((values >= t1) & (values <= t2))
+    
+    total = len(values)
+    hit_count = int(hits.sum())
+    bucket_totals = np.bincount(bucket_ids, minlength=len(bucket_keys))
+    bucket_hits = np.bincount(bucket_ids, weights=hits, minlength=len(bucket_keys)).astype(np.int64)
+    host_totals = np.bincount(host_ids, minlength=len(host_names))
+    host_hits = np.bincount(host_ids, weights=hits, minlength=len(host_names)).astype(np.int64)
+    evaluated = time.perf_counter()
+    
+    print(f"Backtest: pattern {pattern_id}, {condition}")
+    print(f"  Rows evaluated: {total}")
+    print(f"  Hits: {hit_count} ({hit_count / total:.2%})" if total else "  Hits: 0")
+    
+    if total:
+        print(f"\nBy {bucket}:")
+        print(f"  {'Bucket':<16} {'Hits':>10} {'Total':>10} {'Rate':>8}")
+        label_format = '%Y-%m-%d %H:00' if bucket == 'hour' else '%Y-%m-%d'
+        for code, key in enumerate(bucket_keys):
+            label = datetime.fromtimestamp(int(key) * bucket_seconds, timezone.utc).strftime(label_format)
+            print(f"  {label:<16} {bucket_hits[code]:>10} {bucket_totals[code]:>10} "
+                  f"{bucket_hits[code] / bucket_totals[code]:>8.2%}")
+        
+        print(f"\nBy host (top {top_hosts} by hits):")
+        print(f"  {'Host':<24} {'Hits':>10} {'Total':>10} {'Rate':>8}")
+        ranked = sorted(range(len(host_names)), key=lambda code: (-host_hits[code], -host_totals[code]))
+        for code in ranked[:top_hosts]:
+            print(f"  {host_names[code] or '-':<24} {host_hits[code]:>10} {host_totals[code]:>10} "
+                  f"{host_hits[code] / host_totals[code]:>8.2%}")
+    
+    print(f"\nElapsed: load {loaded - started:.2f}s, evaluate {evaluated - loaded:.3f}s")
+
+
+def _threshold_condition_sql(op: str, threshold_value1: float, threshold_value2: float = None,
+                             column: str = 'p.param_value_num'):
+    """
+    threshold ルールの条件を log_params の数値カラムに対する SQL 条件式に変換
+    
+    判定は AnomalyDetector の threshold ルールと同じ（'==' / '!=' は誤差 0.0001 を考慮）。
+    
+    Args:
+        op: 演算子
+        threshold_value1: 閾値1
+        threshold_value2: 閾値2
+        column: 比較するカラム（threshold_unit のあるルールは p.param_value_norm）
+        
+    Returns:
+        (条件式, パラメータのタプル)。変換できない場合は None
+    """
+    if op in ('>', '>=', '<', '<='):
+        if threshold_value1 is None:
+            return None
+        return (f"{column} {op} ?", (threshold_value1,))
+    if op in ('==', '!='):
+        if threshold_value1 is None:
+            return None
+        return (f"abs({column} - ?) {'<' if op == '==' else '>='} 0.0001", (threshold_value1,))
+    if op in ('between', 'not_between'):
+        if threshold_value1 is None or threshold_value2 is None:
+            return None
+        return (f"{column} {'NOT ' if op == 'not_between' else ''}BETWEEN ? AND ?",
+                (threshold_value1, threshold_value2))
+    return None
+
+
+def _unit_condition(threshold_unit: str, threshold_value1: float, threshold_value2: float = None):
+    """
+    閾値を正規化後の単位に換算し、log_params の正規化後の値で比較する条件を返す
+    
+    Args:
+        threshold_unit: 閾値の単位の表記（例: 'Gb/s'）
+        threshold_value1: 閾値1
+        threshold_value2: 閾値2
+        
+    Returns:
+        (比較するカラム, 追加の条件式, 追加の条件のパラメータ, 換算後の閾値1, 換算後の閾値2)。
+        単位が UNITS の表にない場合は None
+    """
+    from src.param_extractor import normalize_value
+    
+    threshold_value1, unit = normalize_value(threshold_value1, threshold_unit)
+    threshold_value2, _unit = normalize_value(threshold_value2, threshold_unit)
+    if unit is None:
+        return None
+    return ('p.param_value_norm', " AND p.param_unit = ?", (unit,), threshold_value1, threshold_value2)
+
+
+def apply_rule(db_path: str, rule_id: int, chunk_size: int = 50000, dry_run: bool = False) -> int:
+    """
+    登録済みの threshold ルールを既存のログに遡って適用
+    
+    ログごとに Python で再抽出・再判定する reprocess-pattern と異なり、
+    抽出済みの log_params に対する集合演算（UPDATE ... FROM log_params）で判定する。
+    ID 範囲ごとにコミットするため、実行中もインジェストを長時間ブロックしない。
+    
+    対象はルールのパターンに紐付いた既知ログのうち、まだどのルールにもマッチしていないもの
+    （anomaly_reason が NULL）。マッチしたログは abnormal に更新し、abnormal アラートがなければ作成する。
+    
+    Args:
+        db_path: データベースパス
+        rule_id: ルールID
+        chunk_size: 1回のUPDATEで対象にするログIDの範囲
+        dry_run: Trueの場合は件数を表示するだけで更新しない
+        
+    Returns:
+        更新した（dry_run の場合は更新対象の）ログ件数
+    """
+    import time
+    
+    db = Database(db_path)
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT id, pattern_id, rule_type, field_name, op, threshold_value1, threshold_value2,
+               threshold_unit, severity_if_match, message, is_active
+        FROM pattern_rules
+        WHERE id = ?
+    """, (rule_id,))
+    rule = cursor.fetchone()
+    if not rule:
+        print(f"Error: Rule {rule_id} not found")
+        db.close()
+        sys.exit(1)
+    if not rule['is_active']:
+        print(f"Error: Rule {rule_id} is inactive")
+        db.close()
+        sys.exit(1)
+    
+    condition = None
+    column, unit_sql, unit_params = 'p.param_value_num', '', ()
+    threshold_value1, threshold_value2 = rule['threshold_value1'], rule['threshold_value2']
+    if rule['threshold_unit']:
+        unit_condition = _unit_condition(rule['threshold_unit'], threshold_value1, threshold_value2)
+        if unit_condition is None:
+            print(f"Error: Unknown unit '{rule['threshold_unit']}' in rule {rule_id}")
+            db.close()
+            sys.exit(1)
+        column, unit_sql, unit_params, threshold_value1, threshold_value2 = unit_condition
+    if rule['rule_type'] == 'threshold' and rule['field_name']:
+        condition = _threshold_condition_sql(rule['op'], threshold_value1, threshold_value2, column)
+    if condition is None:
+        print(f"Error: Rule {rule_id} ({rule['rule_type']} {rule['op']}) cannot be applied as a set-based update. "
+              f"Use reprocess-pattern {rule['pattern_id']} instead.")
+        db.close()
+        sys.exit(1)
+    condition_sql, condition_params = condition
+    anomaly_reason = rule['message'] or f"Rule {rule['id']} matched"
+    
+    cursor.execute("SELECT MIN(id), MAX(id) FROM log_entries WHERE pattern_id = ?", (rule['pattern_id'],))
+    min_id, max_id = cursor.fetchone()
+    
+    started = time.perf_counter()
+    updated_total = 0
+    alerts_total = 0
+    if min_id is not None:
+        for chunk_start in range(min_id, max_id + 1, chunk_size):
+            chunk_range = (chunk_start, chunk_start + chunk_size - 1)
+            where = f"""
+                e.id BETWEEN ? AND ?
+                AND e.pattern_id = ?
+                AND e.is_known = 1
+                AND e.anomaly_reason IS NULL
+                AND p.log_id = e.id
+                AND p.param_name = ?
+                AND {column} IS NOT NULL{unit_sql}
+                AND {condition_sql}
+            """
+            where_params = chunk_range + (rule['pattern_id'], rule['field_name']) + unit_params + condition_params
+            
+            if dry_run:
+                cursor.execute(f"""
+                    SELECT COUNT(DISTINCT e.id)
+                    FROM log_entries e, log_params p
+                    WHERE {where}
+                """, where_params)
+                updated_total += cursor.fetchone()[0]
+                continue
+            
+            # ID範囲ごとに短いトランザクションで更新
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f"""
+                UPDATE log_entries AS e
+                SET classification = 'abnormal',
+                    severity = ?,
+                    anomaly_reason = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                FROM log_params AS p
+                WHERE {where}
+                RETURNING id
+            """, (rule['severity_if_match'], anomaly_reason) + where_params)
+            log_ids = [row[0] for row in cursor.fetchall()]
+            
+            if log_ids:
+                # パターンのラベルが abnormal のログなど、既にアラートがある場合は作成しない
+                cursor.executemany("""
+                    INSERT INTO alerts (log_id, alert_type, channel, status)
+                    SELECT ?, 'abnormal', 'slack', 'pending'
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM alerts WHERE log_id = ? AND alert_type = 'abnormal'
+                    )
+                """, [(log_id, log_id) for log_id in log_ids])
+                alerts_total += cursor.rowcount
+            conn.commit()
+            updated_total += len(log_ids)
+    
+    db.close()
+    
+    if dry_run:
+        print(f"Rule {rule_id} would mark {updated_total} existing logs as abnormal (dry run)")
+    else:
+        print(f"Applied rule {rule_id} to pattern {rule['pattern_id']}")
+        print(f"  Logs marked as abnormal: {updated_total}")
+        print(f"  Alerts created: {alerts_total}")
+        print(f"  Elapsed: {time.perf_counter() - started:.2f}s")
+    return updated_total
+
+
+def normalize_params(db_path: str, pattern_ids: list = None, chunk_size: int = 50000,
+                     verbose: bool = False) -> int:
+    """
+    既存の log_params の行に正規化した値と単位（param_value_norm / param_unit）を設定
+    
+    単位はパラメータの値の後ろ（"16M"）だけでなくメッセージ中のグループの直後
+    （"31.504 Gb/s"）にも書かれるため、ログのパターンでメッセージから抽出し直す。
+    log_params の ID 範囲ごとにパターン単位で ParamExtractor.extract_many() にまとめて渡し、
+    範囲ごとにコミットする。分類や異常判定は変更しない。
+    
+    Args:
+        db_path: データベースパス
+        pattern_ids: 対象のパターンID（Noneまたは空の場合は全パターン）
+        chunk_size: 1回に読み込み・コミットする log_params の ID の範囲
+        verbose: 詳細出力するかどうか
+        
+    Returns:
+        更新した行数
+    """
+    import time
+    from src.param_extractor import ParamExtractor, parse_quantity, normalize_many
+    
+    db = Database(db_path)
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    
+    pattern_filter_sql = ''
+    pattern_filter_params = ()
+    if pattern_ids:
+        pattern_filter_sql = f" AND e.pattern_id IN ({','.join('?' * len(pattern_ids))})"
+        pattern_filter_params = tuple(pattern_ids)
+    
+    cursor.execute("SELECT id, COALESCE(manual_regex_rule, regex_rule) AS rule FROM regex_patterns")
+    rules = {row['id']: row['rule'] for row in cursor.fetchall()}
+    param_extractor = ParamExtractor()
+    
+    cursor.execute("SELECT MIN(id), MAX(id) FROM log_params")
+    min_id, max_id = cursor.fetchone()
+    
+    started = time.perf_counter()
+    updated = 0
+    units = {}
+    for chunk_start in range(min_id or 0, (max_id or -1) + 1, chunk_size):
+        cursor.execute(f"""
+            SELECT p.id, p.param_name, p.param_value_num, p.param_value_text, e.pattern_id, e.message
+            FROM log_params p
+            JOIN log_entries e ON e.id = p.log_id
+            WHERE p.id BETWEEN ? AND ?{pattern_filter_sql}
+        """, (chunk_start, chunk_start + chunk_size - 1) + pattern_filter_params)
+        rows = cursor.fetchall()
+        if not rows:
+            continue
+        
+        # パターンごとにまとめてメッセージから抽出し直す
+        by_pattern = {}
+        for row in rows:
+            by_pattern.setdefault(row['pattern_id'], []).append(row)
+        update_rows = []
+        fallback_rows = []
+        for pattern_id, pattern_rows in by_pattern.items():
+            rule = rules.get(pattern_id)
+            if rule is None:
+                fallback_rows.extend(pattern_rows)
+                continue
+            layout, values = param_extractor.extract_many(rule, [row['message'] for row in pattern_rows])
+            for row, row_values in zip(pattern_rows, values):
+                index = layout.get(row['param_name'])
+                value = row_values[index] if row_values is not None and index is not None else None
+                if value is None:
+                    # パターンの変更などでメッセージから抽出できない行は保存済みの値から求める
+                    fallback_rows.append(row)
+                    continue
+                update_rows.append((value[2], value[3], row['id']))
+        
+        if fallback_rows:
+            nums, raw_units = zip(*(
+                (row['param_value_num'], parse_quantity(row['param_value_text'] or '')[1])
+                for row in fallback_rows
+            ))
+            norms, canonical_units = normalize_many(list(nums), list(raw_units))
+            update_rows.extend(zip(norms, canonical_units, (row['id'] for row in fallback_rows)))
+        
+        cursor.executemany("""
+            UPDATE log_params
+            SET param_value_norm = ?,
+                param_unit = ?
+            WHERE id = ?
+        """, update_rows)
+        conn.commit()
+        updated += len(update_rows)
+        for _norm, unit, _param_id in update_rows:
+            units[unit] = units.get(unit, 0) + 1
+        
+        if verbose:
+            print(f"Normalized up to log_params ID {chunk_start + chunk_size - 1} ({updated} rows)",
+                  file=sys.stderr)
+    
+    db.close()
+    
+    print(f"Normalized {updated} log_params rows in {time.perf_counter() - started:.2f}s")
+    for unit, count in sorted(units.items(), key=lambda item: -item[1]):
+        print(f"  {unit or '(no unit)'}: {count}")
+    return updated
+
+
+def _merge_groups(rows: list, similarity: float, token_types: tuple = None) -> list:
+    """
+    自動生成パターンをサンプルメッセージのトークン単位の類似度でグループ化
+    
+    ラベル・重要度が同じパターンごとにテンプレートツリーへ出現回数の多い順に追加し、
+    同じテンプレートに対応付いたパターンを1グループとする。一般化した正規表現が
+    サンプルメッセージにマッチしないパターンはグループから除外する。
+    
+    Args:
+        rows: regex_patterns の行（id, regex_rule, sample_message, label, severity, total_count）
+        similarity: 同一テンプレートとみなす類似度のしきい値（0〜1）
+        token_types: 使用する型付きトークンの種類（abstract_message_typed() を参照）
+        
+    Returns:
+        (テンプレート, パターン行のリスト) のリスト。リストの先頭が統合先のパターン
+    """
+    from src.abstract_message import compile_pattern
+    from src.template_tree import TemplateTree, template_tokens
+    
+    trees = {}
+    members = {}
+    for row in sorted(rows, key=lambda row: (-row['total_count'], row['id'])):
+        tokens = template_tokens(row['sample_message'], token_types)
+        if not tokens:
+            continue
+        tree = trees.setdefault((row['label'], row['severity']), TemplateTree(similarity=similarity))
+        template, _is_new, _generalized = tree.add(tokens)
+        members.setdefault(id(template), (template, []))[1].append(row)
+    
+    groups = []
+    for template, group in members.values():
+        if len(group) < 2:
+            continue
+        regex = compile_pattern(template.regex)
+        if regex is None:
+            continue
+        group = [row for row in group if regex.search(row['sample_message'])]
+        if len(group) >= 2:
+            groups.append((template, group))
+    groups.sort(key=lambda item: (-len(item[1]), item[1][0]['id']))
+    return groups
+
+
+def merge_patterns(db_path: str, similarity: float = 0.6, apply: bool = False,
+                   token_types: tuple = None, limit: int = 20, verbose: bool = False) -> Dict:
+    """
+    1トークンだけ異なるような類似の自動生成パターンを統合
+    
+    _merge_groups() でグループ化し、apply=False の場合は統合案を表示するだけで更新しない。
+    apply=True の場合はグループごとに1トランザクションで以下を行う（インジェストを
+    長時間ブロックしないよう、グループごとにコミットする）。
+    - 統合先（出現回数が最も多いパターン）の regex_rule を一般化した正規表現に更新し、
+      total_count を合算、first_seen_at / last_seen_at を全体の最小・最大にする
+    - 各パターンの変更前の regex_rule と統合先を pattern_id_remap に記録し
+      （既存の対応の統合先も付け替える）、統合元のパターンを削除
+    - log_entries.pattern_id を統合先に付け替え、pattern_templates を統合先の1件にまとめる
+    手動パターン・ルールが登録されたパターンは対象外。統合後に統合元の regex_rule の
+    ログを取り込んだ場合は、PatternCache が pattern_id_remap を参照して統合先に対応付ける。
+    
+    Args:
+        db_path: データベースパス
+        similarity: 同一グループとみなす類似度のしきい値（0〜1）
+        apply: Trueの場合は統合を実行する
+        token_types: 使用する型付きトークンの種類（abstract_message_typed() を参照）
+        limit: 表示するグループ数（verbose の場合は全て表示）
+        verbose: 詳細出力するかどうか
+        
+    Returns:
+        統計情報の辞書（groups, patterns_merged, logs_repointed, skipped）
+    """
+    import sqlite3
+    import time
+    
+    db = Database(db_path)
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    
+    started = time.perf_counter()
+    stats = {'groups': 0, 'patterns_merged': 0, 'logs_repointed': 0, 'skipped': 0}
+    
+    if apply:
+        # 前回の統合後に統合元のIDで書き込まれたログがあれば付け替える
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("""
+            UPDATE log_entries
+            SET pattern_id = (
+                SELECT m.new_pattern_id FROM pattern_id_remap m
+                WHERE m.old_pattern_id = log_entries.pattern_id
+                LIMIT 1
+            )
+            WHERE pattern_id IN (
+                SELECT old_pattern_id FROM pattern_id_remap
+                WHERE old_pattern_id != new_pattern_id
+            )
+        """)
+        stats['logs_repointed'] += cursor.rowcount
+        conn.commit()
+    
+    cursor.execute("""
+        SELECT p.id, p.regex_rule, p.sample_message, p.label, p.severity, p.total_count
+        FROM regex_patterns p
+        WHERE p.regex_rule IS NOT NULL
+          AND p.manual_regex_rule IS NULL
+          AND NOT EXISTS (SELECT 1 FROM pattern_rules r WHERE r.pattern_id = p.id)
+    """)
+    rows = cursor.fetchall()
+    groups = _merge_groups(rows, similarity, token_types)
+    
+    print(f"Auto patterns: {len(rows)}, merge groups: {len(groups)} "
+          f"({sum(len(group) - 1 for _, group in groups)} patterns can be merged)")
+    for index, (template, group) in enumerate(groups):
+        if verbose or index < limit:
+            merged_ids = ', '.join(str(row['id']) for row in group[1:11])
+            if len(group) > 11:
+                merged_ids += f", ... ({len(group) - 1} patterns)"
+            print(f"  Pattern {group[0]['id']} <- {merged_ids} "
+                  f"({sum(row['total_count'] for row in group)} logs)")
+            print(f"    {template.regex[:100]}")
+    if not verbose and len(groups) > limit:
+        print(f"  ... and {len(groups) - limit} more groups")
+    
+    if not apply:
+        print("Dry run: use --apply to merge")
+        db.close()
+        return stats
+    
+    for template, group in groups:
+        survivor_id = group[0]['id']
+        member_ids = [row['id'] for row in group]
+        loser_ids = member_ids[1:]
+        member_marks = ','.join('?' * len(member_ids))
+        loser_marks = ','.join('?' * len(loser_ids))
+        
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # インジェストが並行して更新している場合があるため、トランザクション内で集計する
+            cursor.execute(f"""
+                SELECT COUNT(*), SUM(total_count), MIN(first_seen_at), MAX(last_seen_at)
+                FROM regex_patterns
+                WHERE id IN ({member_marks}) AND regex_rule IS NOT NULL
+            """, member_ids)
+            found, total_count, first_seen_at, last_seen_at = cursor.fetchone()
+            cursor.execute(f"SELECT COUNT(*) FROM pattern_templates WHERE pattern_id IN ({member_marks})",
+                           member_ids)
+            has_template = cursor.fetchone()[0] > 0
+            if found != len(member_ids):
+                raise sqlite3.IntegrityError('patterns changed during merge')
+            
+            # 統合先自身の変更前の regex_rule も記録し、同じメッセージを統合先に対応付けられるようにする
+            cursor.execute(f"""
+                INSERT INTO pattern_id_remap (old_pattern_id, new_pattern_id, old_regex_rule, sample_message, total_count)
+                SELECT id, ?, regex_rule, sample_message, total_count
+                FROM regex_patterns
+                WHERE id IN ({member_marks}) AND regex_rule != ?
+                ON CONFLICT(old_regex_rule) DO UPDATE SET new_pattern_id = excluded.new_pattern_id
+            """, [survivor_id] + member_ids + [template.regex])
+            cursor.execute(f"""
+                UPDATE pattern_id_remap SET new_pattern_id = ?
+                WHERE new_pattern_id IN ({loser_marks})
+            """, [survivor_id] + loser_ids)
+            cursor.execute(f"DELETE FROM pattern_templates WHERE pattern_id IN ({loser_marks})", loser_ids)
+            cursor.execute(f"DELETE FROM regex_patterns WHERE id IN ({loser_marks})", loser_ids)
+            cursor.execute("""
+                UPDATE regex_patterns
+                SET regex_rule = ?,
+                    total_count = ?,
+                    first_seen_at = ?,
+                    last_seen_at = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (template.regex, total_count, first_seen_at, last_seen_at, survivor_id))
+            if has_template:
+                # 統合後のテンプレートの振り分け先は、読み込み時にトークン列から決める（route は NULL）
+                cursor.execute("""
+                    INSERT INTO pattern_templates (pattern_id, token_count, template)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(pattern_id) DO UPDATE SET
+                        token_count = excluded.token_count,
+                        template = excluded.template,
+                        route = NULL,
+                        updated_at = CURRENT_TIMESTAMP
+                """, (survivor_id, len(template.tokens), template.text))
+            
+            cursor.execute(f"""
+                UPDATE log_entries SET pattern_id = ?
+                WHERE pattern_id IN ({loser_marks})
+            """, [survivor_id] + loser_ids)
+            logs_repointed = cursor.rowcount
+            conn.commit()
+        except sqlite3.IntegrityError as e:
+            # 一般化した正規表現が他のパターンと重複する場合など
+            conn.rollback()
+            stats['skipped'] += 1
+            if verbose:
+                print(f"  Skipped pattern {survivor_id}: {e}")
+            continue
+        
+        stats['groups'] += 1
+        stats['patterns_merged'] += len(loser_ids)
+        stats['logs_repointed'] += logs_repointed
+    
+    db.close()
+    
+    print(f"Merged {stats['patterns_merged']} patterns into {stats['groups']} patterns")
+    print(f"  Logs repointed: {stats['logs_repointed']}")
+    print(f"  Groups skipped: {stats['skipped']}")
+    print(f"  Elapsed: {time.perf_counter() - started:.2f}s")
+    return stats
 
 
 def main():
     """コマンドラインエントリーポイント"""
     import argparse
+    from src.abstract_message import parse_token_types
     
     parser = argparse.ArgumentParser(description='CLI tools for log monitoring system')
     subparsers = parser.add_subparsers(dest='command', help='Command to execute')
@@ -598,6 +1833,88 @@ def main():
     parser_reprocess.add_argument('pattern_id', type=int, help='Pattern ID to reprocess')
     parser_reprocess.add_argument('--db', default='db/monitor.db', help='Database path')
     parser_reprocess.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+    parser_reprocess.add_argument('--chunk-size', type=int, default=50000,
+                                  help='Log ID range read and committed at a time')
+    parser_reprocess.add_argument('-j', '--workers', type=int, default=1,
+                                  help='Worker processes for regex matching (0 = number of CPUs)')
+    
+    # reprocess-patterns コマンド
+    parser_reprocess_many = subparsers.add_parser('reprocess-patterns',
+                                                  help='Reprocess existing logs against several patterns in one pass')
+    parser_reprocess_many.add_argument('pattern_ids', type=int, nargs='*', help='Pattern IDs to reprocess')
+    parser_reprocess_many.add_argument('--since',
+                                       help='Also include manual patterns created or updated at or after this time '
+                                            '(YYYY-MM-DD HH:MM:SS, UTC)')
+    parser_reprocess_many.add_argument('--db', default='db/monitor.db', help='Database path')
+    parser_reprocess_many.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+    parser_reprocess_many.add_argument('--chunk-size', type=int, default=50000,
+                                       help='Log ID range read and committed at a time')
+    parser_reprocess_many.add_argument('-j', '--workers', type=int, default=1,
+                                       help='Worker processes for regex matching (0 = number of CPUs)')
+    
+    # import-patterns コマンド
+    parser_import = subparsers.add_parser('import-patterns',
+                                          help='Import manual patterns and rules from a JSON/YAML file')
+    parser_import.add_argument('file', help='Pattern file (.json, .yaml or .yml)')
+    parser_import.add_argument('--update', action='store_true',
+                               help='Update label/severity/note of patterns that already exist')
+    parser_import.add_argument('--reprocess', action='store_true',
+                               help='Reprocess existing logs against the imported patterns in one pass')
+    parser_import.add_argument('--db', default='db/monitor.db', help='Database path')
+    parser_import.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+    parser_import.add_argument('-j', '--workers', type=int, default=1,
+                               help='Worker processes for regex matching during --reprocess (0 = number of CPUs)')
+    
+    # apply-rule コマンド
+    parser_apply = subparsers.add_parser('apply-rule',
+                                         help='Apply a threshold rule retroactively to existing logs (set-based)')
+    parser_apply.add_argument('rule_id', type=int, help='Rule ID in pattern_rules')
+    parser_apply.add_argument('--chunk-size', type=int, default=50000,
+                              help='Log ID range updated per transaction')
+    parser_apply.add_argument('--dry-run', action='store_true', help='Only count the logs that would be updated')
+    parser_apply.add_argument('--db', default='db/monitor.db', help='Database path')
+    
+    # merge-patterns コマンド
+    parser_merge = subparsers.add_parser('merge-patterns',
+                                         help='Merge near-duplicate auto patterns into generalized patterns')
+    parser_merge.add_argument('--similarity', type=float, default=0.6,
+                              help='Minimum ratio of identical tokens to merge (0-1)')
+    parser_merge.add_argument('--apply', action='store_true',
+                              help='Merge the patterns (default: only show the proposed groups)')
+    parser_merge.add_argument('--typed-tokens', type=parse_token_types, metavar='TYPES',
+                              help='Typed tokens used when comparing messages (comma-separated or "all")')
+    parser_merge.add_argument('--limit', type=int, default=20, help='Number of groups to show')
+    parser_merge.add_argument('--db', default='db/monitor.db', help='Database path')
+    parser_merge.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+    
+    # backtest-rule コマンド
+    parser_backtest = subparsers.add_parser('backtest-rule',
+                                            help='Estimate how many past logs a threshold rule would flag')
+    parser_backtest.add_argument('pattern_id', type=int, help='Pattern ID')
+    parser_backtest.add_argument('--field-name', required=True, help='Parameter name')
+    parser_backtest.add_argument('--op', required=True,
+                                 choices=['>', '<', '>=', '<=', '==', '!=', 'between', 'not_between'],
+                                 help='Comparison operator')
+    parser_backtest.add_argument('--threshold', type=float, required=True, dest='threshold_value1',
+                                 help='Threshold value')
+    parser_backtest.add_argument('--threshold2', type=float, dest='threshold_value2',
+                                 help='Second threshold (for between/not_between)')
+    parser_backtest.add_argument('--unit', dest='threshold_unit',
+                                 help='Unit of the thresholds (e.g. Gb/s); compares normalized values')
+    parser_backtest.add_argument('--bucket', choices=['hour', 'day'], default='day',
+                                 help='Time bucket for the hit-rate breakdown')
+    parser_backtest.add_argument('--top-hosts', type=int, default=20, help='Number of hosts to show')
+    parser_backtest.add_argument('--db', default='db/monitor.db', help='Database path')
+    
+    # normalize-params コマンド
+    parser_normalize = subparsers.add_parser('normalize-params',
+                                             help='Fill normalized values and units of existing log_params rows')
+    parser_normalize.add_argument('pattern_ids', type=int, nargs='*',
+                                  help='Pattern IDs to normalize (default: all patterns)')
+    parser_normalize.add_argument('--chunk-size', type=int, default=50000,
+                                  help='log_params ID range updated per transaction')
+    parser_normalize.add_argument('--db', default='db/monitor.db', help='Database path')
+    parser_normalize.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
     
     args = parser.parse_args()
     
@@ -619,7 +1936,24 @@ def main():
     elif args.command == 'add-pattern-from-log':
         add_pattern_from_log(args.db, args.log_id, args.label, args.severity, args.note)
     elif args.command == 'reprocess-pattern':
-        reprocess_pattern(args.db, args.pattern_id, args.verbose)
+        reprocess_pattern(args.db, args.pattern_id, args.verbose, args.chunk_size,
+                          args.workers or os.cpu_count() or 1)
+    elif args.command == 'reprocess-patterns':
+        reprocess_patterns(args.db, args.pattern_ids, args.since, args.verbose, args.chunk_size,
+                           args.workers or os.cpu_count() or 1)
+    elif args.command == 'import-patterns':
+        import_patterns(args.db, args.file, args.update, args.reprocess, args.verbose,
+                        args.workers or os.cpu_count() or 1)
+    elif args.command == 'apply-rule':
+        apply_rule(args.db, args.rule_id, args.chunk_size, args.dry_run)
+    elif args.command == 'merge-patterns':
+        merge_patterns(args.db, args.similarity, args.apply, args.typed_tokens, args.limit, args.verbose)
+    elif args.command == 'backtest-rule':
+        backtest_rule(args.db, args.pattern_id, args.field_name, args.op,
+                      args.threshold_value1, args.threshold_value2, args.bucket, args.top_hosts,
+                      args.threshold_unit)
+    elif args.command == 'normalize-params':
+        normalize_params(args.db, args.pattern_ids, args.chunk_size, args.verbose)
 
 
 if __name__ == '__main__':
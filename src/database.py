@@ -16,16 +16,28 @@ def convert_datetime(s):
 sqlite3.register_adapter(datetime, adapt_datetime)
 sqlite3.register_converter("DATETIME", convert_datetime)
 
+# 世代番号で変更を追跡するテーブル -> 世代を進める UPDATE の対象列（None は全列）
+# regex_patterns の total_count / last_seen_at はインジェストがコミットごとに更新するため対象外
+TRACKED_TABLES = {
+    'regex_patterns': ('regex_rule', 'manual_regex_rule', 'label', 'severity', 'note',
+                       'has_params', 'component'),
+    'pattern_rules': None,
+    'pattern_templates': None,
+    'pattern_id_remap': None,
+}
+
 
 class Database:
     """SQLiteデータベース管理クラス"""
     
-    def __init__(self, db_path: str = "db/monitor.db"):
+    def __init__(self, db_path: str = "db/monitor.db", timeout: float = 5.0):
         """
         Args:
             db_path: データベースファイルのパス
+            timeout: 他の接続が書き込みロックを保持している場合に待機する秒数
         """
         self.db_path = db_path
+        self.timeout = timeout
         # ディレクトリが存在しない場合は作成
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         self.conn = None
@@ -33,7 +45,7 @@ class Database:
     
     def _init_database(self):
         """データベースを初期化し、テーブルを作成"""
-        self.conn = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES)
+        self.conn = sqlite3.connect(self.db_path, timeout=self.timeout, detect_types=sqlite3.PARSE_DECLTYPES)
         self.conn.row_factory = sqlite3.Row
         cursor = self.conn.cursor()
         
@@ -48,6 +60,7 @@ class Database:
                 severity TEXT,
                 note TEXT,
                 has_params INTEGER DEFAULT 0,
+                component TEXT,
                 first_seen_at DATETIME NOT NULL,
                 last_seen_at DATETIME NOT NULL,
                 total_count INTEGER NOT NULL DEFAULT 1,
@@ -152,6 +165,18 @@ class Database:
             if "duplicate column" not in str(e).lower():
                 print(f"Warning: Migration issue for has_params: {e}", file=__import__('sys').stderr)
         
+        # componentカラムのマイグレーション（既存テーブルに追加、既存パターンは全コンポーネント対象）
+        try:
+            cursor.execute("PRAGMA table_info(regex_patterns)")
+            columns = cursor.fetchall()
+            if not any(col[1] == 'component' for col in columns):
+                cursor.execute("ALTER TABLE regex_patterns ADD COLUMN component TEXT")
+                self.conn.commit()
+        except sqlite3.OperationalError as e:
+            # 既に追加済みの場合はスキップ
+            if "duplicate column" not in str(e).lower():
+                print(f"Warning: Migration issue for component: {e}", file=__import__('sys').stderr)
+        
         # 2. log_entries テーブル（ログ本体）
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS log_entries (
@@ -181,11 +206,27 @@ class Database:
                 param_name TEXT NOT NULL,
                 param_value_num REAL,
                 param_value_text TEXT,
+                param_value_norm REAL,
+                param_unit TEXT,
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (log_id) REFERENCES log_entries(id)
             )
         """)
         
+        # 正規化した値・単位のカラムのマイグレーション（既存行は normalize-params で埋める）
+        try:
+            cursor.execute("PRAGMA table_info(log_params)")
+            columns = {col[1] for col in cursor.fetchall()}
+            if 'param_value_norm' not in columns:
+                cursor.execute("ALTER TABLE log_params ADD COLUMN param_value_norm REAL")
+            if 'param_unit' not in columns:
+                cursor.execute("ALTER TABLE log_params ADD COLUMN param_unit TEXT")
+            self.conn.commit()
+        except sqlite3.OperationalError as e:
+            # 既に追加済みの場合はスキップ
+            if "duplicate column" not in str(e).lower():
+                print(f"Warning: Migration issue for param_unit: {e}", file=__import__('sys').stderr)
+        
         # 4. pattern_rules テーブル（異常判定ルール）
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS pattern_rules (
@@ -196,6 +237,7 @@ class Database:
                 op TEXT NOT NULL,
                 threshold_value1 REAL,
                 threshold_value2 REAL,
+                threshold_unit TEXT,
                 severity_if_match TEXT NOT NULL,
                 is_abnormal_if_match INTEGER DEFAULT 1,
                 message TEXT,
@@ -206,6 +248,18 @@ class Database:
             )
         """)
         
+        # threshold_unitカラムのマイグレーション（既存ルールは param_value_num で比較）
+        try:
+            cursor.execute("PRAGMA table_info(pattern_rules)")
+            columns = cursor.fetchall()
+            if not any(col[1] == 'threshold_unit' for col in columns):
+                cursor.execute("ALTER TABLE pattern_rules ADD COLUMN threshold_unit TEXT")
+                self.conn.commit()
+        except sqlite3.OperationalError as e:
+            # 既に追加済みの場合はスキップ
+            if "duplicate column" not in str(e).lower():
+                print(f"Warning: Migration issue for threshold_unit: {e}", file=__import__('sys').stderr)
+        
         # 5. alerts テーブル（通知履歴）
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS alerts (
@@ -250,9 +304,78 @@ class Database:
             )
         """)
         
+        # 8. ingest_checkpoints テーブル（追跡取り込みの再開位置）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+                path TEXT PRIMARY KEY,
+                inode INTEGER,
+                offset INTEGER NOT NULL DEFAULT 0,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # 9. pattern_templates テーブル（テンプレートツリーのテンプレート）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS pattern_templates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pattern_id INTEGER NOT NULL UNIQUE,
+                token_count INTEGER NOT NULL,
+                template TEXT NOT NULL,
+                route TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (pattern_id) REFERENCES regex_patterns(id)
+            )
+        """)
+        
+        # routeカラムのマイグレーション（既存テンプレートは読み込み時にトークン列から振り分ける）
+        try:
+            cursor.execute("PRAGMA table_info(pattern_templates)")
+            columns = cursor.fetchall()
+            if not any(col[1] == 'route' for col in columns):
+                cursor.execute("ALTER TABLE pattern_templates ADD COLUMN route TEXT")
+                self.conn.commit()
+        except sqlite3.OperationalError as e:
+            # 既に追加済みの場合はスキップ
+            if "duplicate column" not in str(e).lower():
+                print(f"Warning: Migration issue for route: {e}", file=__import__('sys').stderr)
+        
+        # 10. pattern_id_remap テーブル（merge-patterns で統合したパターンIDの対応）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS pattern_id_remap (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                old_pattern_id INTEGER NOT NULL,
+                new_pattern_id INTEGER NOT NULL,
+                old_regex_rule TEXT UNIQUE,
+                sample_message TEXT,
+                total_count INTEGER NOT NULL DEFAULT 0,
+                merged_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (new_pattern_id) REFERENCES regex_patterns(id)
+            )
+        """)
+        
+        # 11. table_generations テーブル（TRACKED_TABLES の変更ごとにトリガーで世代番号を進める）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS table_generations (
+                table_name TEXT PRIMARY KEY,
+                generation INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        for table, columns in TRACKED_TABLES.items():
+            cursor.execute("INSERT OR IGNORE INTO table_generations (table_name) VALUES (?)", (table,))
+            bump = f"UPDATE table_generations SET generation = generation + 1 WHERE table_name = '{table}';"
+            update_of = f"UPDATE OF {', '.join(columns)}" if columns else "UPDATE"
+            for event, suffix in (('INSERT', 'insert'), (update_of, 'update'), ('DELETE', 'delete')):
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_generation_{suffix}
+                    AFTER {event} ON {table}
+                    BEGIN {bump} END
+                """)
+        
         # インデックス作成
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_regex_patterns_regex_rule ON regex_patterns(regex_rule)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_regex_patterns_label ON regex_patterns(label)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_regex_patterns_component ON regex_patterns(component)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_log_entries_ts ON log_entries(ts)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_log_entries_pattern_id ON log_entries(pattern_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_log_entries_classification ON log_entries(classification)")
@@ -265,13 +388,30 @@ class Database:
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_log_id ON alerts(log_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_ai_analyses_log_id ON ai_analyses(log_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_unique_log_entries_raw_line ON unique_log_entries(raw_line)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pattern_id_remap_new_pattern_id ON pattern_id_remap(new_pattern_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pattern_id_remap_old_pattern_id ON pattern_id_remap(old_pattern_id)")
         
         self.conn.commit()
     
+    def table_generations(self, cursor=None) -> dict:
+        """
+        TRACKED_TABLES の世代番号を取得
+        
+        Args:
+            cursor: データベースカーソル（省略時はこの接続を使用）
+            
+        Returns:
+            テーブル名 -> 世代番号 の辞書
+        """
+        if cursor is None:
+            cursor = self.get_connection().cursor()
+        cursor.execute("SELECT table_name, generation FROM table_generations")
+        return {row[0]: row[1] for row in cursor.fetchall()}
+    
     def get_connection(self):
         """データベース接続を取得"""
         if self.conn is None:
-            self.conn = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES)
+            self.conn = sqlite3.connect(self.db_path, timeout=self.timeout, detect_types=sqlite3.PARSE_DECLTYPES)
             self.conn.row_factory = sqlite3.Row
         return self.conn
     
@@ -286,3 +426,67 @@ class Database:
     
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
+
+
+class TableWatcher:
+    """
+    他の接続によるテーブルの変更を検知する（キャッシュの再読み込み判定用）
+    
+    PRAGMA data_version（他の接続がコミットした場合にのみ値が変わる。テーブルは読まない）を
+    先に確認し、変わっていた場合だけ table_generations を読んで対象テーブルの世代番号を比較する。
+    ログの取り込みなど対象外のテーブルへのコミットでは、世代番号が変わらないため変更とみなさない。
+    自分の接続での変更は検知しない（接続の total_changes が増えていれば世代番号を読み直して基準に含め、
+    次に他の接続がコミットした際に自分の変更を他の接続の変更と誤検知しないようにする）。
+    """
+    
+    def __init__(self, tables):
+        """
+        Args:
+            tables: 監視するテーブル名（TRACKED_TABLES のキー）
+        """
+        unknown = [table for table in tables if table not in TRACKED_TABLES]
+        if unknown:
+            raise ValueError(f"Tables are not tracked: {', '.join(unknown)}")
+        self.tables = tuple(tables)
+        self._data_version = None
+        self._total_changes = None
+        self._generations = None
+    
+    def poll(self, cursor) -> bool:
+        """
+        前回の呼び出し以降に対象テーブルが変更されたかどうか
+        
+        初回の呼び出しは基準を記録するだけで False を返す。
+        前回の呼び出し以降に自分の接続と他の接続の両方がコミットしていた場合は、
+        どちらの変更か区別できないため、世代番号が変わっていれば変更ありとみなす。
+        
+        Args:
+            cursor: データベースカーソル
+            
+        Returns:
+            変更された場合True
+        """
+        cursor.execute("PRAGMA data_version")
+        data_version = cursor.fetchone()[0]
+        total_changes = cursor.connection.total_changes
+        if data_version == self._data_version:
+            if total_changes != self._total_changes:
+                # 他の接続のコミットはなく、世代番号の変化は自分の変更によるもの
+                self._total_changes = total_changes
+                self._generations = self._read_generations(cursor)
+            return False
+        self._data_version = data_version
+        self._total_changes = total_changes
+        
+        generations = self._read_generations(cursor)
+        changed = self._generations is not None and generations != self._generations
+        self._generations = generations
+        return changed
+    
+    def _read_generations(self, cursor) -> dict:
+        """対象テーブルの世代番号を読み込む"""
+        cursor.execute(f"""
+            SELECT table_name, generation FROM table_generations
+            WHERE table_name IN ({','.join('?' * len(self.tables))})
+        """, self.tables)
+        return {row[0]: row[1] for row in cursor.fetchall()}
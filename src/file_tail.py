@@ -0,0 +1,133 @@
+"""
+ファイル追跡: 追記されていくログファイルを tail し、ローテーション・切り詰めを検出
+"""
+import os
+from typing import List, Optional, Tuple
+
+
+class FileTail:
+    """
+    1ファイル分の tail 状態を保持するクラス
+
+    バイト単位のオフセットを管理し、改行で終わった完全な行だけを返す。
+    行の途中までしか書き込まれていない部分は次回の読み込みまで保持する。
+    """
+
+    def __init__(self, path: str, inode: Optional[int] = None, offset: int = 0):
+        """
+        Args:
+            path: ログファイルのパス
+            inode: チェックポイントに記録されていた inode（なければNone）
+            offset: チェックポイントに記録されていたオフセット（処理済みバイト数）
+        """
+        self.path = path
+        self.inode = inode
+        # 処理済み（完全な行として返した）バイト位置
+        self.offset = offset
+        self._file = None
+        self._buffer = b''
+
+    def open(self) -> bool:
+        """
+        ファイルを開き、チェックポイントの位置から読み込みを再開
+
+        inode が異なる（ローテーション済み）またはファイルが切り詰められている場合は
+        先頭から読み直す。
+
+        Returns:
+            ファイルを開けた場合True（ファイルが存在しない場合False）
+        """
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return False
+
+        st = os.fstat(f.fileno())
+        if self.inode != st.st_ino or st.st_size < self.offset:
+            self.offset = 0
+        self.inode = st.st_ino
+        f.seek(self.offset)
+        self._file = f
+        self._buffer = b''
+        return True
+
+    def close(self):
+        """ファイルを閉じる"""
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def read_lines(self, max_bytes: int = 1 << 20, final: bool = False) -> List[Tuple[str, int]]:
+        """
+        追記された完全な行を読み込む
+
+        Args:
+            max_bytes: 1回に読み込む最大バイト数
+            final: Trueの場合、改行で終わっていない末尾も1行として返す（ローテーション時）
+
+        Returns:
+            (行, その行の終端オフセット) のリスト
+        """
+        if self._file is None and not self.open():
+            return []
+
+        data = self._buffer + self._file.read(max_bytes)
+        lines = []
+        start = 0
+        # バッファ先頭のファイル上の位置
+        base = self.offset
+        while True:
+            end = data.find(b'\n', start)
+            if end < 0:
+                break
+            lines.append((data[start:end + 1].decode('utf-8', errors='ignore'), base + end + 1))
+            start = end + 1
+
+        self._buffer = data[start:]
+        if final and self._buffer:
+            lines.append((self._buffer.decode('utf-8', errors='ignore'), base + len(data)))
+            self._buffer = b''
+
+        if lines:
+            self.offset = lines[-1][1]
+        return lines
+
+    def poll(self, max_bytes: int = 1 << 20) -> Tuple[Optional[int], List[Tuple[str, int]]]:
+        """
+        追記された完全な行を返す。EOFに達している場合はローテーション・切り詰めを確認する
+
+        - ローテーション（パスの inode が変化）: 古いファイルの残りを返して閉じ、
+          次回の呼び出しで新しいファイルを先頭から読む
+        - 切り詰め（copytruncate など）: 先頭から読み直す
+
+        Args:
+            max_bytes: 1回に読み込む最大バイト数
+
+        Returns:
+            (行を読み込んだファイルの inode, [(行, その行の終端オフセット), ...])
+        """
+        inode = self.inode
+        lines = self.read_lines(max_bytes)
+        if lines or self._file is None:
+            return (self.inode, lines)
+
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            # ローテーション直後で新しいファイルがまだ作成されていない
+            return (inode, [])
+
+        if st.st_ino != self.inode:
+            # 古いファイルの末尾（改行なしの行を含む）を読み切ってから閉じる
+            lines = self.read_lines(max_bytes, final=True)
+            self.close()
+            self.inode = None
+            self.offset = 0
+            return (inode, lines)
+
+        if st.st_size < self.offset + len(self._buffer):
+            self.offset = 0
+            self._buffer = b''
+            self._file.seek(0)
+
+        return (inode, [])
@@ -3,31 +3,252 @@
 """
 import sys
 import os
+import signal
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple, Iterable, Iterator
 
 # パスを追加してモジュールをインポート可能にする
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.database import Database
+from src.database import Database, TableWatcher
 from src.log_parser import LogParser
-from src.abstract_message import abstract_message, validate_pattern
+from src.abstract_message import (
+    abstract_message, abstract_message_typed, validate_pattern, compile_pattern, parse_token_types
+)
 from src.param_extractor import ParamExtractor
 from src.anomaly_detector import AnomalyDetector
+from src.pattern_matcher import ManualPatternIndex, PatternMatcher
+from src.pattern_cache import PatternCache
+from src.batch_writer import BatchWriter
+from src.outcome_cache import OutcomeCache
+from src.file_tail import FileTail
+from src.template_tree import TemplateTree, template_tokens, template_regex
+
+
+def prepare_line(line: str, parser: LogParser, manual_index: ManualPatternIndex,
+                 param_extractor: ParamExtractor, token_types: Optional[tuple] = None) -> Dict:
+    """
+    DBに依存しない前処理を実行（パース、パターン生成、手動パターン照合、パラメータ抽出）
+    
+    ワーカープロセスでも実行できるよう、データベースには一切アクセスしない。
+    
+    Args:
+        line: ログの1行
+        parser: LogParserインスタンス
+        manual_index: 手動パターンのインデックス
+        param_extractor: ParamExtractorインスタンス
+        token_types: パターン生成に使う型付きトークンの種類（Noneの場合は abstract_message()）
+        
+    Returns:
+        prepare_parsed() の戻り値
+    """
+    # ログ行をパース
+    parsed = parser.parse_line(line)
+    #ts, host, component, message, raw_lineの４項目を表示
+    return prepare_parsed(parsed, manual_index, param_extractor, token_types)
+
+
+def prepare_parsed(parsed: Dict, manual_index: ManualPatternIndex,
+                   param_extractor: ParamExtractor, token_types: Optional[tuple] = None) -> Dict:
+    """
+    パース済みのログに対してDBに依存しない前処理を実行
+    （パターン生成、手動パターン照合、パラメータ抽出）
+    
+    Args:
+        parsed: LogParser.parse_line() と同じ形式の辞書
+        manual_index: 手動パターンのインデックス
+        param_extractor: ParamExtractorインスタンス
+        token_types: パターン生成に使う型付きトークンの種類（Noneの場合は abstract_message()）
+        
+    Returns:
+        前処理結果の辞書
+        {
+            'parsed': parsed,
+            'regex_rule': 自動生成パターン（生成できなかった場合はNone）,
+            'manual_pattern_id': マッチした手動パターンID（なければNone）,
+            'params': 使用するパターンで抽出したパラメータ,
+            'warning': 詳細出力用の警告メッセージ（なければNone）
+        }
+    """
+    message = parsed['message']
+    warning = None
+    
+    # abstract_message でパターンを生成
+    #正規表現に変換
+    try:
+        if token_types:
+            regex_rule = abstract_message_typed(message, token_types)
+        else:
+            regex_rule = abstract_message(message)
+        
+        # パターンの検証（オプション、デバッグ用）
+        if not validate_pattern(regex_rule, message):
+            warning = "Pattern validation failed"
+    except Exception as e:
+        warning = f"Error generating pattern: {e}"
+        regex_rule = None
+    
+    # 手動パターンを先にチェック（named capture groupを含むパターンを優先）
+    # component が設定された手動パターンは同じコンポーネントのログにだけ試す
+    manual_pattern_id = manual_index.match(message, parsed['component'])
+    
+    # パラメータ抽出に使用するパターン
+    # 手動パターンなら manual_regex_rule、自動生成パターンなら regex_rule
+    # （regex_rule と同一文字列の manual_regex_rule にマッチした場合も結果は同じ）
+    rule = manual_index.rule_of(manual_pattern_id) if manual_pattern_id else regex_rule
+    params = param_extractor.extract_params(rule, message) if rule else {}
+    
+    return {
+        'parsed': parsed,
+        'regex_rule': regex_rule,
+        'manual_pattern_id': manual_pattern_id,
+        'params': params,
+        'warning': warning
+    }
+
+
+# ワーカープロセスごとの状態（_init_worker で初期化）
+_worker_state = {}
+
+
+def _init_worker(manual_rows: List[Tuple[int, str]], default_year: int,
+                 token_types: Optional[tuple] = None):
+    """
+    ワーカープロセスの初期化（手動パターンのスナップショットからインデックスを構築）
+    
+    Args:
+        manual_rows: ManualPatternIndex.rows() の戻り値
+        default_year: LogParser のデフォルト年
+        token_types: パターン生成に使う型付きトークンの種類
+    """
+    manual_index = ManualPatternIndex()
+    manual_index.build(manual_rows)
+    _worker_state['parser'] = LogParser(default_year)
+    _worker_state['manual_index'] = manual_index
+    _worker_state['param_extractor'] = ParamExtractor()
+    _worker_state['token_types'] = token_types
+
+
+def _prepare_chunk(lines: List[str]) -> List[Dict]:
+    """
+    ワーカープロセスで複数行をまとめて前処理
+    
+    Args:
+        lines: ログ行のリスト
+        
+    Returns:
+        prepare_line() の戻り値のリスト（前処理に失敗した行は {'error': str}）
+    """
+    results = []
+    for line in lines:
+        try:
+            results.append(prepare_line(
+                line,
+                _worker_state['parser'],
+                _worker_state['manual_index'],
+                _worker_state['param_extractor'],
+                _worker_state['token_types']
+            ))
+        except Exception as e:
+            results.append({'error': str(e)})
+    return results
+
+
+def _read_chunks(file_path: str, chunk_size: int) -> Iterator[List[str]]:
+    """
+    ファイルを chunk_size 行ずつ読み込む
+    
+    Args:
+        file_path: ログファイルのパス
+        chunk_size: 1チャンクあたりの行数
+        
+    Yields:
+        ログ行のリスト
+    """
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        chunk = []
+        for line in f:
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _map_ordered(pool: ProcessPoolExecutor, fn, items: Iterable, window: int) -> Iterator:
+    """
+    先読み数を window に制限しつつ、入力順に結果を返す pool.map
+    
+    Executor.map は入力を全て先に投入してしまうため、大きなファイルでもメモリを
+    一定に保てるように投入数を制限する。
+    """
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def iter_log_files(paths: List[str]) -> List[str]:
+    """
+    ファイルとディレクトリの指定を取り込み対象ファイルのリストに展開
+    
+    ディレクトリの場合は直下の通常ファイル（隠しファイルを除く）を名前順に展開する。
+    
+    Args:
+        paths: ファイルまたはディレクトリのパスのリスト
+        
+    Returns:
+        ファイルパスのリスト
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                file_path = os.path.join(path, name)
+                if not name.startswith('.') and os.path.isfile(file_path):
+                    files.append(file_path)
+        else:
+            files.append(path)
+    return files
 
 
 class LogIngester:
     """ログ取り込み処理を実行するクラス"""
     
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, batch_size: int = 1000, outcome_cache_size: int = 100000,
+                 template_tree: Optional[TemplateTree] = None, token_types: Optional[tuple] = None):
         """
         Args:
             db: Databaseインスタンス
+            batch_size: まとめて書き込む（コミットする）ログ件数
+            outcome_cache_size: 分類結果キャッシュの最大件数（0の場合はキャッシュしない）
+            template_tree: 自動生成パターンの識別に使うテンプレートツリー
+                （Noneの場合は abstract_message() の出力の完全一致で識別する）
+            token_types: パターン生成に使う型付きトークンの種類
+                （Noneの場合は abstract_message() で生成する）
         """
         self.db = db
         self.parser = LogParser()
         self.param_extractor = ParamExtractor()
         self.anomaly_detector = AnomalyDetector(db)
+        self.manual_index = PatternMatcher(db)
+        self.pattern_cache = PatternCache()
+        self.writer = BatchWriter(db.get_connection(), batch_size)
+        self.outcome_cache = OutcomeCache(outcome_cache_size)
+        self.template_tree = template_tree
+        self._template_watcher = TableWatcher(('pattern_templates',))
+        self.token_types = token_types
+        self._run_started = False
+        # 次のコミットで保存するチェックポイント: パス -> (inode, offset)
+        self._checkpoints: Dict[str, Tuple[Optional[int], int]] = {}
     
     def ingest_file(self, file_path: str, verbose: bool = False):
         """
@@ -37,174 +258,528 @@ class LogIngester:
             file_path: ログファイルのパス
             verbose: 詳細出力するかどうか
         """
+        self.ingest_files([file_path], workers=1, verbose=verbose)
+    
+    def ingest_files(self, file_paths: List[str], workers: int = 1, verbose: bool = False,
+                     chunk_size: int = 2000) -> Dict:
+        """
+        複数のログファイルを取り込む
+        
+        workers > 1 の場合、パース・パターン生成・手動パターン照合・パラメータ抽出を
+        プロセスプールで並列実行し、結果をファイル順・行順にこのプロセスの
+        単一の書き込み処理に流す。パターンIDの採番は書き込み側だけで行うため、
+        逐次実行と同じ結果になる。
+        ワーカーは開始時点の手動パターンのスナップショットを使用する。
+        
+        Args:
+            file_paths: ログファイルのパスのリスト
+            workers: 前処理を行うプロセス数（1の場合は逐次実行）
+            verbose: 詳細出力するかどうか
+            chunk_size: ワーカーに渡す1チャンクあたりの行数
+            
+        Returns:
+            全ファイルの合計の統計情報
+        """
+        for file_path in file_paths:
+            if not os.path.isfile(file_path):
+                print(f"Error: File not found: {file_path}", file=sys.stderr)
+                sys.exit(1)
+        
         conn = self.db.get_connection()
         cursor = conn.cursor()
+        self._start_run(cursor)
         
-        stats = {
-            'total_lines': 0,
-            'parsed_lines': 0,
-            'new_patterns': 0,
-            'existing_patterns': 0,
-            'errors': 0
-        }
+        total_stats = self._new_stats()
+        started = time.perf_counter()
+        pool = None
+        if workers > 1:
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(self.manual_index.rows(), self.parser.default_year, self.token_types)
+            )
         
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for line_num, line in enumerate(f, 1):
-                    stats['total_lines'] += 1
-                    
-                    if verbose and line_num % 1000 == 0:
-                        print(f"Processing line {line_num}...", file=sys.stderr)
-                    
-                    try:
-                        # ログ行をパース
-                        parsed = self.parser.parse_line(line)
-                        #ts, host, component, message, raw_lineの４項目を表示
-                        
-                        # abstract_message でパターンを生成
-                        #正規表現に変換
-                        try:
-                            regex_rule = abstract_message(parsed['message'])
-                            
-                            # パターンの検証（オプション、デバッグ用）
-                            if not validate_pattern(regex_rule, parsed['message']):
-                                if verbose:
-                                    print(f"Warning: Pattern validation failed for line {line_num}", file=sys.stderr)
-                        except Exception as e:
-                            if verbose:
-                                print(f"Error generating pattern for line {line_num}: {e}", file=sys.stderr)
-                            regex_rule = None
-                        
-                        # パターンをデータベースから検索または作成
-                        pattern_id = None
-                        is_new_pattern = False
-                        
-                        # 手動パターンを先にチェック（named capture groupを含むパターンを優先）
-                        manual_pattern_id = self._check_manual_patterns(cursor, parsed['message'])
-                        if manual_pattern_id:
-                            pattern_id = manual_pattern_id
-                            is_new_pattern = False
-                            stats['existing_patterns'] += 1
-                        elif regex_rule:
-                            # 手動パターンがマッチしない場合、既存パターンを検索（regex_rule と manual_regex_rule の両方をチェック）
-                            pattern_id, is_new_pattern = self._find_or_create_pattern(
-                                cursor, regex_rule, parsed['message'], verbose
-                            )
-                            if pattern_id:
-                                if is_new_pattern:
-                                    stats['new_patterns'] += 1
-                                else:
-                                    stats['existing_patterns'] += 1
-                        
-                        # 既知か未知かを判断
-                        is_known = 1 if pattern_id and not is_new_pattern else 0
-                        
-                        # パターンのラベルに基づいてclassificationを決定
-                        # デフォルトは 'unknown'
-                        classification = 'unknown'
-                        severity = None
-                        
-                        # 既知ログ（is_known=1）の場合のみ、パターンのラベルを使用
-                        if is_known == 1 and pattern_id:
-                            cursor.execute("""
-                                SELECT label, severity
-                                FROM regex_patterns
-                                WHERE id = ?
-                            """, (pattern_id,))
-                            pattern_row = cursor.fetchone()
-                            if pattern_row:
-                                classification = pattern_row['label']
-                                severity = pattern_row['severity']
-                                # パターンのラベルが 'unknown' の場合は 'normal' にする
-                                if classification == 'unknown':
-                                    classification = 'normal'
-                        
-                        # 未知ログ（is_known=0）の場合は常に 'unknown'
-                        # （パターンが作成されても、まだ未知ログとして扱う）
-                        
-                        # log_entries に INSERT
-                        cursor.execute("""
-                            INSERT INTO log_entries
-                            (ts, host, component, raw_line, message, pattern_id, is_known, classification, severity)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        """, (
-                            parsed['ts'],
-                            parsed['host'],
-                            parsed['component'],
-                            parsed['raw_line'],
-                            parsed['message'],
-                            pattern_id,
-                            is_known,
-                            classification,
-                            severity
-                        ))
-                        
-                        log_id = cursor.lastrowid
-                        stats['parsed_lines'] += 1
-                        
-                        # パラメータ抽出（既知ログの場合）
-                        if pattern_id and is_known:
-                            # 使用する正規表現パターンを決定（regex_rule または manual_regex_rule）
-                            cursor.execute("""
-                                SELECT regex_rule, manual_regex_rule
-                                FROM regex_patterns
-                                WHERE id = ?
-                            """, (pattern_id,))
-                            pattern_row = cursor.fetchone()
-                            if pattern_row:
-                                # manual_regex_rule があればそれを使用、なければ regex_rule を使用
-                                pattern_to_use = pattern_row['manual_regex_rule'] or pattern_row['regex_rule']
-                                if pattern_to_use:
-                                    self._extract_and_save_params(cursor, log_id, pattern_to_use, parsed['message'])
-                            
-                            # 異常判定を実行（既知ログの場合）
-                            anomaly_info = self.anomaly_detector.check_anomaly(log_id, pattern_id)
-                            if anomaly_info:
-                                # 異常が検知された場合、classificationを更新
-                                cursor.execute("""
-                                    UPDATE log_entries
-                                    SET classification = ?,
-                                        severity = ?,
-                                        anomaly_reason = ?
-                                    WHERE id = ?
-                                """, (
-                                    anomaly_info['classification'],
-                                    anomaly_info['severity'],
-                                    anomaly_info['anomaly_reason'],
-                                    log_id
-                                ))
-                                classification = anomaly_info['classification']
-                        
-                        # abnormal または unknown の場合はアラートを生成
-                        if classification in ('abnormal', 'unknown'):
-                            self._create_alert(cursor, log_id, classification, parsed)
-                        
-                    except Exception as e:
-                        stats['errors'] += 1
-                        if verbose:
-                            print(f"Error processing line {line_num}: {e}", file=sys.stderr)
-                        continue
-                    
-                    # 定期的にコミット（パフォーマンス向上）
-                    if line_num % 1000 == 0:
-                        conn.commit()
-            
-            # 最終コミット
-            conn.commit()
-            
-        except FileNotFoundError:
-            print(f"Error: File not found: {file_path}", file=sys.stderr)
-            sys.exit(1)
+            for file_path in file_paths:
+                stats = self._new_stats()
+                file_started = time.perf_counter()
+                
+                if pool:
+                    prepared_chunks = _map_ordered(
+                        pool, _prepare_chunk, _read_chunks(file_path, chunk_size), window=workers * 2
+                    )
+                else:
+                    # 逐次実行ではパースだけ先に行い、前処理は分類結果キャッシュにない場合のみ行う
+                    prepared_chunks = (
+                        [self._parse_safe(line) for line in chunk]
+                        for chunk in _read_chunks(file_path, chunk_size)
+                    )
+                
+                line_num = 0
+                for prepared_chunk in prepared_chunks:
+                    for prepared in prepared_chunk:
+                        line_num += 1
+                        self._ingest_prepared(conn, cursor, prepared, line_num, stats, verbose)
+                
+                # ファイル単位でコミット
+                self._commit(conn, cursor)
+                stats['elapsed'] = time.perf_counter() - file_started
+                
+                if len(file_paths) > 1:
+                    print(f"=== {file_path} ===")
+                self._print_stats(stats)
+                for key in total_stats:
+                    total_stats[key] += stats[key]
+        
         except Exception as e:
             print(f"Error reading file: {e}", file=sys.stderr)
             sys.exit(1)
+        finally:
+            if pool:
+                pool.shutdown()
+        
+        total_stats['elapsed'] = time.perf_counter() - started
+        if len(file_paths) > 1:
+            print(f"=== Total ({len(file_paths)} files, workers={workers}) ===")
+            self._print_stats(total_stats)
+        self._print_manual_pattern_stats(verbose)
+        return total_stats
+    
+    def follow_files(self, file_paths: List[str], poll_interval: float = 1.0,
+                     once: bool = False, verbose: bool = False) -> Dict:
+        """
+        ログファイルを tail しながら追記分を取り込む（--follow）
+        
+        ファイルごとの (path, inode, offset) を ingest_checkpoints テーブルに保存し、
+        ログの INSERT と同じトランザクションでコミットするため、再起動しても
+        取り込み済みの行を重複させずに続きから再開できる。
+        ローテーション（inode の変化）と切り詰めを検出した場合は先頭から読み直す。
+        
+        Args:
+            file_paths: 追跡するログファイルのパスのリスト
+            poll_interval: 追記がない場合の待機秒数
+            once: Trueの場合、現在のファイル末尾まで取り込んだら終了する
+            verbose: 詳細出力するかどうか
+            
+        Returns:
+            統計情報
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        self._start_run(cursor)
+        
+        tails = []
+        for file_path in file_paths:
+            path = os.path.abspath(file_path)
+            cursor.execute("SELECT inode, offset FROM ingest_checkpoints WHERE path = ?", (path,))
+            row = cursor.fetchone()
+            if row:
+                tails.append(FileTail(path, row['inode'], row['offset']))
+            else:
+                tails.append(FileTail(path))
+        
+        stats = self._new_stats()
+        started = time.perf_counter()
+        line_num = 0
+        
+        try:
+            while True:
+                received = 0
+                for tail in tails:
+                    while True:
+                        inode, lines = tail.poll()
+                        if not lines:
+                            break
+                        for line, end_offset in lines:
+                            line_num += 1
+                            # 行と同じトランザクションでオフセットを保存する
+                            self._checkpoints[tail.path] = (inode, end_offset)
+                            self._ingest_prepared(conn, cursor, self._parse_safe(line), line_num, stats, verbose)
+                        # ローテーション後は (None, 0) になり、新しいファイルを先頭から読む
+                        self._checkpoints[tail.path] = (tail.inode, tail.offset)
+                        received += len(lines)
+                
+                # ポーリングごとにコミットしてアラートを即時に反映
+                if received:
+                    self._commit(conn, cursor)
+                elif once:
+                    break
+                else:
+                    time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._commit(conn, cursor)
+            for tail in tails:
+                tail.close()
+        
+        stats['elapsed'] = time.perf_counter() - started
+        self._print_stats(stats)
+        self._print_manual_pattern_stats(verbose)
+        return stats
+    
+    def ingest_parsed(self, parsed_logs: List[Dict], stats: Optional[Dict] = None,
+                      verbose: bool = False) -> Dict:
+        """
+        パース済みのログをまとめて取り込んでコミット（ストリーミング受信用のグループコミット）
         
-        # 統計を表示
+        syslog 受信デーモンなど、ファイル以外から受け取ったログを
+        ファイル取り込みと同じ分類処理に流すために使用する。
+        parsed_logs は1トランザクションで書き込み、データベースがロックされているなど
+        sqlite3.OperationalError が発生した場合はロールバックして例外を送出する
+        （1件も書き込まれていないため、呼び出し側はそのまま再試行できる）。
+        
+        Args:
+            parsed_logs: LogParser.parse_line() と同じ形式の辞書のリスト
+            stats: 加算していく統計情報（省略時は新規に作成）
+            verbose: 詳細出力するかどうか
+            
+        Returns:
+            統計情報
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        if not self._run_started:
+            self._start_run(cursor)
+        if stats is None:
+            stats = self._new_stats()
+        
+        try:
+            for parsed in parsed_logs:
+                self._ingest_prepared(conn, cursor, {'parsed': parsed}, stats['total_lines'] + 1, stats, verbose,
+                                      atomic=True)
+            self._write(conn, cursor)
+        except sqlite3.OperationalError:
+            self._rollback(conn)
+            raise
+        
+        try:
+            self._refresh_caches(cursor)
+        except sqlite3.OperationalError:
+            # コミット済みのため再試行させない。キャッシュは次回の取り込み開始時に読み込み直す
+            self.pattern_cache.invalidate()
+            self._run_started = False
+        return stats
+    
+    def _start_run(self, cursor):
+        """取り込み開始時の準備（手動パターンの読み込みとキャッシュの確認）"""
+        # 手動パターンはインジェスト1回につき1度だけ読み込んでコンパイル
+        self.manual_index.load(cursor)
+        self.manual_index.hit_counts.clear()
+        self.pattern_cache.refresh_if_changed(cursor)
+        self.anomaly_detector.invalidate()
+        self.anomaly_detector.refresh_if_changed(cursor)
+        self.outcome_cache.invalidate()
+        if self.template_tree is not None:
+            self._template_watcher.poll(cursor)
+            self.template_tree.load(cursor)
+        self._run_started = True
+    
+    @staticmethod
+    def _new_stats() -> Dict:
+        """統計情報の初期値"""
+        return {
+            'total_lines': 0,
+            'parsed_lines': 0,
+            'new_patterns': 0,
+            'existing_patterns': 0,
+            'errors': 0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'templates_generalized': 0,
+            'elapsed': 0.0
+        }
+    
+    @staticmethod
+    def _print_stats(stats: Dict):
+        """統計情報を表示"""
         print(f"Total lines: {stats['total_lines']}")
         print(f"Parsed lines: {stats['parsed_lines']}")
         print(f"New patterns: {stats['new_patterns']}")
         print(f"Existing patterns: {stats['existing_patterns']}")
         print(f"Errors: {stats['errors']}")
+        if stats['templates_generalized']:
+            print(f"Generalized templates: {stats['templates_generalized']}")
+        lookups = stats['cache_hits'] + stats['cache_misses']
+        if lookups:
+            print(f"Outcome cache: {stats['cache_hits']} hits / {stats['cache_misses']} misses "
+                  f"({stats['cache_hits'] / lookups:.1%} hit rate)")
+        if stats['elapsed'] > 0:
+            print(f"Elapsed: {stats['elapsed']:.2f}s ({stats['total_lines'] / stats['elapsed']:.0f} lines/sec)")
+    
+    def _parse_safe(self, line: str) -> Dict:
+        """
+        このプロセス内でログ行をパースする（失敗した場合は {'error': str}）
+        
+        前処理（prepare_parsed()）は分類時に分類結果キャッシュにない場合のみ行う。
+        """
+        try:
+            return {'parsed': self.parser.parse_line(line)}
+        except Exception as e:
+            return {'error': str(e)}
+    
+    def _ingest_prepared(self, conn, cursor, prepared: Dict, line_num: int, stats: Dict, verbose: bool,
+                         atomic: bool = False):
+        """
+        前処理済みの1行を分類して書き込みバッファに追加し、必要に応じてコミット
+        
+        Args:
+            conn: データベース接続
+            cursor: データベースカーソル
+            prepared: prepare_line() の戻り値
+            line_num: 行番号
+            stats: 統計情報（更新される）
+            verbose: 詳細出力するかどうか
+            atomic: Trueの場合、バッファが一杯でもコミットせず、
+                    sqlite3.OperationalError は行のエラーとして数えずに送出する
+        """
+        stats['total_lines'] += 1
+        
+        if verbose and line_num % 1000 == 0:
+            print(f"Processing line {line_num}...", file=sys.stderr)
+        
+        try:
+            if 'error' in prepared:
+                raise ValueError(prepared['error'])
+            self._classify(cursor, prepared, line_num, stats, verbose)
+        except Exception as e:
+            if atomic and isinstance(e, sqlite3.OperationalError):
+                raise
+            stats['errors'] += 1
+            if verbose:
+                print(f"Error processing line {line_num}: {e}", file=sys.stderr)
+            return
+        
+        # バッファが一杯になったらまとめて書き込んでコミット（パフォーマンス向上）
+        if self.writer.is_full:
+            if atomic:
+                self.writer.flush(cursor)
+            else:
+                self._commit(conn, cursor)
+    
+    def _classify(self, cursor, prepared: Dict, line_num: int, stats: Dict, verbose: bool):
+        """
+        前処理済みの1行を分類し、書き込みバッファに追加
+        
+        パラメータ抽出と異常判定はINSERT前に行い、最終的な classification を確定させる。
+        
+        Args:
+            cursor: データベースカーソル
+            prepared: prepare_line() の戻り値、またはパースのみ済んだ {'parsed': parsed}
+            line_num: 行番号
+            stats: 統計情報（更新される）
+            verbose: 詳細出力するかどうか
+        """
+        parsed = prepared['parsed']
+        
+        # 同一メッセージの分類結果があれば前処理・パターン検索・異常判定を省略
+        cache_key = (parsed['component'], parsed['message'])
+        if self.outcome_cache.max_size > 0:
+            outcome = self.outcome_cache.get(cache_key)
+            if outcome is not None:
+                stats['cache_hits'] += 1
+                self._apply_outcome(parsed, outcome, stats)
+                return
+            stats['cache_misses'] += 1
+        
+        if 'regex_rule' not in prepared:
+            prepared = prepare_parsed(parsed, self.manual_index, self.param_extractor, self.token_types)
+        regex_rule = prepared['regex_rule']
+        if verbose and prepared['warning']:
+            print(f"Warning: {prepared['warning']} for line {line_num}", file=sys.stderr)
+        
+        # パターンをデータベースから検索または作成
+        pattern_id = None
+        is_new_pattern = False
+        
+        # 手動パターンを先にチェック（named capture groupを含むパターンを優先）
+        manual_pattern_id = prepared['manual_pattern_id']
+        if manual_pattern_id:
+            pattern_id = manual_pattern_id
+            is_new_pattern = False
+            self.manual_index.record_hit(manual_pattern_id)
+            stats['existing_patterns'] += 1
+        elif regex_rule:
+            # 手動パターンがマッチしない場合、既存パターンを検索（regex_rule と manual_regex_rule の両方をチェック）
+            if self.template_tree is not None:
+                pattern_id, is_new_pattern = self._find_or_create_template(
+                    cursor, regex_rule, parsed['message'], stats, verbose
+                )
+            else:
+                pattern_id, is_new_pattern = self._find_or_create_pattern(
+                    cursor, regex_rule, parsed['message'], verbose
+                )
+            if pattern_id:
+                if is_new_pattern:
+                    stats['new_patterns'] += 1
+                else:
+                    stats['existing_patterns'] += 1
+        
+        # 既知か未知かを判断
+        is_known = 1 if pattern_id and not is_new_pattern else 0
+        
+        # パターンのラベルに基づいてclassificationを決定
+        # デフォルトは 'unknown'
+        # 未知ログ（is_known=0）の場合は常に 'unknown'
+        # （パターンが作成されても、まだ未知ログとして扱う）
+        classification = 'unknown'
+        severity = None
+        anomaly_reason = None
+        params = None
+        
+        # 既知ログ（is_known=1）の場合のみ、パターンのラベルを使用
+        if is_known == 1 and pattern_id:
+            pattern_info = self.pattern_cache.get_by_id(cursor, pattern_id)
+            if pattern_info:
+                classification = pattern_info['label']
+                severity = pattern_info['severity']
+                # パターンのラベルが 'unknown' の場合は 'normal' にする
+                if classification == 'unknown':
+                    classification = 'normal'
+                
+                # パラメータ（prepare_line() で抽出済み）
+                if pattern_info['rule']:
+                    params = prepared['params']
+            
+            # 異常判定を実行（既知ログの場合）
+            anomaly_info = self.anomaly_detector.check_anomaly_values(
+                pattern_id, parsed['message'], params or {}
+            )
+            if anomaly_info:
+                # 異常が検知された場合、classificationを更新
+                classification = anomaly_info['classification']
+                severity = anomaly_info['severity']
+                anomaly_reason = anomaly_info['anomaly_reason']
+        
+        # abnormal または unknown の場合はアラートを生成
+        alert_type = classification if classification in ('abnormal', 'unknown') else None
+        
+        # 新規パターンを作成した行は、次回から既知ログとして分類されるためキャッシュしない
+        if not is_new_pattern:
+            self.outcome_cache.put(cache_key, {
+                'pattern_id': pattern_id,
+                'is_manual': bool(manual_pattern_id),
+                'is_known': is_known,
+                'classification': classification,
+                'severity': severity,
+                'anomaly_reason': anomaly_reason,
+                'params': params,
+                'alert_type': alert_type
+            })
+        
+        # log_entries / log_params / alerts はバッファに溜めてまとめて INSERT
+        self.writer.add(parsed, pattern_id, is_known, classification, severity,
+                        anomaly_reason, params, alert_type)
+        stats['parsed_lines'] += 1
+    
+    def _apply_outcome(self, parsed: Dict, outcome: Dict, stats: Dict):
+        """
+        キャッシュ済みの分類結果で1行を書き込みバッファに追加
+        
+        パターンの出現カウンタ・手動パターンのヒット数は通常の分類と同様に更新する。
+        
+        Args:
+            parsed: パース済みのログ
+            outcome: OutcomeCache に登録した分類結果
+            stats: 統計情報（更新される）
+        """
+        pattern_id = outcome['pattern_id']
+        if pattern_id:
+            if outcome['is_manual']:
+                self.manual_index.record_hit(pattern_id)
+            else:
+                self.pattern_cache.record_hit(pattern_id, datetime.now())
+            stats['existing_patterns'] += 1
+        
+        self.writer.add(parsed, pattern_id, outcome['is_known'], outcome['classification'],
+                        outcome['severity'], outcome['anomaly_reason'], outcome['params'],
+                        outcome['alert_type'])
+        stats['parsed_lines'] += 1
+    
+    def _commit(self, conn, cursor):
+        """
+        バッファ内のログとパターンカウンタを書き込んでコミットし、キャッシュを更新
+        
+        Args:
+            conn: データベース接続
+            cursor: データベースカーソル
+        """
+        self._write(conn, cursor)
+        self._refresh_caches(cursor)
+    
+    def _write(self, conn, cursor):
+        """
+        バッファ内のログとパターンカウンタ・チェックポイントを書き込んでコミット
+        
+        Args:
+            conn: データベース接続
+            cursor: データベースカーソル
+        """
+        self.writer.flush(cursor)
+        self.pattern_cache.flush(cursor)
+        if self._checkpoints:
+            now = datetime.now()
+            cursor.executemany("""
+                INSERT INTO ingest_checkpoints (path, inode, offset, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    inode = excluded.inode,
+                    offset = excluded.offset,
+                    updated_at = excluded.updated_at
+            """, [(path, inode, offset, now) for path, (inode, offset) in self._checkpoints.items()])
+            self._checkpoints.clear()
+        conn.commit()
+    
+    def _refresh_caches(self, cursor):
+        """
+        コミット後、他プロセスでの変更を確認してキャッシュを更新
+        
+        Args:
+            cursor: データベースカーソル
+        """
+        # パターン・ルールが他プロセスで変更されていれば、参照キャッシュと分類結果を破棄
+        # （table_generations の世代番号で判定するため、他プロセスのログ書き込みでは破棄しない）
+        patterns_changed = self.pattern_cache.refresh_if_changed(cursor)
+        rules_changed = self.anomaly_detector.refresh_if_changed(cursor)
+        # 手動パターンが他プロセスで変更されていれば再読み込み
+        if self.manual_index.refresh_if_changed(cursor) or patterns_changed or rules_changed:
+            self.outcome_cache.invalidate()
+        if self.template_tree is not None and self._template_watcher.poll(cursor):
+            self.template_tree.load(cursor)
+    
+    def _rollback(self, conn):
+        """
+        書き込みに失敗したトランザクションをロールバックし、未反映のバッファを破棄
+        
+        ロールバックで取り消されたパターンやテンプレートを参照しないよう、
+        次回の取り込み開始時にキャッシュを読み込み直す。
+        
+        Args:
+            conn: データベース接続
+        """
+        conn.rollback()
+        self.writer.clear()
+        self.pattern_cache.discard()
+        self._checkpoints.clear()
+        self._run_started = False
+    
+    def _print_manual_pattern_stats(self, verbose: bool):
+        """
+        手動パターンのマッチ件数とコンパイルエラーを表示
+        
+        Args:
+            verbose: 詳細出力するかどうか（Trueの場合は全パターンの件数を表示）
+        """
+        hit_counts = self.manual_index.hit_counts
+        print(f"Manual patterns: {len(self.manual_index)} "
+              f"(hits: {sum(hit_counts.values())}, compile errors: {len(self.manual_index.compile_errors)})")
+        
+        ranked = sorted(hit_counts.items(), key=lambda item: item[1], reverse=True)
+        for pattern_id, count in (ranked if verbose else ranked[:10]):
+            print(f"  Pattern {pattern_id}: {count} hits")
+        
+        for pattern_id, error in self.manual_index.compile_errors.items():
+            print(f"Warning: Invalid manual regex (pattern {pattern_id}): {error}", file=sys.stderr)
     
     def _find_or_create_pattern(self, cursor, regex_rule: str, sample_message: str, verbose: bool) -> tuple[Optional[int], bool]:
         """
@@ -212,37 +787,71 @@ class LogIngester:
         """
         return self._get_or_create_pattern(cursor, regex_rule, sample_message, verbose)
     
-    def _check_manual_patterns(self, cursor, message: str) -> Optional[int]:
+    def _find_or_create_template(self, cursor, regex_rule: str, message: str, stats: Dict,
+                                 verbose: bool) -> tuple[Optional[int], bool]:
         """
-        手動パターン（manual_regex_rule）をチェック
-        元のメッセージに対して直接マッチング
+        テンプレートツリーで自動生成パターンを検索または作成
+        
+        類似するテンプレートがあればそのパターンに対応付け、異なるトークンを
+        ワイルドカードにしてテンプレートと regex_rule を一般化する。
+        なければテンプレートとパターンを新規作成する。
         
         Args:
             cursor: データベースカーソル
+            regex_rule: abstract_message() で生成した正規表現（テンプレートを使えない場合に使用）
             message: ログメッセージ
+            stats: 統計情報（更新される）
+            verbose: 詳細出力するかどうか
             
         Returns:
-            マッチしたパターンID。マッチしない場合はNone
+            (pattern_id, is_new_pattern) のタプル
         """
-        import re
+        tokens = template_tokens(message, self.token_types)
+        own_regex = compile_pattern(template_regex(tokens)) if tokens else None
+        if own_regex is None or not own_regex.search(message):
+            # トークン単位の正規表現でメッセージを表せない場合は完全一致で識別
+            return self._get_or_create_pattern(cursor, regex_rule, message, verbose)
         
-        # すべての手動パターンを取得
-        cursor.execute("""
-            SELECT id, manual_regex_rule
-            FROM regex_patterns
-            WHERE manual_regex_rule IS NOT NULL
-        """)
+        template, is_new_template, generalized = self.template_tree.add(tokens)
+        if is_new_template:
+            # 一般化されていないテンプレートの正規表現は regex_rule と同じ形式のため、
+            # 同じ正規表現の既存パターンがあればそれをテンプレートとして引き継ぐ
+            pattern_id, is_new_pattern = self._get_or_create_pattern(cursor, template.regex, message, verbose)
+            template.pattern_id = pattern_id
+            cursor.execute("""
+                INSERT INTO pattern_templates (pattern_id, token_count, template, route)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(pattern_id) DO NOTHING
+            """, (pattern_id, len(template.tokens), template.text, template.route_text))
+            if cursor.rowcount:
+                template.id = cursor.lastrowid
+            return (pattern_id, is_new_pattern)
         
-        for row in cursor.fetchall():
+        if generalized:
+            stats['templates_generalized'] += 1
             try:
-                pattern = re.compile(row['manual_regex_rule'])
-                if pattern.search(message):  # search を使用（部分マッチ）
-                    return row['id']
-            except re.error:
-                # 無効な正規表現はスキップ
-                continue
+                cursor.execute("""
+                    UPDATE regex_patterns
+                    SET regex_rule = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND regex_rule IS NOT NULL
+                """, (template.regex, template.pattern_id))
+            except sqlite3.IntegrityError:
+                # 同じ正規表現のパターンが既にある場合は regex_rule を変更しない
+                pass
+            if template.id is not None:
+                # 振り分けに使ったトークンがワイルドカードになっても、読み込み直した際に同じ葉に入るよう
+                # 現在の振り分けキーも保存する
+                cursor.execute("""
+                    UPDATE pattern_templates
+                    SET template = ?, route = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, (template.text, template.route_text, template.id))
+            if verbose:
+                print(f"Template generalized: ID={template.pattern_id}, template={template.text[:50]}...",
+                      file=sys.stderr)
         
-        return None
+        self.pattern_cache.record_hit(template.pattern_id, datetime.now())
+        return (template.pattern_id, False)
     
     def _get_or_create_pattern(self, cursor, regex_rule: str, sample_message: str, verbose: bool) -> tuple[Optional[int], bool]:
         """
@@ -260,27 +869,14 @@ class LogIngester:
             - is_new_pattern: 新規作成された場合True
         """
         # 既存パターンを検索（regex_rule または manual_regex_rule の両方をチェック）
-        cursor.execute("""
-            SELECT id, total_count
-            FROM regex_patterns
-            WHERE regex_rule = ? OR manual_regex_rule = ?
-        """, (regex_rule, regex_rule))
-        
-        row = cursor.fetchone()
+        # キャッシュ済みならDBは参照しない
+        pattern_info = self.pattern_cache.get_by_rule(cursor, regex_rule)
         now = datetime.now()
         
-        if row:
-            # 既存パターン: カウントと最終観測時刻を更新
-            pattern_id = row['id']
-            new_count = row['total_count'] + 1
-            cursor.execute("""
-                UPDATE regex_patterns
-                SET last_seen_at = ?,
-                    total_count = ?,
-                    updated_at = ?
-                WHERE id = ?
-            """, (now, new_count, now, pattern_id))
-            return (pattern_id, False)
+        if pattern_info:
+            # 既存パターン: カウントと最終観測時刻はコミット時にまとめて更新
+            self.pattern_cache.record_hit(pattern_info['id'], now)
+            return (pattern_info['id'], False)
         
         # 新規パターン: 作成（自動生成なので regex_rule に格納、manual_regex_rule は NULL）
         # デフォルトは 'normal'（見たことがないログは後で 'unknown' に変更可能）
@@ -291,66 +887,62 @@ class LogIngester:
         """, (regex_rule, sample_message, now, now))
         
         pattern_id = cursor.lastrowid
+        self.pattern_cache.add(pattern_id, regex_rule, 'normal', None)
         if verbose:
             print(f"New pattern created: ID={pattern_id}, regex={regex_rule[:50]}...", file=sys.stderr)
         
         return (pattern_id, True)
-    
-    def _extract_and_save_params(self, cursor, log_id: int, regex_rule: str, message: str):
-        """
-        パラメータを抽出してlog_paramsテーブルに保存
-        
-        Args:
-            cursor: データベースカーソル
-            log_id: ログエントリのID
-            regex_rule: 正規表現パターン
-            message: ログメッセージ
-        """
-        params = self.param_extractor.extract_params(regex_rule, message)
-        
-        if not params:
-            return
-        
-        for param_name, param_data in params.items():
-            cursor.execute("""
-                INSERT INTO log_params
-                (log_id, param_name, param_value_num, param_value_text)
-                VALUES (?, ?, ?, ?)
-            """, (log_id, param_name, param_data['num'], param_data['text']))
-    
-    def _create_alert(self, cursor, log_id: int, alert_type: str, parsed: Dict):
-        """
-        アラートレコードを作成
-        
-        Args:
-            cursor: データベースカーソル
-            log_id: ログエントリのID
-            alert_type: アラートタイプ（'abnormal' または 'unknown'）
-            parsed: パース済みログ情報
-        """
-        cursor.execute("""
-            INSERT INTO alerts
-            (log_id, alert_type, channel, status)
-            VALUES (?, ?, 'slack', 'pending')
-        """, (log_id, alert_type))
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    """シグナルを KeyboardInterrupt に変換する"""
+    raise KeyboardInterrupt
 
 
 def main():
     """コマンドラインエントリーポイント"""
     import argparse
     
-    parser = argparse.ArgumentParser(description='Ingest log file into database')
-    parser.add_argument('file_path', help='Path to log file')
+    parser = argparse.ArgumentParser(description='Ingest log files into database')
+    parser.add_argument('file_paths', nargs='+', help='Log files or directories containing log files')
     parser.add_argument('--db', default='db/monitor.db', help='Database path')
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Number of log entries written per executemany batch / commit')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='Worker processes for parsing/pattern generation (0 = number of CPUs)')
+    parser.add_argument('--follow', action='store_true',
+                        help='Tail the files and keep ingesting appended lines (resumes from saved offsets)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Ingest from the saved offsets up to the current end of file, then exit')
+    parser.add_argument('--poll-interval', type=float, default=1.0,
+                        help='Seconds to wait between polls in --follow mode')
+    parser.add_argument('--outcome-cache-size', type=int, default=100000,
+                        help='Max (component, message) classification results to cache (0 = disable)')
+    parser.add_argument('--template-tree', action='store_true',
+                        help='Group auto patterns with a Drain-style template tree instead of exact regex_rule')
+    parser.add_argument('--template-similarity', type=float, default=0.6,
+                        help='Token similarity (0-1) needed to merge a message into a template')
+    parser.add_argument('--typed-tokens', type=parse_token_types, metavar='TYPES',
+                        help='Abstract typed tokens when generating auto patterns: comma-separated list of '
+                             'uuid, mac, pci, size, hex, or "all"')
     
     args = parser.parse_args()
     
     db = Database(args.db)
-    ingester = LogIngester(db)
+    template_tree = TemplateTree(similarity=args.template_similarity) if args.template_tree else None
+    ingester = LogIngester(db, batch_size=args.batch_size, outcome_cache_size=args.outcome_cache_size,
+                           template_tree=template_tree, token_types=args.typed_tokens)
     
     try:
-        ingester.ingest_file(args.file_path, verbose=args.verbose)
+        if args.follow or args.resume:
+            # SIGTERM でも KeyboardInterrupt と同様にコミットしてから終了する
+            signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+            ingester.follow_files(iter_log_files(args.file_paths), poll_interval=args.poll_interval,
+                                  once=args.resume, verbose=args.verbose)
+        else:
+            workers = args.workers or os.cpu_count() or 1
+            ingester.ingest_files(iter_log_files(args.file_paths), workers=workers, verbose=args.verbose)
     finally:
         db.close()
 
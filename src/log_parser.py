@@ -20,6 +20,9 @@ class LogParser:
         r'(.*)$'                                       # メッセージ本体
     )
     
+    # パース済みタイムスタンプの保持件数（秒単位のため同じ文字列が連続する）
+    TIMESTAMP_CACHE_SIZE = 4096
+    
     def __init__(self, default_year: Optional[int] = None):
         """
         Args:
@@ -30,6 +33,7 @@ class LogParser:
         if default_year is None:
             default_year = datetime.now().year
         self.default_year = default_year
+        self._timestamps: Dict[str, datetime] = {}
     
     def parse_line(self, line: str) -> Dict[str, any]:
         """
@@ -72,7 +76,14 @@ class LogParser:
         ts_str, host, component, message = match.groups()
         
         # 日時をパース（年を補完）
-        ts = self._parse_timestamp(ts_str)
+        # 同じ秒の行は多いため、パース結果を文字列単位で使い回す（datetime は不変）
+        ts = self._timestamps.get(ts_str)
+        if ts is None:
+            ts = self._parse_timestamp(ts_str)
+            if ts is not None:
+                if len(self._timestamps) >= self.TIMESTAMP_CACHE_SIZE:
+                    self._timestamps.clear()
+                self._timestamps[ts_str] = ts
         if ts is None:
             ts = datetime.now()
         
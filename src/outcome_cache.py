@@ -0,0 +1,67 @@
+"""
+分類結果キャッシュ: 同一メッセージの分類結果（パターン・ラベル・パラメータ・異常判定）を再利用する
+"""
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+
+class OutcomeCache:
+    """
+    (component, message) をキーに分類結果を保持する LRU キャッシュ
+
+    同一構成のノードから届くブートログは同じメッセージが大量に繰り返されるため、
+    パターン生成・手動パターン照合・パターン検索・パラメータ抽出・異常判定の結果を
+    まとめて保持し、2回目以降は辞書の参照だけで分類する。
+
+    パターンや異常判定ルールが変更された場合は invalidate() で全て破棄すること。
+    """
+
+    def __init__(self, max_size: int = 100000):
+        """
+        Args:
+            max_size: 保持する最大件数（0の場合はキャッシュしない）
+        """
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        """
+        キャッシュ済みの分類結果を取得
+
+        Args:
+            key: (component, message) のタプル
+
+        Returns:
+            分類結果の辞書。キャッシュにない場合はNone
+        """
+        outcome = self._entries.get(key)
+        if outcome is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return outcome
+
+    def put(self, key: Hashable, outcome: Dict):
+        """
+        分類結果を登録（上限を超えた場合は最も古く使われたものを破棄）
+
+        Args:
+            key: (component, message) のタプル
+            outcome: 分類結果の辞書
+        """
+        if self.max_size <= 0:
+            return
+        self._entries[key] = outcome
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """全ての分類結果を破棄（ヒット率の集計は保持する）"""
+        self._entries.clear()
@@ -1,8 +1,151 @@
 """
 パラメータ抽出: 正規表現パターンからnamed capture groupを抽出
+
+数値のパラメータは単位の表（UNITS）で正規化した値と単位も求める
+（"16M" と "16384K"、"126.024 Gb/s" と "126024 Mb/s" を同じ尺度で比較できるようにする）。
 """
 import re
-from typing import Dict, Optional, List
+from collections import OrderedDict
+from typing import Dict, Optional, List, Pattern, Tuple
+
+
+# named capture group: (?P<name>...)
+_NAMED_GROUP_RE = re.compile(r'\(\?P<([^>]+)>')
+
+# パラメータ値の先頭の数値部分（例: "16M" -> 16, "85.5" -> 85.5）
+_NUMERIC_PREFIX_RE = re.compile(r'[+-]?\d+\.?\d*')
+
+
+# named capture group の直後の単位らしきトークン（例: "31.504 Gb/s" の "Gb/s"、"16384K/..." の "K"）
+_UNIT_AFTER_RE = re.compile(r'[ \t]*([A-Za-zµ]+(?:/[A-Za-z]+)?)(?![A-Za-z0-9])')
+
+
+def _build_units() -> Dict[str, Tuple[str, float]]:
+    """
+    単位の表（表記 -> (正規化後の単位, 係数)）を作成
+
+    - SI 接頭辞（k, M, G, T, P）は 1000 の累乗、IEC 接頭辞（Ki, Mi, Gi, Ti, Pi）は 1024 の累乗
+    - カーネルログのメモリサイズ表記（"16M" / "16384K" のような接頭辞のみ）は IEC のバイト数とみなす
+    - 正規化後の単位は B（バイト）・b/s・B/s・T/s（転送レート）・Hz・s
+    """
+    si = {'k': 1e3, 'K': 1e3, 'M': 1e6, 'G': 1e9, 'T': 1e12, 'P': 1e15}
+    iec = {'Ki': 2 ** 10, 'Mi': 2 ** 20, 'Gi': 2 ** 30, 'Ti': 2 ** 40, 'Pi': 2 ** 50}
+
+    units = {'B': ('B', 1.0), 'b/s': ('b/s', 1.0), 'bps': ('b/s', 1.0), 'B/s': ('B/s', 1.0),
+             'T/s': ('T/s', 1.0), 'Hz': ('Hz', 1.0)}
+    for prefix, factor in si.items():
+        units[f'{prefix}B'] = ('B', factor)
+        units[f'{prefix}b/s'] = ('b/s', factor)
+        units[f'{prefix}bps'] = ('b/s', factor)
+        units[f'{prefix}bit/s'] = ('b/s', factor)
+        units[f'{prefix}B/s'] = ('B/s', factor)
+        units[f'{prefix}T/s'] = ('T/s', factor)
+        units[f'{prefix}Hz'] = ('Hz', factor)
+    for prefix, factor in iec.items():
+        units[f'{prefix}B'] = ('B', float(factor))
+        units[f'{prefix}B/s'] = ('B/s', float(factor))
+        # 接頭辞のみの表記（"16M"）はメモリサイズ
+        units[prefix[0]] = ('B', float(factor))
+
+    for name, factor in (('s', 1.0), ('sec', 1.0), ('secs', 1.0),
+                         ('ms', 1e-3), ('msec', 1e-3), ('msecs', 1e-3),
+                         ('us', 1e-6), ('µs', 1e-6), ('usec', 1e-6), ('usecs', 1e-6),
+                         ('ns', 1e-9), ('nsec', 1e-9), ('nsecs', 1e-9)):
+        units[name] = ('s', factor)
+    return units
+
+
+# 単位の表記 -> (正規化後の単位, 係数)
+UNITS: Dict[str, Tuple[str, float]] = _build_units()
+
+
+def parse_quantity(text: str) -> Tuple[Optional[float], Optional[str]]:
+    """
+    パラメータ値を先頭の数値部分と残りの部分（単位の表記）に分割
+
+    Args:
+        text: パラメータ値（例: "16M", "126.024 Gb/s", "85.5"）
+
+    Returns:
+        (数値, 単位の表記) のタプル。数値で始まらない場合は (None, None)、
+        単位の表記がない場合は (数値, None)
+    """
+    num_match = _NUMERIC_PREFIX_RE.match(text)
+    if not num_match:
+        return (None, None)
+    unit = text[num_match.end():].strip()
+    return (float(num_match.group()), unit or None)
+
+
+def normalize_value(num: Optional[float], unit: Optional[str]) -> Tuple[Optional[float], Optional[str]]:
+    """
+    数値を UNITS の表で正規化後の単位の値に換算
+
+    Args:
+        num: 数値（parse_quantity() の戻り値）
+        unit: 単位の表記
+
+    Returns:
+        (正規化後の数値, 正規化後の単位) のタプル。
+        単位がない・表にない場合は (num, None)、num が None の場合は (None, None)
+    """
+    if num is None:
+        return (None, None)
+    canonical = UNITS.get(unit) if unit else None
+    if canonical is None:
+        return (num, None)
+    return (num * canonical[1], canonical[0])
+
+
+def normalize_many(nums: List[Optional[float]],
+                   units: List[Optional[str]]) -> Tuple[List[Optional[float]], List[Optional[str]]]:
+    """
+    normalize_value() を複数の値にまとめて適用
+
+    単位の表は単位の表記の種類ごとに1回だけ引き、換算は NumPy があればベクトル演算で行う
+    （log_params の既存行の再正規化など、大量の値をまとめて換算する場合に使用）。
+
+    Args:
+        nums: 数値のリスト（None を含んでよい）
+        units: 値ごとの単位の表記のリスト
+
+    Returns:
+        (正規化後の数値のリスト, 正規化後の単位のリスト) のタプル
+    """
+    lookup = {unit: UNITS.get(unit) if unit else None for unit in set(units)}
+    canonical_units = [None if num is None or lookup[unit] is None else lookup[unit][0]
+                       for num, unit in zip(nums, units)]
+    factors = [1.0 if lookup[unit] is None else lookup[unit][1] for unit in units]
+    try:
+        import numpy as np
+    except ImportError:
+        return ([None if num is None else num * factor for num, factor in zip(nums, factors)],
+                canonical_units)
+
+    values = np.array(nums, dtype=np.float64) * np.array(factors, dtype=np.float64)
+    return ([None if num is None else value for num, value in zip(nums, values.tolist())],
+            canonical_units)
+
+
+def _raw_value(match: re.Match, name: str) -> Optional[Tuple]:
+    r"""
+    named capture group の値を (数値, 文字列, 単位の表記) に分割
+
+    グループが数値だけを捕捉している場合（"(?P<bw>\d+\.?\d*)\s+Gb/s" など）は、
+    メッセージ中のグループ直後のトークンを単位の表記とする。
+
+    Returns:
+        グループがマッチしなかった場合はNone
+    """
+    text = match.group(name)
+    if text is None:
+        return None
+    num, unit = parse_quantity(text)
+    if num is not None and unit is None:
+        unit_match = _UNIT_AFTER_RE.match(match.string, match.end(name))
+        if unit_match:
+            unit = unit_match.group(1)
+    return (num, text, unit)
 
 
 def has_named_capture_groups(regex_rule: str) -> bool:
@@ -18,13 +161,7 @@ def has_named_capture_groups(regex_rule: str) -> bool:
     if not regex_rule:
         return False
     
-    try:
-        # named capture groupのパターン: (?P<name>...)
-        # Pythonの正規表現でnamed capture groupを検出
-        pattern = re.compile(r'\(\?P<[^>]+>')
-        return bool(pattern.search(regex_rule))
-    except re.error:
-        return False
+    return bool(_NAMED_GROUP_RE.search(regex_rule))
 
 
 def get_named_capture_group_names(regex_rule: str) -> List[str]:
@@ -40,19 +177,137 @@ def get_named_capture_group_names(regex_rule: str) -> List[str]:
     if not regex_rule:
         return []
     
-    names = []
-    try:
-        # named capture groupのパターン: (?P<name>...)
-        pattern = re.compile(r'\(\?P<([^>]+)>')
-        matches = pattern.findall(regex_rule)
-        return matches
-    except re.error:
-        return []
+    return _NAMED_GROUP_RE.findall(regex_rule)
 
 
 class ParamExtractor:
-    """ログメッセージからパラメータを抽出するクラス"""
-    
+    """
+    ログメッセージからパラメータを抽出するクラス
+
+    正規表現は (パターン, named capture group の並び) としてインスタンス内の LRU キャッシュに
+    保持し、同じパターンをメッセージごとにコンパイルし直さない。
+    named capture group を持たないパターン（自動生成パターンの大半）は照合せずに空の結果を返す。
+    """
+
+    def __init__(self, cache_size: int = 65536):
+        """
+        Args:
+            cache_size: コンパイル済みの正規表現を保持する最大件数
+        """
+        self.cache_size = cache_size
+        self._compiled: OrderedDict = OrderedDict()
+
+    def compile(self, regex_rule: str) -> Tuple[Optional[Pattern], Dict[str, int]]:
+        """
+        正規表現をコンパイル（キャッシュ済みならそれを返す）
+
+        Args:
+            regex_rule: 正規表現パターン
+
+        Returns:
+            (コンパイル済みパターン, パラメータ名 -> 値のタプル内の位置) のタプル。
+            無効な正規表現・named capture group を含まない場合は (None, {})
+        """
+        entry = self._compiled.get(regex_rule)
+        if entry is not None:
+            self._compiled.move_to_end(regex_rule)
+            return entry
+
+        if '(?P<' not in regex_rule:
+            # パラメータを持たないパターン（自動生成パターンの大半）はコンパイルしても照合しない
+            entry = (None, {})
+        else:
+            try:
+                pattern = re.compile(regex_rule)
+            except re.error:
+                # 無効な正規表現もキャッシュし、メッセージごとにコンパイルを試みない
+                entry = (None, {})
+            else:
+                names = sorted(pattern.groupindex, key=pattern.groupindex.get)
+                entry = (pattern, {name: index for index, name in enumerate(names)})
+
+        self._compiled[regex_rule] = entry
+        if len(self._compiled) > self.cache_size:
+            self._compiled.popitem(last=False)
+        return entry
+
+    def layout(self, regex_rule: str) -> Dict[str, int]:
+        """
+        extract_many() が返す値のタプルの並び
+
+        Args:
+            regex_rule: 正規表現パターン
+
+        Returns:
+            パラメータ名 -> 値のタプル内の位置（named capture group の出現順）
+        """
+        return self.compile(regex_rule)[1]
+
+    def extract_many(self, regex_rule: str,
+                     messages: List[str]) -> Tuple[Dict[str, int], List[Optional[Tuple]]]:
+        """
+        同じパターンで複数のメッセージからパラメータを抽出
+
+        パターンのコンパイルは1回だけ行い、同じメッセージはバッチ内で1回だけ照合する。
+        単位の正規化はバッチ全体で normalize_many() にまとめて渡す。
+        メッセージごとの結果は辞書ではなく layout の並びのタプルで返す。
+
+        Args:
+            regex_rule: 正規表現パターン
+            messages: ログメッセージのリスト
+
+        Returns:
+            (layout, 値のリスト) のタプル。
+            layout はパラメータ名 -> タプル内の位置、値はメッセージごとに
+            (num, text, norm, unit) または None（グループがマッチしなかった場合）のタプル。
+            パターンにマッチしない・パラメータがない場合は None
+        """
+        pattern, layout = self.compile(regex_rule)
+        if pattern is None or not layout:
+            return layout, [None] * len(messages)
+
+        extracted: Dict[str, Optional[list]] = {}
+        for message in messages:
+            if message in extracted:
+                continue
+            # searchを使用（部分マッチを許可）- メッセージの後ろに追加テキストがある場合に対応
+            match = pattern.search(message)
+            extracted[message] = [_raw_value(match, name) for name in layout] if match else None
+
+        raw_values = [value for values in extracted.values() if values
+                      for value in values if value is not None]
+        norms, units = normalize_many([value[0] for value in raw_values],
+                                      [value[2] for value in raw_values])
+        normalized = iter(zip(norms, units))
+        for message, values in extracted.items():
+            if values is not None:
+                extracted[message] = tuple(
+                    None if value is None else value[:2] + next(normalized)
+                    for value in values
+                )
+        return layout, [extracted[message] for message in messages]
+
+    @staticmethod
+    def to_params(layout: Dict[str, int], values: Optional[Tuple]) -> Dict[str, any]:
+        """
+        extract_many() の値のタプルを extract_params() と同じ形式の辞書に変換
+
+        Args:
+            layout: パラメータ名 -> タプル内の位置
+            values: extract_many() のメッセージごとの値
+
+        Returns:
+            パラメータ名 -> {'num', 'text', 'norm', 'unit'} の辞書
+        """
+        if values is None:
+            return {}
+        params = {}
+        for param_name, index in layout.items():
+            value = values[index]
+            if value is not None:
+                params[param_name] = {'num': value[0], 'text': value[1], 'norm': value[2], 'unit': value[3]}
+        return params
+
     def extract_params(self, regex_rule: str, message: str) -> Dict[str, any]:
         """
         正規表現パターンとメッセージからパラメータを抽出
@@ -63,46 +318,25 @@ class ParamExtractor:
             
         Returns:
             パラメータ名 -> 値の辞書。パラメータがない場合は空辞書
+            （値は {'num': 先頭の数値部分 or None, 'text': 文字列,
+                    'norm': 正規化後の数値 or None, 'unit': 正規化後の単位 or None}）
         """
+        pattern, layout = self.compile(regex_rule)
+        if pattern is None or not layout:
+            return {}
+
+        # searchを使用（部分マッチを許可）- メッセージの後ろに追加テキストがある場合に対応
+        match = pattern.search(message)
+        if not match:
+            return {}
+
         params = {}
-        
-        try:
-            # 正規表現をコンパイル
-            pattern = re.compile(regex_rule)
-            # searchを使用（部分マッチを許可）- メッセージの後ろに追加テキストがある場合に対応
-            match = pattern.search(message)
-            
-            if match:
-                # named capture groupを取得
-                groups = match.groupdict()
-                
-                for param_name, param_value in groups.items():
-                    if param_value is not None:
-                        # 数値に変換可能かチェック
-                        param_value_num = None
-                        param_value_text = str(param_value)
-                        
-                        try:
-                            # 数値として解釈を試みる
-                            if isinstance(param_value, (int, float)):
-                                param_value_num = float(param_value)
-                            else:
-                                # 文字列から数値を抽出（例: "16M" -> 16, "85.5" -> 85.5）
-                                # 先頭の数値部分を抽出
-                                num_match = re.match(r'^([+-]?\d+\.?\d*)', str(param_value))
-                                if num_match:
-                                    param_value_num = float(num_match.group(1))
-                        except (ValueError, TypeError):
-                            pass
-                        
-                        params[param_name] = {
-                            'num': param_value_num,
-                            'text': param_value_text
-                        }
-        except re.error:
-            # 無効な正規表現の場合は空辞書を返す
-            pass
-        
+        for param_name in layout:
+            value = _raw_value(match, param_name)
+            if value is not None:
+                num, text, unit = value
+                norm, canonical_unit = normalize_value(num, unit)
+                params[param_name] = {'num': num, 'text': text, 'norm': norm, 'unit': canonical_unit}
         return params
     
     def extract_params_from_named_groups(self, regex_rule: str, message: str) -> Dict[str, any]:
@@ -0,0 +1,198 @@
+"""
+パターンキャッシュ: regex_patterns の参照結果をプロセス内に保持し、
+total_count / last_seen_at の更新をまとめて書き込む
+"""
+from datetime import datetime
+from typing import Dict, Optional
+
+from src.database import TableWatcher
+
+
+class PatternCache:
+    """
+    regex_patterns の参照キャッシュと出現カウンタの書き込みバッファ
+
+    - regex_rule（または同一文字列の manual_regex_rule）をキーに
+      id / label / severity / 実際に使用する正規表現（rule）を保持する
+    - 出現回数と最終観測時刻の差分はメモリ上に溜め、flush() で一括 UPDATE する
+    """
+
+    def __init__(self):
+        # regex_rule -> パターン情報
+        self._by_rule: Dict[str, Dict] = {}
+        # パターンID -> パターン情報
+        self._by_id: Dict[int, Dict] = {}
+        # パターンID -> [カウント差分, 最終観測時刻]
+        self._pending: Dict[int, list] = {}
+        self._watcher = TableWatcher(('regex_patterns', 'pattern_id_remap'))
+
+    @staticmethod
+    def _to_info(row) -> Dict:
+        """データベース行をパターン情報の辞書に変換"""
+        return {
+            'id': row['id'],
+            'label': row['label'],
+            'severity': row['severity'],
+            # manual_regex_rule があればそれを使用、なければ regex_rule を使用
+            'rule': row['manual_regex_rule'] or row['regex_rule'],
+        }
+
+    def _store(self, info: Dict, regex_rule: Optional[str] = None) -> Dict:
+        self._by_id[info['id']] = info
+        if regex_rule is not None:
+            self._by_rule[regex_rule] = info
+        return info
+
+    def get_by_rule(self, cursor, regex_rule: str) -> Optional[Dict]:
+        """
+        regex_rule に一致するパターンを取得（キャッシュにない場合のみDBを参照）
+
+        Args:
+            cursor: データベースカーソル
+            regex_rule: 正規表現パターン（自動生成）
+
+        Returns:
+            パターン情報の辞書（統合済みのパターンの場合は統合先）。存在しない場合はNone
+        """
+        info = self._by_rule.get(regex_rule)
+        if info is not None:
+            return info
+
+        # regex_rule と manual_regex_rule の両方をチェック
+        cursor.execute("""
+            SELECT id, regex_rule, manual_regex_rule, label, severity
+            FROM regex_patterns
+            WHERE regex_rule = ? OR manual_regex_rule = ?
+        """, (regex_rule, regex_rule))
+        row = cursor.fetchone()
+        if not row:
+            # merge-patterns で統合されたパターンの regex_rule なら統合先を返す
+            cursor.execute("""
+                SELECT p.id, p.regex_rule, p.manual_regex_rule, p.label, p.severity
+                FROM pattern_id_remap m
+                JOIN regex_patterns p ON p.id = m.new_pattern_id
+                WHERE m.old_regex_rule = ?
+            """, (regex_rule,))
+            row = cursor.fetchone()
+        if not row:
+            return None
+        return self._store(self._to_info(row), regex_rule)
+
+    def get_by_id(self, cursor, pattern_id: int) -> Optional[Dict]:
+        """
+        パターンIDに対応するパターン情報を取得（キャッシュにない場合のみDBを参照）
+
+        Args:
+            cursor: データベースカーソル
+            pattern_id: パターンID
+
+        Returns:
+            パターン情報の辞書。存在しない場合はNone
+        """
+        info = self._by_id.get(pattern_id)
+        if info is not None:
+            return info
+
+        cursor.execute("""
+            SELECT id, regex_rule, manual_regex_rule, label, severity
+            FROM regex_patterns
+            WHERE id = ?
+        """, (pattern_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        return self._store(self._to_info(row))
+
+    def add(self, pattern_id: int, regex_rule: str, label: str, severity: Optional[str]) -> Dict:
+        """
+        新規作成した自動生成パターンをキャッシュに登録
+
+        Args:
+            pattern_id: パターンID
+            regex_rule: 正規表現パターン
+            label: ラベル
+            severity: 重要度
+
+        Returns:
+            登録したパターン情報
+        """
+        info = {'id': pattern_id, 'label': label, 'severity': severity, 'rule': regex_rule}
+        return self._store(info, regex_rule)
+
+    def record_hit(self, pattern_id: int, seen_at: Optional[datetime] = None):
+        """
+        パターンの出現を記録（DBへの反映は flush() 時）
+
+        Args:
+            pattern_id: パターンID
+            seen_at: 観測時刻（省略時は現在時刻）
+        """
+        if seen_at is None:
+            seen_at = datetime.now()
+        pending = self._pending.get(pattern_id)
+        if pending is None:
+            self._pending[pattern_id] = [1, seen_at]
+        else:
+            pending[0] += 1
+            pending[1] = seen_at
+
+    def flush(self, cursor) -> int:
+        """
+        溜めておいた出現カウンタを一括で UPDATE する（コミット直前に呼ぶ）
+
+        updated_at は他の UPDATE・列の既定値と同じく CURRENT_TIMESTAMP（UTC）で記録する。
+
+        Args:
+            cursor: データベースカーソル
+
+        Returns:
+            更新したパターン数
+        """
+        if not self._pending:
+            return 0
+        cursor.executemany("""
+            UPDATE regex_patterns
+            SET last_seen_at = ?,
+                total_count = total_count + ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, [
+            (seen_at, count, pattern_id)
+            for pattern_id, (count, seen_at) in self._pending.items()
+        ])
+        updated = len(self._pending)
+        self._pending.clear()
+        return updated
+
+    def invalidate(self):
+        """参照キャッシュを破棄（未反映のカウンタは保持する）"""
+        self._by_rule.clear()
+        self._by_id.clear()
+
+    def discard(self):
+        """
+        ロールバック時に参照キャッシュと未反映のカウンタを破棄
+
+        ロールバックされたトランザクション内で作成したパターンを参照しないよう、
+        参照キャッシュも合わせて破棄する。
+        """
+        self.invalidate()
+        self._pending.clear()
+
+    def refresh_if_changed(self, cursor) -> bool:
+        """
+        他の接続が regex_patterns / pattern_id_remap を変更していれば参照キャッシュを破棄
+
+        TableWatcher で検知するため、他の接続によるログの書き込みや出現カウンタの更新、
+        自プロセスの書き込みでは無効化されない。
+
+        Args:
+            cursor: データベースカーソル
+
+        Returns:
+            キャッシュを破棄した場合True
+        """
+        changed = self._watcher.poll(cursor)
+        if changed:
+            self.invalidate()
+        return changed
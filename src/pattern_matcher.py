@@ -1,74 +1,354 @@
 """
 パターンマッチング: 既知/未知判定とパラメータ抽出
+
+ManualPatternIndex はDBに依存しないコンパイル済みのインデックス（ワーカープロセスでも使用）、
+PatternMatcher は regex_patterns から読み込み、変更時に自動で再読み込みする照合エンジン。
+ingest.py・reprocess-pattern(s)・scripts/filter_unknown_logs.py は PatternMatcher で照合する。
 """
 import re
 import sys
 import os
-from typing import Optional, Dict, List, Tuple
+import time
+from functools import lru_cache
+from typing import Optional, Dict, List, Tuple, Iterable
 
 # パスを追加してモジュールをインポート可能にする
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.database import Database
+from src.database import Database, TableWatcher
+from src.regex_literals import AhoCorasick, required_literals
+from src.param_extractor import parse_quantity, normalize_value
 
 
-class PatternMatcher:
-    """ログパターンマッチングを実行するクラス"""
-    
-    def __init__(self, db: Database):
+@lru_cache(maxsize=65536)
+def _compile(rule: str) -> re.Pattern:
+    """
+    正規表現をコンパイル（同じ文字列は再読み込み・再構築のたびにコンパイルし直さない）
+
+    re.compile() 自体のキャッシュは数百件で溢れるため、パターン数が多い場合に備えて保持する。
+    コンパイルエラー（re.error）はキャッシュされない。
+    """
+    return re.compile(rule)
+
+
+class ManualPatternIndex:
+    """
+    パターン（正規表現）をコンパイル済みで保持するインデックス
+
+    データベースには依存せず、(パターンID, 正規表現, コンポーネント) のリストから構築する。
+    データベースからの読み込みと変更時の再読み込みは PatternMatcher が行い、
+    ワーカープロセスでは PatternMatcher.rows() のスナップショットから同じインデックスを再構築する。
+
+    パターン数が PREFILTER_MIN_PATTERNS 以上の場合は、各パターンの必須リテラル
+    （マッチする文字列に必ず含まれる部分文字列）を AhoCorasick で索引化し、
+    リテラルがメッセージに出現したパターンと必須リテラルを持たないパターンだけを
+    ID順に試す。マッチしえないパターンを飛ばすだけなので、結果は全件を試す場合と同じ。
+
+    component が設定されたパターンは、そのコンポーネントのログにだけ試す
+    （component が NULL のパターンは全コンポーネント対象）。
+    """
+
+    # これより少ないパターン数では全件を順に試す方が速い
+    PREFILTER_MIN_PATTERNS = 32
+
+    def __init__(self):
+        self._patterns: List[Tuple[int, re.Pattern]] = []
+        self._rules: Dict[int, str] = {}
+        # パターンID -> コンポーネント（全コンポーネント対象のパターンは含めない）
+        self._components: Dict[int, str] = {}
+        # コンポーネント -> 試す _patterns のインデックス（ID順、全コンポーネント対象のパターンを含む）
+        self._scoped: Dict[str, List[int]] = {}
+        self._global: List[int] = []
+        # 必須リテラルの索引（値は _patterns のインデックス）と、必須リテラルを持たないパターン
+        self._automaton: Optional[AhoCorasick] = None
+        self._always_try: frozenset = frozenset()
+        # パターンID -> マッチ件数
+        self.hit_counts: Dict[int, int] = {}
+        # パターンID -> コンパイルエラーメッセージ
+        self.compile_errors: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def build(self, rows: List[Tuple]):
+        """
+        (パターンID, 正規表現, コンポーネント) のリストからインデックスを構築
+
+        DBに接続できないワーカープロセスでも、rows() のスナップショットから
+        同じインデックスを再構築できる。
+
+        Args:
+            rows: (パターンID, manual_regex_rule, component) のリスト（ID順）。
+                  component を省略した (パターンID, manual_regex_rule) は全コンポーネント対象
+        """
+        patterns = []
+        rules = {}
+        components = {}
+        compile_errors = {}
+        for row in rows:
+            pattern_id, rule = row[0], row[1]
+            try:
+                patterns.append((pattern_id, _compile(rule)))
+                rules[pattern_id] = rule
+                if len(row) > 2 and row[2] is not None:
+                    components[pattern_id] = row[2]
+            except re.error as e:
+                # 無効な正規表現はスキップし、エラーとして記録
+                compile_errors[pattern_id] = str(e)
+
+        self._patterns = patterns
+        self._rules = rules
+        self._components = components
+        self.compile_errors = compile_errors
+
+        # コンポーネントごとに試すパターン（ID順を保つ）
+        self._global = [index for index, (pattern_id, _) in enumerate(patterns)
+                        if pattern_id not in components]
+        self._scoped = {}
+        for index, (pattern_id, _) in enumerate(patterns):
+            if pattern_id in components:
+                self._scoped.setdefault(components[pattern_id], []).append(index)
+        for component, indices in self._scoped.items():
+            self._scoped[component] = sorted(self._global + indices)
+        self._build_prefilter()
+
+    def _build_prefilter(self):
+        """必須リテラルの索引を構築（パターン数が少ない場合は構築しない）"""
+        self._automaton = None
+        self._always_try = frozenset()
+        if len(self._patterns) < self.PREFILTER_MIN_PATTERNS:
+            return
+
+        literals = []
+        always_try = set()
+        for index, (pattern_id, _regex) in enumerate(self._patterns):
+            pattern_literals = required_literals(self._rules[pattern_id])
+            if pattern_literals:
+                # 最も長いリテラル（出現しにくく、絞り込み効果が大きい）を使用
+                literals.append((pattern_literals[0], index))
+            else:
+                always_try.add(index)
+        self._automaton = AhoCorasick(literals)
+        self._always_try = frozenset(always_try)
+
+    def rows(self) -> List[Tuple[int, str, Optional[str]]]:
+        """コンパイルに成功したパターンの (パターンID, 正規表現, コンポーネント) のリストを返す"""
+        return [(pattern_id, self._rules[pattern_id], self._components.get(pattern_id))
+                for pattern_id, _ in self._patterns]
+
+    def rule_of(self, pattern_id: int) -> Optional[str]:
+        """パターンIDに対応する正規表現文字列を返す"""
+        return self._rules.get(pattern_id)
+
+    def search(self, message: str, component: Optional[str] = None) -> Optional[Tuple[int, re.Match]]:
         """
+        メッセージに最初にマッチしたパターンのIDとマッチ結果を返す（ID順で先勝ち）
+
+        Args:
+            message: ログメッセージ
+            component: ログのコンポーネント（Noneの場合は全コンポーネント対象のパターンのみ試す）
+
+        Returns:
+            (パターンID, re.Match) のタプル。マッチしない場合はNone
+        """
+        patterns = self._patterns
+        if self._automaton is None:
+            if not self._components:
+                for pattern_id, regex in patterns:
+                    match = regex.search(message)  # search を使用（部分マッチ）
+                    if match:
+                        return (pattern_id, match)
+                return None
+            for index in self._scoped.get(component, self._global):
+                pattern_id, regex = patterns[index]
+                match = regex.search(message)
+                if match:
+                    return (pattern_id, match)
+            return None
+
+        components = self._components
+        for index in sorted(self._automaton.search(message) | self._always_try):
+            pattern_id, regex = patterns[index]
+            if components and components.get(pattern_id, component) != component:
+                # 他のコンポーネント専用のパターン
+                continue
+            match = regex.search(message)
+            if match:
+                return (pattern_id, match)
+        return None
+
+    def match(self, message: str, component: Optional[str] = None) -> Optional[int]:
+        """
+        メッセージに最初にマッチしたパターンのIDを返す（ID順で先勝ち）
+
+        Args:
+            message: ログメッセージ
+            component: ログのコンポーネント（Noneの場合は全コンポーネント対象のパターンのみ試す）
+
+        Returns:
+            マッチしたパターンID。マッチしない場合はNone
+        """
+        found = self.search(message, component)
+        return found[0] if found is not None else None
+
+    def match_many(self, messages: List[str],
+                   components: Optional[Iterable[Optional[str]]] = None) -> List[Optional[int]]:
+        """
+        複数のメッセージをまとめて照合
+
+        同じ (メッセージ, コンポーネント) はバッチ内で1回だけ照合する。
+
+        Args:
+            messages: ログメッセージのリスト
+            components: メッセージごとのコンポーネント（Noneの場合は全て None として扱う）
+
+        Returns:
+            メッセージごとのパターンID（マッチしない場合はNone）のリスト
+        """
+        if components is None:
+            components = [None] * len(messages)
+        results = []
+        matched: Dict[Tuple[str, Optional[str]], Optional[int]] = {}
+        for message, component in zip(messages, components):
+            key = (message, component)
+            if key in matched:
+                results.append(matched[key])
+                continue
+            pattern_id = matched[key] = self.match(message, component)
+            results.append(pattern_id)
+        return results
+
+    def record_hit(self, pattern_id: int):
+        """
+        パターンのマッチ件数を記録
+
         Args:
-            db: Databaseインスタンス
+            pattern_id: マッチしたパターンID
         """
+        self.hit_counts[pattern_id] = self.hit_counts.get(pattern_id, 0) + 1
+
+
+class PatternMatcher(ManualPatternIndex):
+    """
+    regex_patterns のパターンを照合する共有エンジン
+
+    パターンは1度だけ読み込んでコンパイルし、regex_patterns が変更された場合のみ
+    再読み込みする。変更の確認は TableWatcher（PRAGMA data_version と世代番号）で行い、
+    他の接続が regex_patterns を変更した場合だけ対象パターンのシグネチャを比較する。
+    match_many() / match_pattern() は REFRESH_INTERVAL 秒ごとに変更を確認するため、
+    呼び出し側で再読み込みを管理する必要はない。
+    1行ごとに呼ぶ match() は確認しない（インジェストはコミットごとに refresh_if_changed() を呼ぶ）。
+
+    対象は pattern_ids を省略した場合は手動パターン（manual_regex_rule）全体、
+    指定した場合はそのパターン（manual_regex_rule があればそれ、なければ regex_rule）。
+    """
+
+    # match_many() / match_pattern() でパターンの変更を確認する間隔（秒）
+    REFRESH_INTERVAL = 1.0
+
+    def __init__(self, db: Optional[Database] = None, pattern_ids: Optional[List[int]] = None):
+        """
+        Args:
+            db: Databaseインスタンス（load() / refresh_if_changed() にカーソルを渡す場合は省略可）
+            pattern_ids: 対象のパターンID（Noneの場合は手動パターン全体）
+        """
+        super().__init__()
         self.db = db
-        self._pattern_cache = None
-        self._cache_valid = False
-    
+        self.pattern_ids = sorted(set(pattern_ids)) if pattern_ids is not None else None
+        self._severities: Dict[int, Optional[str]] = {}
+        self._signature = None
+        self._watcher = TableWatcher(('regex_patterns',))
+        self._checked_at = 0.0
+
+    def _cursor(self, cursor=None):
+        if cursor is not None:
+            return cursor
+        return self.db.get_connection().cursor()
+
+    def _scope_sql(self) -> Tuple[str, tuple]:
+        """対象パターンを絞り込む WHERE 句とパラメータ"""
+        if self.pattern_ids is None:
+            return ("manual_regex_rule IS NOT NULL", ())
+        return (f"id IN ({','.join('?' * len(self.pattern_ids))})", tuple(self.pattern_ids))
+
+    def _fetch_signature(self, cursor) -> Tuple:
+        """対象パターンの変更検知用シグネチャを取得"""
+        where, params = self._scope_sql()
+        cursor.execute(f"""
+            SELECT COUNT(*), MAX(id), MAX(updated_at)
+            FROM regex_patterns
+            WHERE {where}
+        """, params)
+        return tuple(cursor.fetchone())
+
+    def load(self, cursor=None):
+        """
+        対象パターンをデータベースから読み込んでコンパイル
+
+        Args:
+            cursor: データベースカーソル（省略時は db の接続を使用）
+        """
+        cursor = self._cursor(cursor)
+        self._watcher.poll(cursor)
+        self._signature = self._fetch_signature(cursor)
+        where, params = self._scope_sql()
+        cursor.execute(f"""
+            SELECT id, COALESCE(manual_regex_rule, regex_rule) AS rule, component, severity
+            FROM regex_patterns
+            WHERE {where}
+            ORDER BY id
+        """, params)
+        rows = cursor.fetchall()
+        self._severities = {row['id']: row['severity'] for row in rows}
+        self.build([(row['id'], row['rule'], row['component']) for row in rows])
+        self._checked_at = time.monotonic()
+
+    def refresh_if_changed(self, cursor=None) -> bool:
+        """
+        対象パターンが変更されていれば再読み込み
+
+        Args:
+            cursor: データベースカーソル（省略時は db の接続を使用）
+
+        Returns:
+            再読み込みした場合True
+        """
+        cursor = self._cursor(cursor)
+        self._checked_at = time.monotonic()
+        if self._signature is not None and not self._watcher.poll(cursor):
+            return False
+        if self._signature is not None and self._fetch_signature(cursor) == self._signature:
+            # 対象外のパターン（自動生成パターンの追加など）の変更
+            return False
+        self.load(cursor)
+        return True
+
     def invalidate_cache(self):
-        """パターンキャッシュを無効化"""
-        self._cache_valid = False
-        self._pattern_cache = None
-    
-    def _load_patterns(self) -> List[Dict]:
+        """パターンキャッシュを無効化（次の match_many() / match_pattern() で再読み込み）"""
+        self._signature = None
+
+    def _auto_refresh(self):
+        """前回の確認から REFRESH_INTERVAL 秒以上経っていれば変更を確認"""
+        if self.db is None:
+            return
+        if self._signature is None or time.monotonic() - self._checked_at >= self.REFRESH_INTERVAL:
+            self.refresh_if_changed()
+
+    def match_many(self, messages: List[str],
+                   components: Optional[Iterable[Optional[str]]] = None) -> List[Optional[int]]:
         """
-        アクティブなパターンをデータベースから読み込む
-        
+        複数のメッセージをまとめて照合（パターンが変更されていれば先に再読み込み）
+
+        Args:
+            messages: ログメッセージのリスト
+            components: メッセージごとのコンポーネント（Noneの場合は全て None として扱う）
+
         Returns:
-            パターンのリスト
+            メッセージごとのパターンID（マッチしない場合はNone）のリスト
         """
-        if self._cache_valid and self._pattern_cache is not None:
-            return self._pattern_cache
-        
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, name, regex, component, default_severity
-            FROM patterns
-            WHERE is_active = 1
-            ORDER BY id
-        """)
-        
-        patterns = []
-        for row in cursor.fetchall():
-            try:
-                # 正規表現をコンパイルして検証
-                regex = re.compile(row['regex'])
-                patterns.append({
-                    'id': row['id'],
-                    'name': row['name'],
-                    'regex': regex,
-                    'component': row['component'],
-                    'default_severity': row['default_severity']
-                })
-            except re.error as e:
-                # 無効な正規表現はスキップ
-                print(f"Warning: Invalid regex pattern '{row['name']}': {e}")
-                continue
-        
-        self._pattern_cache = patterns
-        self._cache_valid = True
-        return patterns
-    
+        self._auto_refresh()
+        return super().match_many(messages, components)
+
     def match_pattern(self, component: str, message: str) -> Optional[Tuple[int, Dict]]:
         """
         ログメッセージにマッチするパターンを検索
@@ -80,28 +360,18 @@ class PatternMatcher:
         Returns:
             (pattern_id, match_info) のタプル。マッチしない場合はNone
             match_infoには以下が含まれる:
-            - 'severity': デフォルトのseverity
+            - 'severity': パターンのseverity
             - 'groups': 名前付きキャプチャグループの辞書
         """
-        patterns = self._load_patterns()
-        
-        for pattern in patterns:
-            # コンポーネントフィルタリング
-            if pattern['component'] is not None and pattern['component'] != component:
-                continue
-            
-            # 正規表現マッチング
-            match = pattern['regex'].search(message)
-            if match:
-                # 名前付きキャプチャグループを抽出
-                groups = match.groupdict() if match.groupdict() else {}
-                
-                return (pattern['id'], {
-                    'severity': pattern['default_severity'],
-                    'groups': groups
-                })
-        
-        return None
+        self._auto_refresh()
+        found = self.search(message, component)
+        if found is None:
+            return None
+        pattern_id, match = found
+        return (pattern_id, {
+            'severity': self._severities.get(pattern_id),
+            'groups': match.groupdict()
+        })
     
     def update_log_entry(self, log_id: int, pattern_id: Optional[int], 
                         is_known: bool, classification: str, severity: str):
@@ -153,26 +423,19 @@ class PatternMatcher:
         cursor = conn.cursor()
         
         for param_name, param_value in params.items():
-            # 数値に変換可能かチェック
-            param_value_num = None
+            # 数値に変換可能かチェック（例: "16M" -> 16、正規化後は 16777216 B）
             param_value_text = str(param_value)
-            
-            try:
-                # 数値として解釈を試みる
-                if isinstance(param_value, (int, float)):
-                    param_value_num = float(param_value)
-                else:
-                    # 文字列から数値を抽出（例: "16M" -> 16, "85.5" -> 85.5）
-                    num_match = re.match(r'^([+-]?\d+\.?\d*)', str(param_value))
-                    if num_match:
-                        param_value_num = float(num_match.group(1))
-            except (ValueError, TypeError):
-                pass
+            if isinstance(param_value, (int, float)):
+                param_value_num, unit = float(param_value), None
+            else:
+                param_value_num, unit = parse_quantity(param_value_text)
+            param_value_norm, param_unit = normalize_value(param_value_num, unit)
             
             cursor.execute("""
-                INSERT INTO log_params (log_id, param_name, param_value_num, param_value_text)
-                VALUES (?, ?, ?, ?)
-            """, (log_id, param_name, param_value_num, param_value_text))
+                INSERT INTO log_params
+                (log_id, param_name, param_value_num, param_value_text, param_value_norm, param_unit)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (log_id, param_name, param_value_num, param_value_text, param_value_norm, param_unit))
         
         conn.commit()
 
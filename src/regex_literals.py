@@ -0,0 +1,176 @@
+"""
+正規表現の必須リテラル抽出: マッチする文字列に必ず含まれる部分文字列を求める
+
+大量のログに正規表現を適用する前に、SQL の instr() や Python の `in`、
+複数パターンの場合は AhoCorasick で候補を絞り込むために使用する。
+"""
+import re
+from collections import deque
+from typing import List
+
+try:
+    # Python 3.11 以降
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+
+# POSSESSIVE_REPEAT / ATOMIC_GROUP は Python 3.11 で追加されたオペコード
+_REPEAT_OPS = tuple(
+    getattr(sre_constants, name)
+    for name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+    if hasattr(sre_constants, name)
+)
+_ATOMIC_GROUP = getattr(sre_constants, 'ATOMIC_GROUP', None)
+
+
+def _required_runs(parsed) -> List[List[str]]:
+    """
+    パース済みの正規表現（シーケンス）から、必ず出現するリテラルの並びを抽出
+
+    Returns:
+        リテラル文字の並びのリスト（空の並びを含む）。
+        先頭の要素はシーケンスの先頭に、末尾の要素はシーケンスの末尾に隣接する。
+        要素間にはリテラル以外の文字が入りうる
+    """
+    runs: List[List[str]] = [[]]
+
+    def cut():
+        runs.append([])
+
+    def concat(inner: List[List[str]]):
+        # 先頭の並びは直前のリテラルに連続し、末尾の並びは直後のリテラルに連続する
+        runs[-1].extend(inner[0])
+        runs.extend(list(run) for run in inner[1:])
+
+    for op, av in parsed:
+        if op is sre_constants.LITERAL:
+            runs[-1].append(chr(av))
+        elif op is sre_constants.SUBPATTERN:
+            # (?P<name>...) や (...) の中身もそのまま連続して出現する
+            _group, add_flags, _del_flags, sub = av
+            if add_flags & sre_constants.SRE_FLAG_IGNORECASE:
+                cut()
+                continue
+            concat(_required_runs(sub))
+        elif _ATOMIC_GROUP is not None and op is _ATOMIC_GROUP:
+            concat(_required_runs(av))
+        elif op in _REPEAT_OPS:
+            # 1回以上の繰り返しは中身が少なくとも1回出現する（前後とは連続しない）
+            min_count, _max_count, sub = av
+            cut()
+            if min_count >= 1:
+                for run in _required_runs(sub):
+                    runs.append(list(run))
+                    cut()
+        elif op is sre_constants.AT:
+            # ^ $ \b などは幅を持たないため、前後のリテラルは連続したまま
+            continue
+        else:
+            # 文字クラス・任意文字・分岐・後方参照・先読みなどはリテラルを区切る
+            cut()
+
+    return runs
+
+
+def required_literals(pattern: str, min_length: int = 3) -> List[str]:
+    """
+    正規表現にマッチする文字列に必ず含まれる部分文字列を抽出
+
+    大文字小文字を区別しないパターン（(?i) など）や解析できないパターンでは空リストを返す。
+    返したリテラルが全て含まれていない文字列には、search() でもマッチしない。
+
+    Args:
+        pattern: 正規表現パターン
+        min_length: 返すリテラルの最小文字数（短いものは絞り込み効果が小さいため除外）
+
+    Returns:
+        長い順のリテラルのリスト（重複なし）
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except (re.error, RecursionError, OverflowError):
+        return []
+
+    if parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE:
+        return []
+
+    literals = {''.join(run) for run in _required_runs(parsed)}
+    return sorted((lit for lit in literals if len(lit) >= min_length), key=len, reverse=True)
+
+
+class AhoCorasick:
+    """
+    複数のリテラル文字列を1回の走査で検索する Aho-Corasick オートマトン
+
+    各リテラルには任意の値（パターンのインデックスなど）を対応付け、
+    search() はテキストに出現したリテラルの値の集合を返す。
+    """
+
+    def __init__(self, literals: List[tuple]):
+        """
+        Args:
+            literals: (リテラル文字列, 値) のリスト
+        """
+        # 状態ごとの遷移（文字 -> 状態）・失敗遷移・出力（その状態で出現が確定する値）
+        self._goto: List[dict] = [{}]
+        outputs: List[set] = [set()]
+        for literal, value in literals:
+            state = 0
+            for ch in literal:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    outputs.append(set())
+                state = next_state
+            outputs[state].add(value)
+
+        # 幅優先で失敗遷移を求め、失敗先の出力を併合する
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(ch, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                outputs[next_state] |= outputs[self._fail[next_state]]
+
+        self._outputs = [frozenset(output) if output else None for output in outputs]
+
+    def __len__(self) -> int:
+        """状態数"""
+        return len(self._goto)
+
+    def search(self, text: str) -> set:
+        """
+        テキストに出現したリテラルの値を返す
+
+        Args:
+            text: 検索対象の文字列
+
+        Returns:
+            出現したリテラルに対応する値の集合
+        """
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        found = set()
+        state = 0
+        for ch in text:
+            transitions = goto[state]
+            while state and ch not in transitions:
+                state = fail[state]
+                transitions = goto[state]
+            state = transitions.get(ch, 0)
+            if outputs[state] is not None:
+                found |= outputs[state]
+        return found
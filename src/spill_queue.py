@@ -0,0 +1,234 @@
+"""
+スピルキュー: メモリ上限付きのFIFOキュー。上限を超えた分はディスク上のセグメントファイルに退避する
+"""
+import os
+import json
+import threading
+from collections import deque
+from typing import Any, Deque, List, Optional
+
+
+class SpillQueue:
+    """
+    メモリ上の件数を上限で抑え、溢れた要素を追記専用のセグメントファイルに書き出すキュー
+
+    - put() はブロックせず、要素を失わない（メモリが一杯ならディスクに追記する）
+    - ディスクに退避中の要素がある間は、新しい要素もディスク側に追記して順序を保つ
+    - get_many() はメモリ上の要素を返し、空になったら古いセグメントから順に読み戻す
+    - 読み切ったセグメントファイルは削除する
+
+    要素は JSON にシリアライズできる値であること（タプルはリストとして読み戻される）。
+    起動時に spill_dir に残っているセグメントは、前回の未処理分として先に取り出す。
+    """
+
+    SEGMENT_PREFIX = 'segment-'
+    SEGMENT_SUFFIX = '.jsonl'
+
+    def __init__(self, spill_dir: str, max_memory_items: int = 10000,
+                 segment_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            spill_dir: セグメントファイルを置くディレクトリ
+            max_memory_items: メモリ上に保持する最大件数
+            segment_bytes: 1セグメントファイルの最大バイト数（超えたら次のファイルに切り替える）
+        """
+        self.spill_dir = spill_dir
+        self.max_memory_items = max_memory_items
+        self.segment_bytes = segment_bytes
+        os.makedirs(spill_dir, exist_ok=True)
+
+        self._memory: Deque[Any] = deque()
+        self._lock = threading.Lock()
+
+        # ディスク上の未読件数（前回起動時の残りは読み込むまで件数不明のため行数を数える）
+        self._segments: Deque[int] = deque(sorted(self._existing_segments()))
+        self._disk_items = sum(self._count_lines(seq) for seq in self._segments)
+        self._next_seq = (self._segments[-1] + 1) if self._segments else 0
+
+        self._writer = None
+        self._writer_seq: Optional[int] = None
+        self._reader = None
+        self._reader_seq: Optional[int] = None
+
+        # 統計情報
+        self.spilled_total = 0
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.spill_dir, f"{self.SEGMENT_PREFIX}{seq:08d}{self.SEGMENT_SUFFIX}")
+
+    def _existing_segments(self) -> List[int]:
+        """spill_dir に残っているセグメント番号の一覧"""
+        seqs = []
+        for name in os.listdir(self.spill_dir):
+            if name.startswith(self.SEGMENT_PREFIX) and name.endswith(self.SEGMENT_SUFFIX):
+                try:
+                    seqs.append(int(name[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        return seqs
+
+    def _count_lines(self, seq: int) -> int:
+        # 書き込み途中で終了した末尾行（改行なし）は読み戻さないため数えない
+        with open(self._segment_path(seq), 'rb') as f:
+            return sum(1 for line in f if line.endswith(b'\n'))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._memory) + self._disk_items
+
+    @property
+    def disk_items(self) -> int:
+        """ディスクに退避中の件数"""
+        return self._disk_items
+
+    @property
+    def memory_items(self) -> int:
+        """メモリ上の件数"""
+        return len(self._memory)
+
+    def put(self, item: Any):
+        """
+        要素を追加（ブロックしない）
+
+        Args:
+            item: JSON にシリアライズできる値
+        """
+        with self._lock:
+            if self._disk_items == 0 and len(self._memory) < self.max_memory_items:
+                self._memory.append(item)
+                return
+            self._spill(item)
+
+    def _spill(self, item: Any):
+        """要素をセグメントファイルの末尾に追記"""
+        if self._writer is not None and self._writer.tell() >= self.segment_bytes:
+            self._close_writer()
+        if self._writer is None:
+            self._writer_seq = self._next_seq
+            self._next_seq += 1
+            self._writer = open(self._segment_path(self._writer_seq), 'a', encoding='utf-8')
+            self._segments.append(self._writer_seq)
+        self._writer.write(json.dumps(item, ensure_ascii=False) + '\n')
+        self._disk_items += 1
+        self.spilled_total += 1
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._writer_seq = None
+
+    def get_many(self, max_items: int) -> List[Any]:
+        """
+        先頭から最大 max_items 件を取り出す（空の場合は空リスト）
+
+        Args:
+            max_items: 取り出す最大件数
+
+        Returns:
+            追加された順の要素のリスト
+        """
+        with self._lock:
+            items = []
+            try:
+                while len(items) < max_items:
+                    if self._memory:
+                        items.append(self._memory.popleft())
+                        continue
+                    if self._disk_items == 0:
+                        break
+                    self._load_from_disk(max_items - len(items))
+            except Exception:
+                # 読み戻しに失敗しても、取り出し済みの要素は失わないよう先頭に戻す
+                self._memory.extendleft(reversed(items))
+                raise
+            return items
+
+    def requeue(self, items: List[Any]):
+        """
+        取り出した要素を先頭に戻す（取り込みに失敗したバッチを再試行する場合に使用）
+
+        戻した要素はメモリ上限を超えてもメモリに保持し、次の get_many() で先に取り出される。
+
+        Args:
+            items: get_many() で取り出した要素のリスト
+        """
+        with self._lock:
+            self._memory.extendleft(reversed(items))
+
+    def _load_from_disk(self, max_items: int):
+        """最も古いセグメントから最大 max_items 件をメモリに読み戻す"""
+        if self._reader is None:
+            if not self._segments:
+                # 件数とセグメントが食い違っている場合は、読み戻せるものがないため件数を合わせる
+                self._disk_items = 0
+                return
+            self._reader_seq = self._segments[0]
+            if self._reader_seq == self._writer_seq:
+                # 書き込み中のセグメントは閉じてから読む（以降の追記は新しいセグメントへ）
+                self._close_writer()
+            self._reader = open(self._segment_path(self._reader_seq), 'r', encoding='utf-8')
+
+        loaded = 0
+        limit = min(max_items, self.max_memory_items)
+        while loaded < limit:
+            line = self._reader.readline()
+            if not line:
+                # 読み切ったセグメントは削除
+                self._reader.close()
+                self._reader = None
+                os.remove(self._segment_path(self._segments.popleft()))
+                self._reader_seq = None
+                break
+            if not line.endswith('\n'):
+                # 書き込み途中で終了したなどで壊れた末尾行は読み飛ばす（件数には含めていない）
+                continue
+            self._disk_items -= 1
+            try:
+                item = json.loads(line)
+            except ValueError:
+                # 改行まで書かれていても JSON として壊れている行は読み飛ばす
+                continue
+            self._memory.append(item)
+            loaded += 1
+
+        if self._reader is not None and self._disk_items == 0:
+            # 件数上は空（末尾の壊れた行のみ残っている）ならセグメントを片付ける
+            self._reader.close()
+            self._reader = None
+            os.remove(self._segment_path(self._segments.popleft()))
+            self._reader_seq = None
+
+    def close(self):
+        """
+        ファイルを閉じる
+
+        未処理の要素はセグメントファイルとして残り、次回の起動時に読み戻される。
+        メモリ上の要素と読み込み途中のセグメントの残りは、先頭のセグメントとして書き出し直す。
+        """
+        with self._lock:
+            self._close_writer()
+            pending = list(self._memory)
+            self._memory.clear()
+            if self._reader is not None:
+                rest = [line for line in self._reader if line.endswith('\n')]
+                self._reader.close()
+                self._reader = None
+                self._reader_seq = None
+                os.remove(self._segment_path(self._segments.popleft()))
+                self._disk_items -= len(rest)
+                for line in rest:
+                    try:
+                        pending.append(json.loads(line))
+                    except ValueError:
+                        # 壊れた行は読み戻しと同様に読み飛ばす
+                        continue
+
+            if pending:
+                # 退避中の要素より古いため、既存のセグメントより前の番号で書き出す
+                seq = (self._segments[0] - 1) if self._segments else self._next_seq
+                with open(self._segment_path(seq), 'w', encoding='utf-8') as f:
+                    for item in pending:
+                        f.write(json.dumps(item, ensure_ascii=False) + '\n')
+                self._segments.appendleft(seq)
+                self._disk_items += len(pending)
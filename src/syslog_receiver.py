@@ -0,0 +1,450 @@
+"""
+syslog受信デーモン: UDP/TCP で受信した syslog（RFC3164 / RFC5424）をインジェスト処理に流す
+
+起動:
+    python3 src/syslog_receiver.py --db db/monitor.db --host 0.0.0.0 --port 5514
+
+ローカルでの動作確認:
+    logger -n 127.0.0.1 -P 5514 -d "test message"    # UDP
+    logger -n 127.0.0.1 -P 5514 -T "test message"    # TCP
+
+rsyslog の転送設定例（/etc/rsyslog.d/90-forward.conf）:
+    *.* @<server>:5514     # UDP
+    *.* @@<server>:5514    # TCP
+"""
+import sys
+import os
+import re
+import json
+import time
+import signal
+import sqlite3
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# パスを追加してモジュールをインポート可能にする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database import Database
+from src.log_parser import LogParser
+from src.ingest import LogIngester
+from src.spill_queue import SpillQueue
+
+
+# 先頭の PRI 部分（例: "<13>"）
+PRI_PATTERN = re.compile(r'^<(\d{1,3})>')
+
+# RFC5424: VERSION SP TIMESTAMP SP HOSTNAME SP APP-NAME SP PROCID SP MSGID SP STRUCTURED-DATA [SP MSG]
+RFC5424_PATTERN = re.compile(r'^1 (\S+) (\S+) (\S+) (\S+) (\S+) ?(.*)$', re.DOTALL)
+
+# データベースがロックされている場合の再試行間隔（秒）。失敗するたびに倍にする
+RETRY_INITIAL_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+
+
+def _split_structured_data(rest: str) -> str:
+    """
+    RFC5424 の STRUCTURED-DATA を読み飛ばし、MSG 部分を返す
+
+    Args:
+        rest: STRUCTURED-DATA から始まる文字列
+
+    Returns:
+        MSG 部分（BOMは除去）
+    """
+    if rest.startswith('-'):
+        msg = rest[1:]
+    else:
+        # [id param="value" ...][...] を読み飛ばす（値の中の \] \" はエスケープ）
+        i = 0
+        in_quote = False
+        while i < len(rest):
+            c = rest[i]
+            if c == '\\' and in_quote:
+                i += 2
+                continue
+            if c == '"':
+                in_quote = not in_quote
+            elif c == ']' and not in_quote and not rest[i + 1:i + 2] == '[':
+                i += 1
+                break
+            i += 1
+        msg = rest[i:]
+
+    if msg.startswith(' '):
+        msg = msg[1:]
+    return msg.lstrip('﻿')
+
+
+def parse_syslog(line: str, parser: LogParser) -> Dict:
+    """
+    受信した syslog メッセージを LogParser.parse_line() と同じ形式に変換
+
+    - RFC5424（"<PRI>1 TIMESTAMP HOSTNAME APP-NAME ..."）は独自に解析
+    - RFC3164（"<PRI>Mmm dd hh:mm:ss HOST TAG: MSG"）は PRI を除いて LogParser で解析
+
+    Args:
+        line: 受信したメッセージ（1件分）
+        parser: LogParserインスタンス
+
+    Returns:
+        {'ts', 'host', 'component', 'message', 'raw_line'} の辞書
+    """
+    line = line.strip('\r\n\x00')
+    match = PRI_PATTERN.match(line)
+    if match:
+        line = line[match.end():]
+
+    match = RFC5424_PATTERN.match(line)
+    if not match:
+        return parser.parse_line(line)
+
+    ts_str, host, app_name, _procid, _msgid, rest = match.groups()
+    try:
+        ts = datetime.fromisoformat(ts_str)
+        if ts.tzinfo is not None:
+            # 他のログと揃えてローカル時刻（タイムゾーンなし）で保存
+            ts = ts.astimezone().replace(tzinfo=None)
+    except ValueError:
+        ts = datetime.now()
+
+    return {
+        'ts': ts,
+        'host': None if host == '-' else host,
+        'component': None if app_name == '-' else app_name,
+        'message': _split_structured_data(rest).strip(),
+        'raw_line': line.strip()
+    }
+
+
+class SyslogReceiver:
+    """
+    asyncio ベースの syslog 受信デーモン
+
+    受信したメッセージはスピルキューに積み、書き込み専用スレッドで
+    LogIngester.ingest_parsed() にまとめて渡す（グループコミット）。
+    ブートストームなどで書き込みが追いつかない場合、メモリ上限を超えた分は
+    ディスクに退避するため、メモリ使用量を抑えたまま受信したログを失わない。
+    """
+
+    def __init__(self, db_path: str, host: str = '127.0.0.1', port: int = 5514,
+                 queue_size: int = 10000, batch_size: int = 1000,
+                 udp: bool = True, tcp: bool = True, verbose: bool = False,
+                 spill_dir: Optional[str] = None, busy_timeout: float = 30.0):
+        """
+        Args:
+            db_path: データベースパス
+            host: 待ち受けアドレス
+            port: 待ち受けポート（UDP/TCP共通）
+            queue_size: 受信キューがメモリ上に保持する最大件数
+            batch_size: 1回のコミットで取り込む最大件数
+            udp: UDPで待ち受けるかどうか
+            tcp: TCPで待ち受けるかどうか
+            verbose: 詳細出力するかどうか
+            spill_dir: キューが溢れた分を退避するディレクトリ（省略時はDBと同じ場所の spool/）
+            busy_timeout: 他の接続が書き込み中の場合に待機する秒数（超えた場合はバッチを再試行）
+        """
+        self.db_path = db_path
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.udp = udp
+        self.tcp = tcp
+        self.verbose = verbose
+        self.spill_dir = spill_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), 'spool')
+        self.busy_timeout = busy_timeout
+
+        self.queue: Optional[SpillQueue] = None
+        self._ready: Optional[asyncio.Event] = None
+        self.counters = {
+            'received': 0,
+            'dropped': 0,
+            'ingested': 0,
+            'batches': 0,
+            'retries': 0,
+            'errors': 0
+        }
+        # 受信からコミット完了までの遅延（秒）、直近分のみ保持
+        self._latencies = deque(maxlen=10000)
+
+        # SQLite 接続は書き込みスレッドで作成・使用する
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='syslog-writer')
+        self._db: Optional[Database] = None
+        self._ingester: Optional[LogIngester] = None
+        self._ingest_stats: Optional[Dict] = None
+
+        # 接続中のTCPセッション（終了時に閉じるため）
+        self._tcp_tasks = set()
+
+    def enqueue(self, line: str):
+        """
+        受信メッセージをキューに追加（メモリが一杯の場合はディスクに退避）
+
+        Args:
+            line: 受信したメッセージ
+        """
+        self.counters['received'] += 1
+        try:
+            # 前回起動時の退避分と比較できるよう、受信時刻は壁時計で記録する
+            self.queue.put((time.time(), line))
+        except OSError as e:
+            # ディスクへの退避にも失敗した場合のみ破棄
+            self.counters['dropped'] += 1
+            if self.verbose:
+                print(f"Failed to spill message: {e}", file=sys.stderr)
+        self._ready.set()
+
+    def get_stats(self) -> Dict:
+        """
+        キュー深さ・破棄件数・遅延などの統計情報を取得
+
+        Returns:
+            統計情報の辞書
+        """
+        stats = dict(self.counters)
+        # SpillQueue は空のとき偽になるため、None かどうかで判定する
+        stats['queue_depth'] = len(self.queue) if self.queue is not None else 0
+        stats['spilled'] = self.queue.disk_items if self.queue is not None else 0
+        stats['spilled_total'] = self.queue.spilled_total if self.queue is not None else 0
+        latencies = sorted(self._latencies)
+        if latencies:
+            stats['latency_avg_ms'] = round(sum(latencies) / len(latencies) * 1000, 1)
+            stats['latency_p99_ms'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 1)
+            stats['latency_max_ms'] = round(latencies[-1] * 1000, 1)
+        return stats
+
+    def _ingest_batch(self, batch: List):
+        """
+        書き込みスレッドでメッセージをまとめて取り込む
+
+        データベースがロックされているなどで書き込めなかった場合は、ロールバック済みの
+        バッチをキューの先頭に戻してから sqlite3.OperationalError を送出する。
+        （終了処理で待機がキャンセルされた場合も、キューを閉じる前に戻される）
+
+        Args:
+            batch: キューから取り出した (受信時刻, メッセージ) のリスト
+        """
+        try:
+            if self._ingester is None:
+                self._open_db()
+            parsed_logs = [parse_syslog(line, self._ingester.parser) for _, line in batch]
+            # 失敗したバッチを再試行しても二重に数えないよう、コピーに加算してから反映する
+            stats = dict(self._ingest_stats)
+            self._ingester.ingest_parsed(parsed_logs, stats, self.verbose)
+        except sqlite3.OperationalError:
+            self.queue.requeue(batch)
+            raise
+        self.counters['errors'] += stats['errors'] - self._ingest_stats['errors']
+        self._ingest_stats = stats
+
+    def _open_db(self):
+        """書き込みスレッドでデータベース接続を開き、インジェスタを作成"""
+        db = Database(self.db_path, timeout=self.busy_timeout)
+        self._ingester = LogIngester(db, batch_size=max(self.batch_size, 1))
+        self._ingest_stats = LogIngester._new_stats()
+        self._db = db
+
+    def _close_db(self):
+        """書き込みスレッドでデータベース接続を閉じる"""
+        if self._db:
+            self._db.close()
+            self._db = None
+            self._ingester = None
+
+    async def _consume(self):
+        """キューからメッセージを取り出し、まとめて取り込む"""
+        loop = asyncio.get_running_loop()
+        retry_delay = RETRY_INITIAL_DELAY
+        while True:
+            # 取り込み中に溜まった分をまとめて次のコミットに含める
+            try:
+                batch = self.queue.get_many(self.batch_size)
+            except Exception as e:
+                # 退避したセグメントの読み戻しに失敗した場合も取り込みを止めず、間隔を空けて再試行する
+                self.counters['retries'] += 1
+                print(f"Error reading queue, retrying in {retry_delay:.1f}s: {e}", file=sys.stderr)
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, RETRY_MAX_DELAY)
+                continue
+            if not batch:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            try:
+                await loop.run_in_executor(self._executor, self._ingest_batch, batch)
+            except sqlite3.OperationalError as e:
+                # バッチはキューの先頭に戻されているため、間隔を空けて再試行する
+                self.counters['retries'] += 1
+                print(f"Database busy, retrying in {retry_delay:.1f}s: {e}", file=sys.stderr)
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, RETRY_MAX_DELAY)
+                continue
+            except Exception as e:
+                self.counters['errors'] += len(batch)
+                print(f"Error ingesting batch: {e}", file=sys.stderr)
+                continue
+
+            now = time.time()
+            self._latencies.extend(now - received_at for received_at, _ in batch)
+            self.counters['ingested'] += len(batch)
+            self.counters['batches'] += 1
+            retry_delay = RETRY_INITIAL_DELAY
+
+    async def _handle_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        TCP接続からメッセージを読み込む
+
+        RFC6587 のオクテットカウント方式（"LEN SP MSG"）と改行区切りの両方に対応する。
+        """
+        task = asyncio.current_task()
+        self._tcp_tasks.add(task)
+        try:
+            while True:
+                first = await reader.read(1)
+                if not first:
+                    break
+                if first.isdigit():
+                    # オクテットカウント方式
+                    length = int(first + (await reader.readuntil(b' '))[:-1])
+                    data = await reader.readexactly(length)
+                else:
+                    # 改行区切り方式
+                    data = first + await reader.readline()
+                line = data.decode('utf-8', errors='ignore').strip('\r\n\x00')
+                if line:
+                    self.enqueue(line)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError) as e:
+            if self.verbose:
+                print(f"TCP connection closed: {e}", file=sys.stderr)
+        except asyncio.CancelledError:
+            # 終了時に接続を閉じる場合（受信済みのメッセージはキューに積まれている）
+            pass
+        finally:
+            self._tcp_tasks.discard(task)
+            writer.close()
+
+    async def _report_stats(self, interval: float):
+        """統計情報を定期的に標準エラー出力に表示"""
+        while True:
+            await asyncio.sleep(interval)
+            print(json.dumps(self.get_stats()), file=sys.stderr)
+
+    async def serve(self, stop_event: Optional[asyncio.Event] = None, stats_interval: float = 0):
+        """
+        受信を開始し、stop_event がセットされるまで待ち受ける
+
+        終了時はキューに残ったメッセージを取り込んでから接続を閉じる。
+
+        Args:
+            stop_event: 停止を指示するイベント（省略時は無期限に待ち受ける）
+            stats_interval: 統計情報を表示する間隔（秒）。0の場合は表示しない
+        """
+        loop = asyncio.get_running_loop()
+        self.queue = SpillQueue(self.spill_dir, max_memory_items=self.queue_size)
+        self._ready = asyncio.Event()
+        if len(self.queue):
+            print(f"Resuming {len(self.queue)} spilled messages from {self.spill_dir}", file=sys.stderr)
+            self._ready.set()
+        stop_event = stop_event or asyncio.Event()
+
+        transports = []
+        servers = []
+        if self.udp:
+            receiver = self
+
+            class _UDPProtocol(asyncio.DatagramProtocol):
+                def datagram_received(self, data, addr):
+                    receiver.enqueue(data.decode('utf-8', errors='ignore'))
+
+            transport, _ = await loop.create_datagram_endpoint(
+                _UDPProtocol, local_addr=(self.host, self.port)
+            )
+            transports.append(transport)
+        if self.tcp:
+            servers.append(await asyncio.start_server(self._handle_tcp, self.host, self.port))
+
+        tasks = [asyncio.create_task(self._consume())]
+        if stats_interval > 0:
+            tasks.append(asyncio.create_task(self._report_stats(stats_interval)))
+
+        print(f"Listening on {self.host}:{self.port} "
+              f"({'/'.join(p for p, on in (('udp', self.udp), ('tcp', self.tcp)) if on)})", file=sys.stderr)
+
+        try:
+            await stop_event.wait()
+        finally:
+            for transport in transports:
+                transport.close()
+            for server in servers:
+                server.close()
+            # 接続中のクライアントが残っていると wait_closed() が戻らないため、先に切断する
+            tcp_tasks = list(self._tcp_tasks)
+            for task in tcp_tasks:
+                task.cancel()
+            await asyncio.gather(*tcp_tasks, return_exceptions=True)
+            for server in servers:
+                await server.wait_closed()
+
+            # 取り込み中のバッチはコミットまで完了させ、
+            # キューに残ったメッセージはディスクに書き出して次回の起動時に取り込む
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await loop.run_in_executor(self._executor, self._close_db)
+            self._executor.shutdown()
+            self.queue.close()
+
+
+def main():
+    """コマンドラインエントリーポイント"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Receive syslog (RFC3164/RFC5424) over UDP/TCP and ingest it')
+    parser.add_argument('--db', default='db/monitor.db', help='Database path')
+    parser.add_argument('--host', default='127.0.0.1', help='Listen address')
+    parser.add_argument('--port', type=int, default=5514, help='Listen port (UDP and TCP)')
+    parser.add_argument('--no-udp', action='store_true', help='Disable UDP listener')
+    parser.add_argument('--no-tcp', action='store_true', help='Disable TCP listener')
+    parser.add_argument('--queue-size', type=int, default=10000,
+                        help='Maximum number of queued messages kept in memory (the rest spill to disk)')
+    parser.add_argument('--spill-dir', help='Directory for spilled messages (default: spool/ next to the database)')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Maximum messages per group commit')
+    parser.add_argument('--busy-timeout', type=float, default=30.0,
+                        help='Seconds to wait for a locked database before retrying the batch')
+    parser.add_argument('--stats-interval', type=float, default=10.0,
+                        help='Seconds between stats lines on stderr (0 to disable)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+
+    args = parser.parse_args()
+
+    receiver = SyslogReceiver(
+        args.db,
+        host=args.host,
+        port=args.port,
+        queue_size=args.queue_size,
+        batch_size=args.batch_size,
+        udp=not args.no_udp,
+        tcp=not args.no_tcp,
+        verbose=args.verbose,
+        spill_dir=args.spill_dir,
+        busy_timeout=args.busy_timeout
+    )
+
+    async def run():
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+        await receiver.serve(stop_event, stats_interval=args.stats_interval)
+
+    asyncio.run(run())
+    print(json.dumps(receiver.get_stats()), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""
+テンプレートツリー: Drain 方式の解析木でログメッセージをテンプレート（自動生成パターン）に対応付ける
+
+abstract_message() の出力文字列の完全一致でパターンを識別すると、1トークンだけ異なる
+メッセージ（デバイス名・ユーザー名など）ごとに別パターンが作られる。テンプレートツリーは
+トークン数と先頭トークンで候補を絞り込み、類似度がしきい値以上のテンプレートがあれば
+異なる位置をワイルドカード（<*>）にしてまとめる。
+
+テンプレートは pattern_templates テーブルに保存し、対応する regex_patterns の
+regex_rule にはテンプレートから生成した正規表現を格納する（reprocess-pattern などの
+既存の処理はそのまま使用できる）。
+"""
+from typing import Dict, List, Optional, Tuple
+
+from src.abstract_message import abstract_message, abstract_message_typed
+
+
+WILDCARD = '<*>'
+
+# ワイルドカード位置の正規表現
+_WILDCARD_REGEX = r'\S+'
+
+
+def template_tokens(message: str, token_types: Optional[tuple] = None) -> List[str]:
+    """
+    メッセージを空白で分割し、各トークンを abstract_message() で正規表現に変換
+
+    数値・16進数は abstract_message() と同じく \\d+ / 0x[0-9A-Fa-f]+ になるため、
+    "eth0" と "eth1" のように数値だけが異なるトークンは同一とみなされる。
+
+    Args:
+        message: ログメッセージ
+        token_types: 使用する型付きトークンの種類（abstract_message_typed() を参照）
+
+    Returns:
+        トークン（正規表現）のリスト
+    """
+    if token_types:
+        return [abstract_message_typed(token, token_types) for token in message.split()]
+    return [abstract_message(token) for token in message.split()]
+
+
+def template_regex(tokens: List[str]) -> str:
+    """
+    テンプレートのトークン列から正規表現を生成
+
+    Args:
+        tokens: テンプレートのトークン列（ワイルドカードは WILDCARD）
+
+    Returns:
+        正規表現パターン文字列
+    """
+    return r'\s+'.join(_WILDCARD_REGEX if token == WILDCARD else token for token in tokens)
+
+
+class Template:
+    """テンプレート（ツリーの葉に属するトークン列）"""
+
+    __slots__ = ('id', 'pattern_id', 'tokens', 'route')
+
+    def __init__(self, template_id: Optional[int], pattern_id: Optional[int], tokens: List[str],
+                 route: Optional[List[str]] = None):
+        """
+        Args:
+            template_id: pattern_templates.id（未保存の場合はNone）
+            pattern_id: 対応する regex_patterns.id（未保存の場合はNone）
+            tokens: トークン列
+            route: 木に登録したときにたどった振り分けキー（未登録の場合はNone）
+        """
+        self.id = template_id
+        self.pattern_id = pattern_id
+        self.tokens = tokens
+        self.route = route
+
+    @property
+    def text(self) -> str:
+        """保存用の文字列（トークンは空白を含まないため空白区切りで表す）"""
+        return ' '.join(self.tokens)
+
+    @property
+    def route_text(self) -> Optional[str]:
+        """保存用の振り分けキー（空白区切り）"""
+        return None if self.route is None else ' '.join(self.route)
+
+    @property
+    def regex(self) -> str:
+        """テンプレートに対応する正規表現"""
+        return template_regex(self.tokens)
+
+
+class TemplateTree:
+    """
+    Drain 方式の固定深さの解析木
+
+    ルート → トークン数 → 先頭 depth - 2 個のトークン → テンプレートのリスト の順にたどる。
+    数値を含むトークン（\\d+ / 16進数）と、子ノード数が max_children に達した後の
+    新しいトークンはワイルドカードの枝に振り分ける。葉では、位置ごとに一致するトークンの
+    割合（類似度）が最も高いテンプレートを選び、similarity 以上であればマッチとする。
+
+    一般化で振り分けに使ったトークンがワイルドカードになっても、テンプレートは登録時の葉に
+    置いたままにする（同じメッセージが引き続き同じ葉で見つかるようにするため）。
+    読み込み直しても同じ葉に入るよう、たどった振り分けキーは pattern_templates.route に保存する。
+    """
+
+    def __init__(self, depth: int = 5, similarity: float = 0.6, max_children: int = 100):
+        """
+        Args:
+            depth: 木の深さ（先頭 depth - 2 個のトークンで振り分ける）
+            similarity: 同一テンプレートとみなす類似度のしきい値（0〜1）
+            max_children: 1ノードあたりの子ノード数の上限
+        """
+        self.depth = depth
+        self.similarity = similarity
+        self.max_children = max_children
+        # トークン数 -> 振り分け用の入れ子の辞書（末端はテンプレートのリスト）
+        self._root: Dict[int, Dict] = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def load(self, cursor):
+        """
+        pattern_templates からテンプレートを読み込んで木を再構築
+
+        Args:
+            cursor: データベースカーソル
+        """
+        self._root = {}
+        self._count = 0
+        cursor.execute("""
+            SELECT id, pattern_id, template, route
+            FROM pattern_templates
+            ORDER BY id
+        """)
+        for row in cursor.fetchall():
+            tokens = row['template'].split(' ') if row['template'] else []
+            # route が未保存（NULL）のテンプレートはトークン列から振り分け先を決める
+            route = None if row['route'] is None else (row['route'].split(' ') if row['route'] else [])
+            self._insert(Template(row['id'], row['pattern_id'], tokens, route))
+
+    def _leaf(self, tokens: List[str], create: bool,
+              route: Optional[List[str]] = None) -> Tuple[Optional[List[Template]], List[str]]:
+        """
+        トークン列に対応する葉（テンプレートのリスト）を返す
+
+        Args:
+            tokens: トークン列
+            create: 途中のノードがなければ作成するかどうか
+            route: たどる振り分けキー（保存済みのテンプレートを読み込む場合。省略時はトークン列から決める）
+
+        Returns:
+            (テンプレートのリスト, たどった振り分けキー) のタプル。
+            create=False でノードがなければテンプレートのリストはNone
+        """
+        node = self._root.get(len(tokens))
+        if node is None:
+            if not create:
+                return (None, [])
+            node = self._root[len(tokens)] = {}
+
+        prefix = self._route(tokens)
+        if route is not None and len(route) == len(prefix):
+            prefix = route
+        else:
+            route = None
+        path = []
+        for index, key in enumerate(prefix):
+            if key not in node and route is None:
+                if not create or len(node) >= self.max_children:
+                    # 未知のトークン・子ノード数の上限に達した場合はワイルドカードの枝へ
+                    key = WILDCARD
+                    if key not in node and not create:
+                        return (None, path)
+            if key not in node:
+                node[key] = [] if index == len(prefix) - 1 else {}
+            node = node[key]
+            path.append(key)
+
+        if not prefix:
+            # トークン数が少なく振り分けに使うトークンがない場合
+            if None not in node:
+                if not create:
+                    return (None, path)
+                node[None] = []
+            node = node[None]
+        return (node, path)
+
+    def _route(self, tokens: List[str]) -> List[str]:
+        """
+        振り分けに使うトークン（数値を含まない先頭 depth - 2 個のトークン）
+
+        ブートログのメッセージは "[    0.000000]" のようなタイムスタンプで始まることが多く、
+        先頭のトークンをそのまま使うとほぼ全てのメッセージが同じ枝に入るため、
+        数値を含むトークンは飛ばす。一般化でワイルドカードになったトークンも飛ばす
+        （route を保存していないテンプレートを読み込む場合に使用）。
+        数値を含まないトークンが足りない場合はワイルドカードで埋める。
+        """
+        count = max(self.depth - 2, 0)
+        route = [
+            token for token in tokens
+            if token != WILDCARD and '\\d' not in token and '0x' not in token
+        ][:count]
+        return route + [WILDCARD] * (min(count, len(tokens)) - len(route))
+
+    def _insert(self, template: Template):
+        leaf, template.route = self._leaf(template.tokens, create=True, route=template.route)
+        leaf.append(template)
+        self._count += 1
+
+    @staticmethod
+    def _score(template_tokens: List[str], tokens: List[str]) -> Tuple[int, int]:
+        """(一致するトークン数, ワイルドカード数) を返す"""
+        same = 0
+        wildcards = 0
+        for template_token, token in zip(template_tokens, tokens):
+            if template_token == WILDCARD:
+                wildcards += 1
+            elif template_token == token:
+                same += 1
+        return (same, wildcards)
+
+    def match(self, tokens: List[str]) -> Optional[Template]:
+        """
+        トークン列に最も類似するテンプレートを返す（木は変更しない）
+
+        Args:
+            tokens: template_tokens() の戻り値
+
+        Returns:
+            類似度がしきい値以上（またはワイルドカード以外が全て一致）のテンプレート。
+            なければNone
+        """
+        leaf, _ = self._leaf(tokens, create=False)
+        if not leaf:
+            return None
+        best = None
+        best_score = (-1, -1)
+        for template in leaf:
+            score = self._score(template.tokens, tokens)
+            if score > best_score:
+                best, best_score = template, score
+
+        same, wildcards = best_score
+        if not tokens or same + wildcards == len(tokens) or same / len(tokens) >= self.similarity:
+            return best
+        return None
+
+    def add(self, tokens: List[str]) -> Tuple[Template, bool, bool]:
+        """
+        トークン列をテンプレートに対応付ける（必要に応じてテンプレートを作成・一般化）
+
+        Args:
+            tokens: template_tokens() の戻り値
+
+        Returns:
+            (テンプレート, 新規作成したか, 既存テンプレートを一般化したか) のタプル
+            新規作成したテンプレートの id / pattern_id は呼び出し側で設定する
+        """
+        template = self.match(tokens)
+        if template is None:
+            template = Template(None, None, list(tokens))
+            self._insert(template)
+            return (template, True, False)
+
+        merged = [
+            template_token if template_token == token else WILDCARD
+            for template_token, token in zip(template.tokens, tokens)
+        ]
+        if merged == template.tokens:
+            return (template, False, False)
+        template.tokens = merged
+        return (template, False, True)